@@ -0,0 +1,315 @@
+import json
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import NegativeCycleError, shortest_path
+
+from src.algorithms.csr_graph import as_csr
+
+logging.basicConfig(level=logging.INFO)
+
+# Hop counts are stored as uint16, with the largest value marking unreachable pairs
+UNREACHABLE = np.iinfo(np.uint16).max
+
+# Graphs with at least this fraction of all possible (directed) edges are solved with
+# Floyd-Warshall; below it the compiled per-source searches are faster
+DENSE_MIN_DENSITY = 0.4
+
+# Side of the square tiles of the blocked Floyd-Warshall; a 256 x 256 float32 tile is 256 KiB
+DEFAULT_BLOCK_SIZE = 256
+
+# Graphs with fewer nodes are swept in-process, a process pool would cost more than it saves
+PARALLEL_MIN_NODES = 2000
+
+# Upper bound on the distance entries (sources x nodes) computed by one sweep
+SWEEP_MAX_ENTRIES = 2 ** 22
+
+
+def _min_plus_update(C, A, B):
+    # C = min(C, A (min,+) B), one rank-1 update per column of A so temporaries stay tile-sized.
+    # When C aliases A or B the updates are applied in place, as Floyd-Warshall requires.
+    for k in range(A.shape[1]):
+        np.minimum(C, A[:, k, None] + B[k, None, :], out=C)
+
+
+def blocked_floyd_warshall(D, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Floyd-Warshall on a dense distance matrix, in place.
+
+    D holds the edge weights, inf for missing edges and zeros on the diagonal. The
+    matrix is processed in square tiles: for every diagonal tile K the tile is closed
+    first, then the row and column panels through K, then every remaining tile, so
+    each step works on a few tiles that stay in cache.
+    Raises nx.NetworkXUnbounded if the graph has a negative cycle.
+    """
+    num_nodes = D.shape[0]
+    tiles = [slice(start, min(start + block_size, num_nodes)) for start in range(0, num_nodes, block_size)]
+
+    for K in tiles:
+        _min_plus_update(D[K, K], D[K, K], D[K, K])
+        for J in tiles:
+            if J != K:
+                _min_plus_update(D[K, J], D[K, K], D[K, J])
+                _min_plus_update(D[J, K], D[J, K], D[K, K])
+        for I in tiles:
+            if I == K:
+                continue
+            for J in tiles:
+                if J != K:
+                    _min_plus_update(D[I, J], D[I, K], D[K, J])
+
+    if np.any(np.diagonal(D) < 0):
+        raise nx.NetworkXUnbounded("Negative cycle detected.")
+    return D
+
+
+def _compact(distances, dtype):
+    if dtype == np.uint16:
+        compact = np.full(distances.shape, UNREACHABLE, dtype=np.uint16)
+        reachable = np.isfinite(distances)
+        compact[reachable] = distances[reachable]
+        return compact
+    return distances.astype(np.float32)
+
+
+def _sweep(matrix, sources, weighted, dtype):
+    # Johnson's algorithm handles negative weights, Dijkstra/BFS everything else
+    method = "J" if weighted and matrix.data.size and matrix.data.min() < 0 else "D"
+    try:
+        distances = shortest_path(matrix, method=method, directed=True, unweighted=not weighted, indices=sources)
+    except NegativeCycleError:
+        raise nx.NetworkXUnbounded("Negative cycle detected.")
+    return _compact(distances, dtype)
+
+
+_worker_matrix = None
+_worker_weighted = None
+_worker_dtype = None
+
+
+def _init_worker(indptr, indices, weights, num_nodes, weighted, dtype):
+    # Each worker rebuilds the graph once instead of receiving it with every task
+    global _worker_matrix, _worker_weighted, _worker_dtype
+    _worker_matrix = csr_matrix((weights, indices, indptr), shape=(num_nodes, num_nodes))
+    _worker_weighted = weighted
+    _worker_dtype = dtype
+
+
+def _worker_sweep(sources):
+    return _sweep(_worker_matrix, sources, _worker_weighted, _worker_dtype)
+
+
+class AllPairsDistances:
+    """
+    All-pairs shortest path distances as a dense V x V matrix, either in memory or
+    memory-mapped from a .npy file so that rows can be read without loading it all.
+
+    Hop counts are stored as uint16 (UNREACHABLE for no path) and weighted lengths as
+    float32 (inf for no path). Rows and columns follow `node_ids`; the metadata is
+    kept next to the matrix in `<path>.json`.
+    """
+
+    def __init__(self, distances, node_ids, integral=True):
+        self.distances = distances
+        self.node_ids = list(node_ids)
+        self.index = {node: i for i, node in enumerate(self.node_ids)}
+        self.integral = integral
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map a matrix written by all_pairs_shortest_paths.
+        """
+        with open(path + ".json") as f:
+            metadata = json.load(f)
+        return cls(np.load(path, mmap_mode="r"), metadata["node_ids"], metadata["integral"])
+
+    def save_metadata(self, path):
+        with open(path + ".json", "w") as f:
+            json.dump({"node_ids": self.node_ids, "integral": self.integral,
+                       "dtype": str(self.distances.dtype)}, f)
+
+    @property
+    def nbytes(self):
+        return self.distances.nbytes
+
+    def row(self, source):
+        """
+        Distances from `source` to every node as float64, inf for unreachable nodes.
+        """
+        row = self.distances[self.index[source]]
+        if row.dtype == np.uint16:
+            decoded = row.astype(np.float64)
+            decoded[row == UNREACHABLE] = np.inf
+            return decoded
+        return row.astype(np.float64)
+
+    def lookup(self, sources, targets):
+        """
+        Vectorized distances between node indices sources[i] and targets[i], as float64
+        with inf for unreachable pairs.
+        """
+        distances = self.distances[np.asarray(sources), np.asarray(targets)]
+        if distances.dtype == np.uint16:
+            decoded = distances.astype(np.float64)
+            decoded[distances == UNREACHABLE] = np.inf
+            return decoded
+        return distances.astype(np.float64)
+
+    def _value(self, distance):
+        if np.isinf(distance):
+            return float('inf')
+        return int(round(distance)) if self.integral else float(distance)
+
+    def distance(self, source, target):
+        """
+        Shortest path length between two nodes, an int for integral weights like networkx.
+        """
+        return self._value(self.row(source)[self.index[target]])
+
+    def path(self, csr, source, target):
+        """
+        Rebuild one shortest path from the distance row of `source`, walking back from
+        `target` over edges that lie on a shortest path. `csr` is the CSRGraph the
+        distances were computed on. Returns [] if target is unreachable.
+        """
+        distances = self.row(source)
+        t = self.index[target]
+        if np.isinf(distances[t]):
+            return []
+
+        incoming = csr.matrix.T.tocsr() if csr.directed else csr.matrix
+        weights = incoming.data if self.distances.dtype != np.uint16 else np.ones_like(incoming.data)
+
+        def tight_predecessors(v):
+            start, end = incoming.indptr[v], incoming.indptr[v + 1]
+            candidates = incoming.indices[start:end]
+            tight = np.isclose(distances[candidates] + weights[start:end], distances[v], rtol=1e-5, atol=1e-6)
+            return iter(candidates[tight].tolist())
+
+        s = self.index[source]
+        path = [t]
+        visited = {t}
+        options = [tight_predecessors(t)]
+        while path[-1] != s:
+            u = next((u for u in options[-1] if u not in visited), None)
+            if u is None:
+                # A dead end, through a zero-weight cycle or an edge that only looks tight after rounding
+                path.pop()
+                options.pop()
+                if not path:
+                    raise ValueError(f"No shortest path from {source} to {target} matches the distances, "
+                                     f"they were not computed on this graph.")
+                continue
+            visited.add(u)
+            path.append(u)
+            options.append(tight_predecessors(u))
+        return [self.node_ids[i] for i in reversed(path)]
+
+    def to_dict(self):
+        """
+        Distances as a dict of dicts keyed by source and target, like nx.floyd_warshall.
+        Meant for small graphs only.
+        """
+        return {
+            source: {target: self._value(distance) for target, distance in zip(self.node_ids, self.row(source))}
+            for source in self.node_ids
+        }
+
+
+def choose_method(csr):
+    """
+    Floyd-Warshall for dense graphs, one single-source search per node for sparse ones.
+    """
+    num_nodes = csr.number_of_nodes()
+    density = len(csr.indices) / max(num_nodes * num_nodes, 1)
+    return "floyd-warshall" if density >= DENSE_MIN_DENSITY else "sweep"
+
+
+def all_pairs_shortest_paths(G, weight=None, method="auto", path=None, block_size=DEFAULT_BLOCK_SIZE, n_jobs=None):
+    """
+    Compute the distances between all pairs of nodes of G (networkx or CSRGraph).
+
+    Distances are hop counts when weight is None and weighted lengths otherwise.
+    method is "floyd-warshall" (blocked, vectorized), "sweep" (a BFS or Dijkstra per
+    source, sharded over a process pool on large graphs) or "auto" to pick by density.
+    With a path the matrix is written to that .npy file and returned memory-mapped;
+    Floyd-Warshall then runs on memory-mapped files too, so no V x V matrix is held
+    in memory by either method.
+    """
+    csr = as_csr(G, weight)
+    weighted = weight is not None
+    num_nodes = csr.number_of_nodes()
+    dtype = np.float32 if weighted or num_nodes >= UNREACHABLE else np.uint16
+    if method == "auto":
+        method = choose_method(csr)
+
+    if path is not None:
+        distances = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(num_nodes, num_nodes))
+    else:
+        distances = np.empty((num_nodes, num_nodes), dtype=dtype)
+
+    if method == "floyd-warshall":
+        # The kernel works on float32: directly on the result when it is stored as float32,
+        # otherwise on a scratch matrix, memory-mapped next to the result file if there is one
+        scratch_path = None
+        if dtype == np.float32:
+            D = distances
+        elif path is not None:
+            scratch_path = path + ".scratch.npy"
+            D = np.lib.format.open_memmap(scratch_path, mode="w+", dtype=np.float32, shape=(num_nodes, num_nodes))
+        else:
+            D = np.empty((num_nodes, num_nodes), dtype=np.float32)
+        try:
+            D[:] = np.inf
+            rows = np.repeat(np.arange(num_nodes), np.diff(csr.indptr))
+            edge_weights = csr.weights if weighted else np.ones_like(csr.weights)
+            # Keep the lightest of parallel entries
+            np.minimum.at(D, (rows, csr.indices), edge_weights.astype(np.float32))
+            np.fill_diagonal(D, np.minimum(np.diagonal(D), 0))
+            blocked_floyd_warshall(D, block_size)
+            if D is not distances:
+                # Compacted a band of rows at a time
+                band = max(1, SWEEP_MAX_ENTRIES // max(num_nodes, 1))
+                for start in range(0, num_nodes, band):
+                    distances[start:start + band] = _compact(D[start:start + band], dtype)
+        finally:
+            if scratch_path is not None:
+                del D
+                os.remove(scratch_path)
+    elif method == "sweep":
+        if n_jobs is None:
+            n_jobs = os.cpu_count() if num_nodes >= PARALLEL_MIN_NODES else 1
+        chunk_size = max(1, SWEEP_MAX_ENTRIES // max(num_nodes, 1))
+        chunks = [np.arange(start, min(start + chunk_size, num_nodes), dtype=np.int32)
+                  for start in range(0, num_nodes, chunk_size)]
+
+        if n_jobs <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                distances[chunk[0]:chunk[-1] + 1] = _sweep(csr.matrix, chunk, weighted, dtype)
+        else:
+            initargs = (csr.indptr, csr.indices, csr.weights, num_nodes, weighted, dtype)
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as executor:
+                for chunk, rows in zip(chunks, executor.map(_worker_sweep, chunks)):
+                    distances[chunk[0]:chunk[-1] + 1] = rows
+    else:
+        raise ValueError(f"Unsupported all-pairs method: {method}")
+
+    result = AllPairsDistances(distances, csr.node_ids, integral=csr.integral or not weighted)
+    if path is not None:
+        distances.flush()
+        result.save_metadata(path)
+    logging.info(f"Computed all-pairs distances of {num_nodes} nodes with {method} "
+                 f"({result.nbytes} bytes, {dtype.__name__}).")
+    return result
+
+
+if __name__ == "__main__":
+    # Example usage with a generated graph
+    G = nx.gnm_random_graph(500, 2000)
+    apsp = all_pairs_shortest_paths(G, method="floyd-warshall")
+    print(f"Distance from 0 to 499: {apsp.distance(0, 499)}")
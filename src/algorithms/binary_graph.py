@@ -0,0 +1,258 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import time
+import logging
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from src.algorithms.csr_graph import CSRGraph
+
+logging.basicConfig(level=logging.INFO)
+
+# File layout: MAGIC, then a JSON header padded with spaces to HEADER_BYTES, then the
+# arrays, each starting at a multiple of ALIGNMENT bytes from the start of the file
+MAGIC = b"GBIN"
+FORMAT_VERSION = 1
+HEADER_BYTES = 4096
+ALIGNMENT = 64
+
+BINARY_GRAPH_EXTENSION = ".gbin"
+
+
+class NodeTable(Sequence):
+    """
+    Node ids of a binary graph, decoded one at a time from the (memory-mapped) id
+    arrays instead of being turned into a Python list when the graph is opened.
+
+    Integer ids are stored as an int64 array; string ids as UTF-8 bytes in `blob`, the
+    id of node i being blob[offsets[i]:offsets[i + 1]]. `order` lists the node indices
+    sorted by id, which is what NodeIndex searches to map an id back to its index.
+    """
+
+    def __init__(self, order, ids=None, offsets=None, blob=None):
+        self.order = order
+        self.ids = ids
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("node index out of range")
+        if self.ids is not None:
+            return int(self.ids[i])
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class NodeIndex(Mapping):
+    """
+    Read-only node id -> index mapping over a NodeTable, answered with a binary search
+    of the sorted ids (a few decodes per lookup) so no dict has to be built.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._key_types = (int, np.integer) if table.ids is not None else (str,)
+
+    def __getitem__(self, node):
+        if not isinstance(node, self._key_types):
+            raise KeyError(node)
+        order = self.table.order
+        position = bisect.bisect_left(_SortedView(self.table), node)
+        if position < len(order) and self.table[order[position]] == node:
+            return int(order[position])
+        raise KeyError(node)
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self):
+        return len(self.table)
+
+
+class _SortedView(Sequence):
+    # The node ids in sorted order, for bisect
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, position):
+        return self.table[self.table.order[position]]
+
+
+def _node_arrays(node_ids):
+    # The id arrays of a NodeTable for a list of int or str node ids
+    if all(isinstance(node, (int, np.integer)) and not isinstance(node, bool) for node in node_ids):
+        ids = np.array(node_ids, dtype=np.int64)
+        return "int", {"node_ids": ids, "node_order": np.argsort(ids, kind="stable").astype(np.int64)}
+    if all(isinstance(node, str) for node in node_ids):
+        encoded = [node.encode("utf-8") for node in node_ids]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(node) for node in encoded])
+        order = np.array(sorted(range(len(node_ids)), key=node_ids.__getitem__), dtype=np.int64)
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return "str", {"node_offsets": offsets, "node_blob": blob, "node_order": order}
+    raise ValueError("Binary graphs support int or str node ids only.")
+
+
+def write_binary_graph(csr, path):
+    """
+    Write a CSRGraph to a single binary file: a JSON header with the array layout,
+    the graph fingerprint and a SHA-256 checksum of the data, followed by the CSR
+    arrays and the node id table, little-endian and aligned so they can be memory-mapped.
+    """
+    node_id_type, node_arrays = _node_arrays(list(csr.node_ids))
+    arrays = {"indptr": csr.indptr, "indices": csr.indices, "weights": csr.weights}
+    arrays.update(node_arrays)
+
+    layout = {}
+    offset = HEADER_BYTES
+    checksum = hashlib.sha256()
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+        arrays[name] = array
+        padding = -offset % ALIGNMENT
+        checksum.update(b"\0" * padding)
+        checksum.update(array.tobytes())
+        offset += padding
+        layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += array.nbytes
+
+    header = {
+        "version": FORMAT_VERSION,
+        "directed": csr.directed,
+        "integral": csr.integral,
+        "num_nodes": csr.number_of_nodes(),
+        "node_id_type": node_id_type,
+        "fingerprint": csr.fingerprint(),
+        "checksum": checksum.hexdigest(),
+        "arrays": layout,
+    }
+    encoded = json.dumps(header).encode("utf-8")
+    if len(MAGIC) + len(encoded) > HEADER_BYTES:
+        raise ValueError("Binary graph header is too large.")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + encoded.ljust(HEADER_BYTES - len(MAGIC)))
+        for name, array in arrays.items():
+            f.write(b"\0" * (layout[name]["offset"] - f.tell()))
+            f.write(memoryview(array).cast("B"))
+    logging.info(f"Wrote binary graph {path}: {csr.number_of_nodes()} nodes, {len(csr.indices)} arcs.")
+
+
+def read_binary_header(path):
+    """
+    Read and check the header of a binary graph file.
+    Raises ValueError if the file is not a binary graph or is truncated.
+    """
+    with open(path, "rb") as f:
+        head = f.read(HEADER_BYTES)
+        size = f.seek(0, 2)
+    if len(head) < HEADER_BYTES or not head.startswith(MAGIC):
+        raise ValueError(f"{path} is not a binary graph file.")
+    try:
+        header = json.loads(head[len(MAGIC):].decode("utf-8"))
+    except ValueError:
+        raise ValueError(f"{path} has a corrupt header.")
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary graph version {header.get('version')} in {path}.")
+    end = max(spec["offset"] + int(np.prod(spec["shape"])) * np.dtype(spec["dtype"]).itemsize
+              for spec in header["arrays"].values())
+    if size < end:
+        raise ValueError(f"{path} is truncated.")
+    return header
+
+
+def verify_binary_graph(path, header=None):
+    """
+    Recompute the checksum of the data of a binary graph file, reading it in chunks.
+    Raises ValueError if it does not match the header.
+    """
+    header = header or read_binary_header(path)
+    checksum = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(HEADER_BYTES)
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            checksum.update(chunk)
+    if checksum.hexdigest() != header["checksum"]:
+        raise ValueError(f"Checksum mismatch in {path}, the file is corrupt.")
+
+
+def read_binary_graph(path, verify=False):
+    """
+    Open a binary graph file as a CSRGraph whose arrays are memory-mapped read-only:
+    opening costs the same for any graph size, pages are read on first access and
+    shared through the page cache by every process that opens the same file. Node
+    ids are decoded on demand (see NodeTable). With verify=True the data checksum is
+    checked first, which reads the whole file.
+    Raises ValueError for files that are not valid binary graphs.
+    """
+    header = read_binary_header(path)
+    if verify:
+        verify_binary_graph(path, header)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=spec["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r", offset=spec["offset"], shape=shape)
+
+    if header["node_id_type"] == "int":
+        table = NodeTable(arrays["node_order"], ids=arrays["node_ids"])
+    else:
+        table = NodeTable(arrays["node_order"], offsets=arrays["node_offsets"], blob=arrays["node_blob"])
+    csr = CSRGraph(arrays["indptr"], arrays["indices"], arrays["weights"], table,
+                   directed=header["directed"], integral=header["integral"], index=NodeIndex(table))
+    csr._fingerprint = header["fingerprint"]
+    return csr
+
+
+def convert_graph_file(path, output=None, fmt="edgelist", weight="weight", verify=True):
+    """
+    Convert an edgelist or GraphML file to the binary format, next to it by default
+    (same name with the .gbin extension). The written file is read back and its
+    checksum verified. Returns the path of the binary file.
+    """
+    from src.serving.graph_registry import GRAPH_READERS
+
+    output = output or os.path.splitext(path)[0] + BINARY_GRAPH_EXTENSION
+    start_time = time.perf_counter()
+    G = GRAPH_READERS[fmt](path)
+    write_binary_graph(CSRGraph.from_networkx(G, weight=weight), output)
+    if verify:
+        verify_binary_graph(output)
+    logging.info(f"Converted {path} to {output} in {time.perf_counter() - start_time:.2f} seconds.")
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a graph file to the memory-mappable binary format.")
+    parser.add_argument("graph_file")
+    parser.add_argument("output", nargs="?", help="Defaults to the graph file with the .gbin extension.")
+    parser.add_argument("--format", default="edgelist", choices=["edgelist", "graphml"])
+    parser.add_argument("--weight", default="weight", help="Edge attribute holding the weights.")
+    args = parser.parse_args(argv)
+
+    convert_graph_file(args.graph_file, args.output, fmt=args.format, weight=args.weight)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,164 @@
 import networkx as nx
+import numpy as np
+from src.algorithms.all_pairs import all_pairs_shortest_paths
+from src.algorithms.csr_graph import (CSRGraph, csr_astar, csr_bellman_ford, csr_bfs, csr_bidirectional_bfs,
+                                      csr_bidirectional_dijkstra, csr_dijkstra)
+from src.algorithms.landmarks import LandmarkIndex
 
-def dijkstra_shortest_path(G, source, target):
+# Point-to-point strategies accepted by point_to_point_search
+POINT_TO_POINT_ALGORITHMS = ("dijkstra", "bidirectional-dijkstra", "bidirectional-bfs", "astar")
+
+def as_backend(G, backend=None):
+    """
+    Return G in the requested backend: "networkx", "csr", or None to keep it as it is.
+    Converting to CSR costs one pass over the edges, so convert once and reuse the
+    result when running many queries on the same graph.
+    """
+    if backend == "csr" and not isinstance(G, CSRGraph):
+        return CSRGraph.from_networkx(G)
+    if backend == "networkx" and isinstance(G, CSRGraph):
+        raise ValueError("A CSRGraph cannot be converted back to networkx.")
+    return G
+
+def dijkstra_shortest_path(G, source, target, backend=None, heuristic=None):
     """
     Calculate the shortest path between source and target nodes using Dijkstra's algorithm.
+    G can be a networkx graph or a CSRGraph; the path and its length come from a single search.
+    With a heuristic (see astar_shortest_path) the search is goal-directed A* instead.
     """
+    G = as_backend(G, backend)
+    if heuristic is not None:
+        return astar_shortest_path(G, source, target, heuristic)
+    if isinstance(G, CSRGraph):
+        return csr_dijkstra(G, source, target)
     try:
-        path = nx.dijkstra_path(G, source=source, target=target)
-        length = nx.dijkstra_path_length(G, source=source, target=target)
+        length, path = nx.single_source_dijkstra(G, source=source, target=target)
         return path, length
     except nx.NetworkXNoPath:
         return [], float('inf')
 
-def bellman_ford_shortest_path(G, source, target):
+def path_length(G, path, weight='weight'):
+    """
+    Sum the weights (default 1) along a path of a networkx graph, taking the lightest
+    of parallel edges.
+    """
+    length = 0
+    for u, v in zip(path, path[1:]):
+        if G.is_multigraph():
+            length += min(d.get(weight, 1) for d in G[u][v].values())
+        else:
+            length += G[u][v].get(weight, 1)
+    return length
+
+def coordinate_heuristic(G, x="x", y="y"):
+    """
+    Build an A* heuristic from node coordinates stored on a networkx graph as the `x`
+    and `y` node attributes: the straight-line distance between two nodes. It is a
+    lower bound only if no edge is shorter (by weight) than the distance between its ends.
+    Raises ValueError if a node has no coordinates.
+    """
+    if isinstance(G, CSRGraph):
+        raise ValueError("Node coordinates are not kept in CSR or binary graphs.")
+    positions = {}
+    for node, data in G.nodes(data=True):
+        if x not in data or y not in data:
+            raise ValueError(f"Node {node} has no {x}/{y} coordinates.")
+        positions[node] = (float(data[x]), float(data[y]))
+
+    def heuristic(u, v):
+        (ux, uy), (vx, vy) = positions[u], positions[v]
+        return float(np.hypot(ux - vx, uy - vy))
+    return heuristic
+
+def astar_potential(G, target, heuristic):
+    """
+    Lower bounds of the distances from every node index of the CSRGraph G to target.
+    """
+    G.node_index(target)
+    if isinstance(heuristic, LandmarkIndex):
+        return heuristic.potential(target)
+    return np.array([heuristic(node, target) for node in G.node_ids], dtype=np.float64)
+
+def astar_shortest_path(G, source, target, heuristic, backend=None):
+    """
+    Calculate the shortest path between source and target nodes using A* search.
+    The heuristic is either a LandmarkIndex built on the same graph and weights, or a
+    callable h(u, v) returning a lower bound of the distance from u to v.
+    """
+    G = as_backend(G, backend)
+    if isinstance(G, CSRGraph):
+        G.node_index(source)
+        return csr_astar(G, source, target, astar_potential(G, target, heuristic))
+
+    if isinstance(heuristic, LandmarkIndex):
+        heuristic = heuristic.heuristic
+    try:
+        path = nx.astar_path(G, source, target, heuristic=heuristic, weight='weight')
+        return path, path_length(G, path)
+    except nx.NetworkXNoPath:
+        return [], float('inf')
+
+def point_to_point_search(G, source, target, algorithm="dijkstra", heuristic=None):
+    """
+    Find the shortest path between source and target with one of POINT_TO_POINT_ALGORITHMS
+    on the CSR form of G, reporting how much of the graph the search touched:
+      - "dijkstra": a full single-source Dijkstra
+      - "bidirectional-dijkstra": Dijkstra from both ends, stopping when they meet
+      - "bidirectional-bfs": breadth-first search from both ends, ignoring weights
+      - "astar": goal-directed search with `heuristic` (see astar_shortest_path)
+    Returns the path, its length and the number of settled nodes.
+    """
+    G = as_backend(G, "csr")
+    if algorithm == "dijkstra":
+        return csr_dijkstra(G, source, target, return_settled=True)
+    if algorithm == "bidirectional-dijkstra":
+        return csr_bidirectional_dijkstra(G, source, target, return_settled=True)
+    if algorithm == "bidirectional-bfs":
+        return csr_bidirectional_bfs(G, source, target, return_settled=True)
+    if algorithm == "astar":
+        if heuristic is None:
+            raise ValueError("A* search needs a heuristic.")
+        G.node_index(source)
+        return csr_astar(G, source, target, astar_potential(G, target, heuristic), return_settled=True)
+    raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+def bfs_shortest_path(G, source, target, backend=None):
+    """
+    Calculate the shortest path between source and target nodes by breadth-first search,
+    ignoring edge weights. Returns the path and its number of hops.
+    """
+    G = as_backend(G, backend)
+    if isinstance(G, CSRGraph):
+        return csr_bfs(G, source, target)
+    try:
+        path = nx.bidirectional_shortest_path(G, source, target)
+        return path, len(path) - 1
+    except nx.NetworkXNoPath:
+        return [], float('inf')
+
+def bellman_ford_shortest_path(G, source, target, backend=None):
     """
     Calculate the shortest path between source and target nodes using the Bellman-Ford algorithm.
+    G can be a networkx graph or a CSRGraph; the path and its length come from a single search.
     """
+    G = as_backend(G, backend)
+    if isinstance(G, CSRGraph):
+        return csr_bellman_ford(G, source, target)
     try:
-        path = nx.bellman_ford_path(G, source=source, target=target)
-        length = nx.bellman_ford_path_length(G, source=source, target=target)
+        length, path = nx.single_source_bellman_ford(G, source=source, target=target)
         return path, length
     except nx.NetworkXNoPath:
         return [], float('inf')
 
 def floyd_warshall_shortest_paths(G):
     """
-    Compute the shortest paths between all pairs of nodes using the Floyd-Warshall algorithm.
-    Returns a dictionary of dictionaries keyed by source and target nodes.
+    Compute the shortest path lengths between all pairs of nodes using the Floyd-Warshall algorithm.
+    Returns a dictionary of dictionaries keyed by source and target nodes, like nx.floyd_warshall.
+    This materializes V^2 Python objects; use all_pairs.all_pairs_shortest_paths directly
+    for anything but small graphs.
+    Raises nx.NetworkXUnbounded if the graph has a negative cycle.
     """
-    try:
-        paths = dict(nx.floyd_warshall(G))
-        return paths
-    except Exception as e:
-        return {}
+    return all_pairs_shortest_paths(G, weight='weight', method="floyd-warshall").to_dict()
 
 if __name__ == "__main__":
     # Example usage with a generated graph
@@ -0,0 +1,445 @@
+import hashlib
+import heapq
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import bellman_ford, breadth_first_order, dijkstra, NegativeCycleError
+
+# Predecessor value scipy uses for nodes without a predecessor
+NO_PREDECESSOR = -9999
+
+
+class CSRGraph:
+    """
+    Compact, integer-indexed representation of a graph for the shortest path hot path.
+
+    The adjacency is stored as NumPy CSR arrays: the neighbours of node index `i` are
+    `indices[indptr[i]:indptr[i + 1]]` with the matching edge `weights`. Undirected
+    edges are stored in both directions. `node_ids` maps an index back to the
+    original node id and `index` maps a node id to its index. Both can be passed in
+    ready-made (see binary_graph.read_binary_graph), otherwise they are built here.
+
+    Compared with networkx dicts of dicts, an edge costs 12 bytes per direction
+    (an int32 index and a float64 weight) instead of several hundred bytes.
+    """
+
+    def __init__(self, indptr, indices, weights, node_ids, directed=False, integral=True, index=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        if index is None:
+            self.node_ids = list(node_ids)
+            self.index = {node: i for i, node in enumerate(self.node_ids)}
+        else:
+            self.node_ids = node_ids
+            self.index = index
+        self.directed = directed
+        # True when every weight is an integer, so lengths are returned as ints like networkx does
+        self.integral = integral
+        self._matrix = None
+        self._reverse = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_networkx(cls, G, weight='weight'):
+        """
+        Convert a networkx graph, taking the `weight` edge attribute (default 1).
+        Parallel edges of multigraphs are collapsed to their lightest edge.
+        """
+        node_ids = list(G.nodes())
+        index = {node: i for i, node in enumerate(node_ids)}
+        num_nodes = len(node_ids)
+        num_entries = sum(len(neighbours) for neighbours in G.adj.values())
+
+        index_dtype = np.int32 if max(num_nodes, num_entries) < 2 ** 31 else np.int64
+        indptr = np.zeros(num_nodes + 1, dtype=index_dtype)
+        indices = np.empty(num_entries, dtype=index_dtype)
+        weights = np.empty(num_entries, dtype=np.float64)
+
+        integral = True
+        position = 0
+        for i, node in enumerate(node_ids):
+            for neighbour, data in G.adj[node].items():
+                if G.is_multigraph():
+                    w = min(d.get(weight, 1) for d in data.values())
+                else:
+                    w = data.get(weight, 1)
+                if integral and not (isinstance(w, (int, np.integer)) and not isinstance(w, bool)):
+                    integral = False
+                indices[position] = index[neighbour]
+                weights[position] = w
+                position += 1
+            indptr[i + 1] = position
+
+        return cls(indptr, indices, weights, node_ids, directed=G.is_directed(), integral=integral)
+
+    @property
+    def matrix(self):
+        # scipy view sharing the CSR arrays, built on first use
+        if self._matrix is None:
+            num_nodes = len(self.node_ids)
+            self._matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(num_nodes, num_nodes))
+        return self._matrix
+
+    @property
+    def reverse(self):
+        """
+        (indptr, indices, weights) of the incoming edges, for searches that run backwards
+        from the target. Undirected graphs share their own arrays.
+        """
+        if self._reverse is None:
+            if self.directed:
+                transposed = self.matrix.T.tocsr()
+                self._reverse = (transposed.indptr, transposed.indices, transposed.data)
+            else:
+                self._reverse = (self.indptr, self.indices, self.weights)
+        return self._reverse
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+    def fingerprint(self):
+        """
+        Return a SHA-256 hash of the graph content (node ids, edges, weights, directedness),
+        stable across processes and runs for the same graph.
+        The graph is not modified after construction, so the hash is computed once.
+        """
+        if self._fingerprint is not None:
+            return self._fingerprint
+        digest = hashlib.sha256()
+        digest.update(b"directed" if self.directed else b"undirected")
+        digest.update("\n".join(map(repr, self.node_ids)).encode("utf-8"))
+        for array in (self.indptr, self.indices, self.weights):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        num_entries = len(self.indices)
+        if self.directed:
+            return num_entries
+        # Self-loops are stored once, every other undirected edge twice
+        rows = np.repeat(np.arange(len(self.node_ids)), np.diff(self.indptr))
+        self_loops = int(np.count_nonzero(self.indices == rows))
+        return (num_entries - self_loops) // 2 + self_loops
+
+    def is_directed(self):
+        return self.directed
+
+    def nodes(self):
+        return list(self.node_ids)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def neighbors(self, node):
+        i = self.index[node]
+        return [self.node_ids[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def has_edge(self, u, v):
+        if u not in self.index or v not in self.index:
+            return False
+        i, j = self.index[u], self.index[v]
+        return bool(np.any(self.indices[self.indptr[i]:self.indptr[i + 1]] == j))
+
+    def node_index(self, node):
+        """
+        Return the index of `node`, raising nx.NodeNotFound like networkx does.
+        """
+        try:
+            return self.index[node]
+        except KeyError:
+            raise nx.NodeNotFound(f"Node {node} not in G")
+
+    def length_value(self, length):
+        """
+        Convert a distance computed on the float weights back to the type networkx returns.
+        """
+        if np.isinf(length):
+            return float('inf')
+        return int(round(length)) if self.integral else float(length)
+
+    def path_to(self, predecessors, target_index):
+        """
+        Walk a predecessor array back from `target_index` and return the path as node ids.
+        """
+        path = []
+        i = target_index
+        while i != NO_PREDECESSOR:
+            path.append(self.node_ids[i])
+            i = predecessors[i]
+        path.reverse()
+        return path
+
+    def with_arc_changes(self, sources, targets, new_weights, node_ids=None):
+        """
+        Return a new CSRGraph with the arcs sources[i] -> targets[i] set to new_weights[i],
+        inf removing the arc. Arcs that do not exist yet are added. `node_ids` lists the
+        nodes of the new graph: the current ones in the same order, followed by new ones.
+        Undirected edges must be given in both directions. The arrays are rebuilt with
+        vectorized operations, which is much cheaper than converting the graph again.
+        """
+        node_ids = self.node_ids if node_ids is None else list(node_ids)
+        num_nodes = len(node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        new_weights = np.asarray(new_weights, dtype=np.float64)
+
+        rows = np.repeat(np.arange(len(self.node_ids), dtype=np.int64), np.diff(self.indptr))
+        cols = np.asarray(self.indices, dtype=np.int64)
+        weights = self.weights.copy()
+
+        # Locate the changed arcs among the existing ones
+        keys = rows * num_nodes + cols
+        order = np.argsort(keys, kind="stable")
+        change_keys = sources * num_nodes + targets
+        positions = np.minimum(np.searchsorted(keys[order], change_keys), max(len(keys) - 1, 0))
+        existing = keys[order][positions] == change_keys if len(keys) else np.zeros(len(change_keys), dtype=bool)
+        weights[order[positions[existing]]] = new_weights[existing]
+
+        kept = np.isfinite(weights)
+        added = ~existing & np.isfinite(new_weights)
+        rows = np.concatenate([rows[kept], sources[added]])
+        cols = np.concatenate([cols[kept], targets[added]])
+        weights = np.concatenate([weights[kept], new_weights[added]])
+
+        order = np.argsort(rows, kind="stable")
+        index_dtype = np.int32 if max(num_nodes, len(cols)) < 2 ** 31 else np.int64
+        indptr = np.zeros(num_nodes + 1, dtype=index_dtype)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength=num_nodes))
+        finite = new_weights[np.isfinite(new_weights)]
+        integral = self.integral and bool(np.all(finite == np.round(finite)))
+        return CSRGraph(indptr, cols[order].astype(index_dtype), weights[order], node_ids,
+                        directed=self.directed, integral=integral)
+
+
+def as_csr(G, weight=None):
+    """
+    Return the CSR form of G, converting networkx graphs with the given weight attribute.
+    """
+    if isinstance(G, CSRGraph):
+        return G
+    return CSRGraph.from_networkx(G, weight=weight or 'weight')
+
+
+def csr_shortest_path_tree(csr, source):
+    """
+    Dijkstra's algorithm on a CSRGraph from `source` to every node.
+    Returns the distance and predecessor arrays indexed by node index.
+    """
+    s = csr.node_index(source)
+    if csr.weights.size and csr.weights.min() < 0:
+        raise ValueError("Contradictory paths found: negative weights?")
+    return dijkstra(csr.matrix, directed=True, indices=s, return_predecessors=True)
+
+
+def csr_dijkstra(csr, source, target, return_settled=False):
+    """
+    Dijkstra's algorithm on a CSRGraph. Returns the path and its length from one search.
+    The search runs to completion, so with return_settled=True the number of settled
+    nodes, every node reachable from source, is returned as well.
+    """
+    t = csr.node_index(target)
+    distances, predecessors = csr_shortest_path_tree(csr, source)
+    if np.isinf(distances[t]):
+        result = [], float('inf')
+    else:
+        result = csr.path_to(predecessors, t), csr.length_value(distances[t])
+    if return_settled:
+        return result + (int(np.count_nonzero(np.isfinite(distances))),)
+    return result
+
+
+def csr_bfs(csr, source, target):
+    """
+    Unweighted breadth-first search on a CSRGraph. Returns the path and its number of hops.
+    """
+    s, t = csr.node_index(source), csr.node_index(target)
+
+    _, predecessors = breadth_first_order(csr.matrix, s, directed=True, return_predecessors=True)
+    if t != s and predecessors[t] == NO_PREDECESSOR:
+        return [], float('inf')
+    path = csr.path_to(predecessors, t)
+    return path, len(path) - 1
+
+
+def _join_paths(csr, forward, backward, meet):
+    # Forward predecessors lead back to the source, backward ones on to the target
+    path = []
+    i = meet
+    while i != NO_PREDECESSOR:
+        path.append(i)
+        i = forward[i]
+    path.reverse()
+    i = backward[meet]
+    while i != NO_PREDECESSOR:
+        path.append(i)
+        i = backward[i]
+    return [csr.node_ids[i] for i in path]
+
+
+def csr_bidirectional_dijkstra(csr, source, target, return_settled=False):
+    """
+    Bidirectional Dijkstra on a CSRGraph: one search forward from source and one
+    backward from target, always advancing the side with the smaller tentative distance,
+    stopping as soon as the two smallest keys together cannot improve the best meeting
+    point. Returns the path and its length, and the number of settled nodes of both
+    searches with return_settled=True.
+    """
+    s, t = csr.node_index(source), csr.node_index(target)
+    if csr.weights.size and csr.weights.min() < 0:
+        raise ValueError("Contradictory paths found: negative weights?")
+
+    adjacency = [(csr.indptr, csr.indices, csr.weights), csr.reverse]
+    distances = [{s: 0.0}, {t: 0.0}]
+    predecessors = [{s: NO_PREDECESSOR}, {t: NO_PREDECESSOR}]
+    settled = [set(), set()]
+    heaps = [[(0.0, s)], [(0.0, t)]]
+    best, meet = (0.0, s) if s == t else (float('inf'), None)
+
+    while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        distance, u = heapq.heappop(heaps[side])
+        if u in settled[side]:
+            continue
+        settled[side].add(u)
+
+        indptr, indices, weights = adjacency[side]
+        other = distances[1 - side]
+        start, end = indptr[u], indptr[u + 1]
+        for v, w in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+            candidate = distance + w
+            if candidate < distances[side].get(v, float('inf')):
+                distances[side][v] = candidate
+                predecessors[side][v] = u
+                heapq.heappush(heaps[side], (candidate, v))
+            if v in other and distances[side][v] + other[v] < best:
+                best, meet = distances[side][v] + other[v], v
+
+    num_settled = len(settled[0]) + len(settled[1])
+    if meet is None:
+        result = [], float('inf')
+    else:
+        result = _join_paths(csr, predecessors[0], predecessors[1], meet), csr.length_value(best)
+    return result + (num_settled,) if return_settled else result
+
+
+def csr_bidirectional_bfs(csr, source, target, return_settled=False):
+    """
+    Bidirectional breadth-first search on a CSRGraph, ignoring edge weights. Each step
+    expands a whole level of the smaller frontier and stops at the first level where
+    the frontiers meet. Returns the path and its number of hops, and the number of
+    expanded nodes with return_settled=True.
+    """
+    s, t = csr.node_index(source), csr.node_index(target)
+
+    adjacency = [(csr.indptr, csr.indices), csr.reverse[:2]]
+    depths = [{s: 0}, {t: 0}]
+    predecessors = [{s: NO_PREDECESSOR}, {t: NO_PREDECESSOR}]
+    frontiers = [[s], [t]]
+    best, meet = (0, s) if s == t else (float('inf'), None)
+    num_settled = 0
+
+    while meet is None and frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        indptr, indices = adjacency[side]
+        other = depths[1 - side]
+        next_frontier = []
+        for u in frontiers[side]:
+            num_settled += 1
+            depth = depths[side][u] + 1
+            for v in indices[indptr[u]:indptr[u + 1]].tolist():
+                if v in depths[side]:
+                    continue
+                depths[side][v] = depth
+                predecessors[side][v] = u
+                next_frontier.append(v)
+                if v in other and depth + other[v] < best:
+                    best, meet = depth + other[v], v
+        frontiers[side] = next_frontier
+
+    if meet is None:
+        result = [], float('inf')
+    else:
+        result = _join_paths(csr, predecessors[0], predecessors[1], meet), best
+    return result + (num_settled,) if return_settled else result
+
+
+def csr_bellman_ford(csr, source, target):
+    """
+    Bellman-Ford on a CSRGraph. Returns the path and its length from one search.
+    Raises nx.NetworkXUnbounded if a negative cycle is reachable, like networkx does.
+    """
+    s, t = csr.node_index(source), csr.node_index(target)
+
+    try:
+        distances, predecessors = bellman_ford(csr.matrix, directed=True, indices=s, return_predecessors=True)
+    except NegativeCycleError:
+        raise nx.NetworkXUnbounded("Negative cycle detected.")
+    if np.isinf(distances[t]):
+        return [], float('inf')
+    return csr.path_to(predecessors, t), csr.length_value(distances[t])
+
+
+def csr_astar(csr, source, target, potential, return_settled=False):
+    """
+    A* search on a CSRGraph. `potential[i]` must be a lower bound of the distance from
+    node index i to the target (inf if the target is unreachable from i), for example
+    the landmark bounds of a LandmarkIndex. Returns the path and its length, and the
+    number of settled nodes with return_settled=True.
+    """
+    s, t = csr.node_index(source), csr.node_index(target)
+    if csr.weights.size and csr.weights.min() < 0:
+        raise ValueError("Contradictory paths found: negative weights?")
+
+    indptr, indices, weights = csr.indptr, csr.indices, csr.weights
+    # Plain floats, indexing a NumPy array per relaxed edge dominates the search otherwise
+    potential = np.asarray(potential, dtype=np.float64).tolist()
+    distances = {s: 0.0}
+    predecessors = {s: NO_PREDECESSOR}
+    settled = set()
+    heap = [(potential[s], 0.0, s)]
+
+    while heap:
+        _, distance, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == t:
+            result = csr.path_to(predecessors, t), csr.length_value(distance)
+            return result + (len(settled),) if return_settled else result
+
+        start, end = indptr[u], indptr[u + 1]
+        for v, w in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+            candidate = distance + w
+            if v not in settled and candidate < distances.get(v, float('inf')):
+                estimate = potential[v]
+                if estimate == float('inf'):
+                    # The target cannot be reached through v
+                    continue
+                distances[v] = candidate
+                predecessors[v] = u
+                heapq.heappush(heap, (candidate + estimate, candidate, v))
+
+    return ([], float('inf'), len(settled)) if return_settled else ([], float('inf'))
+
+
+if __name__ == "__main__":
+    # Compare the memory footprint of both representations on a generated graph
+    import tracemalloc
+
+    tracemalloc.start()
+    G = nx.gnm_random_graph(10000, 50000)
+    networkx_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    csr = CSRGraph.from_networkx(G)
+    print(f"networkx: {networkx_bytes / G.number_of_edges():.0f} bytes per edge")
+    print(f"CSR: {csr.nbytes / csr.number_of_edges():.0f} bytes per edge")
@@ -0,0 +1,347 @@
+import heapq
+import logging
+from collections import ChainMap
+
+import numpy as np
+import networkx as nx
+
+from scipy.sparse.csgraph import dijkstra
+
+from src.algorithms.csr_graph import NO_PREDECESSOR, CSRGraph, csr_shortest_path_tree
+
+logging.basicConfig(level=logging.INFO)
+
+# A repair settles nodes in Python, a full search in compiled code; past this fraction of
+# the nodes the tree is recomputed from scratch instead
+REPAIR_MAX_FRACTION = 0.005
+REPAIR_MIN_NODES = 256
+
+
+def _weight(value):
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid edge weight {value!r}.")
+    if not np.isfinite(weight) or weight < 0:
+        raise ValueError(f"Edge weights must be finite and non-negative, got {value!r}.")
+    return weight
+
+
+def _copy_structure(G):
+    # Copy of the adjacency dicts only, sharing node and edge attribute dicts with G;
+    # several times cheaper than G.copy(). Edges that change get new attribute dicts.
+    H = G.__class__()
+    H.graph.update(G.graph)
+    H._node.update(G._node)
+    H._adj.update((u, dict(neighbours)) for u, neighbours in G._adj.items())
+    if G.is_directed():
+        H._pred.update((v, dict(neighbours)) for v, neighbours in G._pred.items())
+    return H
+
+
+def _set_edge_weight(H, u, v, weight, value):
+    # Replace the attribute dict of an existing edge, it may be shared with the original graph
+    data = dict(H._adj[u][v], **{weight: value})
+    H._adj[u][v] = data
+    if H.is_directed():
+        H._pred[v][u] = data
+    else:
+        H._adj[v][u] = data
+
+
+def _apply_delta(add, remove, update, directed, current, set_weight, has_node, new_nodes):
+    # Validate and apply an edge delta through the accessors of a graph representation:
+    # current(u, v) gives the arc weight (inf when missing), set_weight(u, v, w, explicit)
+    # sets it (inf removes the edge) and has_node(u) tells whether the node exists.
+    # Returns the net arc changes.
+    first_weight = {}
+    changes = {}
+
+    def record(u, v, new):
+        arcs = [(u, v)] if directed or u == v else [(u, v), (v, u)]
+        for arc in arcs:
+            first_weight.setdefault(arc, current(*arc))
+            changes[arc] = new
+
+    def endpoints(edge, size):
+        if not isinstance(edge, (list, tuple)) or len(edge) not in size:
+            raise ValueError(f"Malformed edge {edge!r}.")
+        return edge
+
+    for edge in remove:
+        u, v = endpoints(edge, (2,))
+        if np.isinf(current(u, v)):
+            raise ValueError(f"Edge ({u}, {v}) not found in graph.")
+        record(u, v, float('inf'))
+        set_weight(u, v, float('inf'), True)
+
+    for edge in add:
+        u, v, *rest = endpoints(edge, (2, 3))
+        if not new_nodes:
+            # A node id of the wrong type (e.g. 0 for '0') would otherwise become a new node
+            for node in (u, v):
+                if not has_node(node):
+                    raise ValueError(f"Node {node!r} not found in graph, new nodes must be requested explicitly.")
+        new = _weight(rest[0]) if rest else 1
+        record(u, v, new)
+        set_weight(u, v, new, bool(rest))
+
+    for edge in update:
+        u, v, new = endpoints(edge, (3,))
+        if np.isinf(current(u, v)):
+            raise ValueError(f"Edge ({u}, {v}) not found in graph.")
+        new = _weight(new)
+        record(u, v, new)
+        set_weight(u, v, new, True)
+
+    return [(u, v, first_weight[(u, v)], new) for (u, v), new in changes.items() if first_weight[(u, v)] != new]
+
+
+def apply_edge_delta(G, add=(), remove=(), update=(), weight='weight', new_nodes=False):
+    """
+    Return a copy of G with edges removed, added and reweighted, in that order, and the
+    net arc changes as a list of (u, v, old_weight, new_weight) node id tuples, inf
+    standing for a missing arc and undirected edges giving one change per direction.
+
+    `add` holds [u, v] or [u, v, weight] edges (weight 1 when omitted), `remove` holds
+    [u, v] edges and `update` holds [u, v, weight] edges; weights are stored as floats.
+    Added edges may only create nodes with new_nodes=True.
+    Raises ValueError for missing edges and nodes, malformed items and negative weights.
+    G itself is not modified, so readers of the current graph are never affected.
+    """
+    if G.is_multigraph():
+        raise ValueError("Edge updates are not supported on multigraphs.")
+    H = _copy_structure(G)
+
+    def current(u, v):
+        return H[u][v].get(weight, 1) if H.has_edge(u, v) else float('inf')
+
+    def set_weight(u, v, new, explicit):
+        if np.isinf(new):
+            H.remove_edge(u, v)
+        elif H.has_edge(u, v):
+            _set_edge_weight(H, u, v, weight, new)
+        elif explicit:
+            H.add_edge(u, v, **{weight: new})
+        else:
+            H.add_edge(u, v)
+
+    changes = _apply_delta(add, remove, update, H.is_directed(), current, set_weight, H.has_node, new_nodes)
+    return H, changes
+
+
+def apply_csr_edge_delta(csr, add=(), remove=(), update=(), new_nodes=False):
+    """
+    Like apply_edge_delta, for a graph held only in CSR form (e.g. a binary graph
+    file): returns the updated CSRGraph, new nodes appended after the existing ones,
+    and the net arc changes.
+    """
+    overlay = {}
+    added_nodes = {}
+
+    def current(u, v):
+        if (u, v) in overlay:
+            return overlay[(u, v)]
+        if u not in csr.index or v not in csr.index:
+            return float('inf')
+        i, j = csr.index[u], csr.index[v]
+        start, end = csr.indptr[i], csr.indptr[i + 1]
+        matches = np.flatnonzero(csr.indices[start:end] == j)
+        return csr.length_value(csr.weights[start + matches[0]]) if len(matches) else float('inf')
+
+    def set_weight(u, v, new, explicit):
+        for node in (u, v):
+            if node not in csr.index:
+                added_nodes.setdefault(node, csr.number_of_nodes() + len(added_nodes))
+        overlay[(u, v)] = new
+        if not csr.directed:
+            overlay[(v, u)] = new
+
+    changes = _apply_delta(add, remove, update, csr.directed, current, set_weight, csr.__contains__, new_nodes)
+    node_ids = list(csr.node_ids) + list(added_nodes) if added_nodes else None
+    index = ChainMap(added_nodes, csr.index)
+    sources, targets, _, new = index_changes(index, changes)
+    return csr.with_arc_changes(sources, targets, new, node_ids), changes
+
+
+def index_changes(index, changes):
+    """
+    Convert (u, v, old_weight, new_weight) node id changes into index arrays, given the
+    node id to index mapping of the changed graph.
+    """
+    sources = np.array([index[u] for u, _, _, _ in changes], dtype=np.int64)
+    targets = np.array([index[v] for _, v, _, _ in changes], dtype=np.int64)
+    old = np.array([float(w) for _, _, w, _ in changes], dtype=np.float64)
+    new = np.array([float(w) for _, _, _, w in changes], dtype=np.float64)
+    return sources, targets, old, new
+
+
+def updated_csr(csr, H, changes):
+    """
+    Apply arc changes to the CSR form of a graph, for the graph H returned by
+    apply_edge_delta. New nodes are appended after the existing ones, like in H.
+    """
+    known = csr.index
+    node_ids = list(csr.node_ids) + [node for node in H.nodes() if node not in known]
+    index = dict(known)
+    index.update((node, i) for i, node in enumerate(node_ids[len(known):], start=len(known)))
+    sources, targets, _, new = index_changes(index, changes)
+    return csr.with_arc_changes(sources, targets, new, node_ids)
+
+
+def _subtrees(predecessors, roots, limit):
+    # Nodes of the shortest path tree below (and including) the roots, None past `limit` nodes
+    order = np.argsort(predecessors, kind="stable")
+    sorted_predecessors = predecessors[order]
+    affected = []
+    seen = set()
+    stack = [int(root) for root in roots]
+    while stack:
+        x = stack.pop()
+        if x in seen:
+            continue
+        seen.add(x)
+        affected.append(x)
+        if len(affected) > limit:
+            return None
+        start, end = np.searchsorted(sorted_predecessors, [x, x + 1])
+        stack.extend(order[start:end].tolist())
+    return affected
+
+
+def repair_shortest_path_tree(csr, source, distances, predecessors, changes):
+    """
+    Bring a single-source shortest path tree up to date after arcs changed.
+
+    `csr` is the graph after the change, whose first nodes are the nodes the tree of
+    `source` was computed on, in the same order. `changes` are the (sources, targets, old weights,
+    new weights) index arrays of the changed arcs. Only the part of the tree that
+    depends on longer or removed tree arcs is recomputed, seeded from its unaffected
+    in-neighbours, and improvements from shorter or added arcs are propagated from
+    their heads, both with a Dijkstra search that stops where nothing changes. When
+    that touches more than REPAIR_MAX_FRACTION of the nodes the tree is recomputed.
+
+    Returns the new distance and predecessor arrays and the number of nodes touched.
+    """
+    num_nodes = csr.number_of_nodes()
+    dist = np.full(num_nodes, np.inf)
+    dist[:len(distances)] = distances
+    pred = np.full(num_nodes, NO_PREDECESSOR, dtype=np.int32)
+    pred[:len(predecessors)] = predecessors
+    sources, targets, old_weights, new_weights = changes
+
+    max_touched = max(REPAIR_MIN_NODES, int(REPAIR_MAX_FRACTION * num_nodes))
+
+    # Nodes whose tree path used an arc that got longer or disappeared lose their distance
+    longer = (new_weights > old_weights) & (pred[targets] == sources)
+    affected = _subtrees(pred, targets[longer], max_touched) if longer.any() else []
+    if affected is None:
+        return _recompute(csr, source)
+    dist[affected] = np.inf
+    pred[affected] = NO_PREDECESSOR
+
+    indptr, indices, weights = csr.indptr, csr.indices, csr.weights
+    reverse_indptr, reverse_indices, reverse_weights = csr.reverse
+    heap = []
+    for x in affected:
+        start, end = reverse_indptr[x], reverse_indptr[x + 1]
+        if start == end:
+            continue
+        candidates = dist[reverse_indices[start:end]] + reverse_weights[start:end]
+        best = int(np.argmin(candidates))
+        if candidates[best] < dist[x]:
+            dist[x] = candidates[best]
+            pred[x] = reverse_indices[start + best]
+            heap.append((dist[x], x))
+
+    for u, v, new in zip(sources.tolist(), targets.tolist(), new_weights.tolist()):
+        if dist[u] + new < dist[v]:
+            dist[v] = dist[u] + new
+            pred[v] = u
+            heap.append((dist[v], v))
+
+    heapq.heapify(heap)
+    touched = set(affected)
+    while heap:
+        d, x = heapq.heappop(heap)
+        if d > dist[x]:
+            continue
+        touched.add(x)
+        if len(touched) > max_touched:
+            return _recompute(csr, source)
+        for k in range(indptr[x], indptr[x + 1]):
+            y = indices[k]
+            candidate = d + weights[k]
+            if candidate < dist[y]:
+                dist[y] = candidate
+                pred[y] = x
+                heapq.heappush(heap, (candidate, y))
+
+    return dist, pred, len(touched)
+
+
+def _recompute(csr, source):
+    distances, predecessors = dijkstra(csr.matrix, directed=True, indices=source, return_predecessors=True)
+    return distances, predecessors.astype(np.int32), csr.number_of_nodes()
+
+
+class DynamicShortestPaths:
+    """
+    Shortest path trees of a set of sources kept current while the graph changes.
+
+    With sources=None every node is a source, so all pairs distances are maintained;
+    meant for small graphs, a tree costs 12 bytes per node. Edge insertions, deletions
+    and weight changes are applied with `apply`, which repairs only the affected part
+    of each tree instead of recomputing it (see repair_shortest_path_tree).
+    """
+
+    def __init__(self, G, sources=None, weight='weight'):
+        self.G = G
+        self.weight = weight
+        self.csr = CSRGraph.from_networkx(G, weight=weight)
+        if self.csr.weights.size and self.csr.weights.min() < 0:
+            raise ValueError("Dynamic shortest paths need non-negative weights.")
+        sources = self.csr.node_ids if sources is None else sources
+        self.trees = {}
+        for source in sources:
+            distances, predecessors = csr_shortest_path_tree(self.csr, source)
+            self.trees[source] = (distances, predecessors.astype(np.int32))
+
+    def apply(self, add=(), remove=(), update=(), new_nodes=False):
+        """
+        Apply an edge delta (see apply_edge_delta) to the graph and repair every tree.
+        Returns the number of changed arcs and of tree nodes that were touched.
+        """
+        H, changes = apply_edge_delta(self.G, add, remove, update, weight=self.weight, new_nodes=new_nodes)
+        csr = updated_csr(self.csr, H, changes)
+        indexed = index_changes(csr.index, changes)
+
+        touched = 0
+        for source, (distances, predecessors) in self.trees.items():
+            distances, predecessors, count = repair_shortest_path_tree(csr, csr.index[source], distances,
+                                                                       predecessors, indexed)
+            self.trees[source] = (distances, predecessors)
+            touched += count
+
+        self.G, self.csr = H, csr
+        logging.info(f"Applied {len(changes)} arc changes, touched {touched} nodes of {len(self.trees)} trees.")
+        return {"changed_arcs": len(changes), "touched_nodes": touched}
+
+    def distance(self, source, target):
+        distances, _ = self.trees[source]
+        return self.csr.length_value(distances[self.csr.node_index(target)])
+
+    def path(self, source, target):
+        distances, predecessors = self.trees[source]
+        t = self.csr.node_index(target)
+        if np.isinf(distances[t]):
+            return []
+        return self.csr.path_to(predecessors, t)
+
+
+if __name__ == "__main__":
+    # Example usage with a generated graph
+    G = nx.relabel_nodes(nx.grid_2d_graph(30, 30), lambda node: f"{node[0]}-{node[1]}")
+    paths = DynamicShortestPaths(G, sources=["0-0", "15-15"])
+    paths.apply(remove=[["0-0", "0-1"]], add=[["0-0", "29-29", 3]])
+    print(f"Distance from 0-0 to 29-29: {paths.distance('0-0', '29-29')}")
@@ -0,0 +1,458 @@
+import argparse
+import time
+import logging
+
+import numpy as np
+import networkx as nx
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from src.algorithms.csr_graph import CSRGraph, as_csr
+from src.models.graph_features import core_numbers
+
+logging.basicConfig(level=logging.INFO)
+
+REDUCTION_STRATEGIES = ("chains", "kcore", "spanner")
+
+DEFAULT_CORE_K = 3
+DEFAULT_STRETCH = 3
+
+# Source/target pairs sampled by evaluate_reduction
+DEFAULT_EVALUATION_PAIRS = 100
+
+
+class GraphReduction:
+    """
+    A reduced graph and the map lifting distances on it back to the original graph.
+
+    `kept[r]` is the original index of node r of the reduced graph. Every original
+    node has up to two portals: reduced nodes it reaches at the given offsets, -1 for
+    none (kept nodes are their own portal at offset 0). A distance is lifted as the
+    shortest offset + reduced distance + offset over the portals of both ends.
+
+    Removed nodes are grouped in pieces (a contracted chain with the trees hanging
+    from it, the trees hanging from one kept node, a component of the nodes outside
+    the core); a path between two nodes of the same piece may never reach a portal,
+    so those pairs also get a search of the original graph restricted to the piece
+    and its neighbours.
+
+    `stretch` bounds lifted / true distance: 1 for exact reductions, None when the
+    lifted distance is only known to be an upper bound.
+    """
+
+    def __init__(self, strategy, original, reduced, kept, portals, offsets, pieces, stretch):
+        self.strategy = strategy
+        self.original = original
+        self.reduced = reduced
+        self.kept = kept
+        self.portals = portals
+        self.offsets = offsets
+        self.pieces = pieces
+        self.stretch = stretch
+        self.build_time = 0.0
+        self._piece_members = None
+
+    @property
+    def exact(self):
+        return self.stretch == 1
+
+    def stats(self):
+        return {
+            "strategy": self.strategy,
+            "nodes": [self.original.number_of_nodes(), self.reduced.number_of_nodes()],
+            "edges": [self.original.number_of_edges(), self.reduced.number_of_edges()],
+            "stretch": self.stretch,
+            "build_seconds": round(self.build_time, 4),
+        }
+
+    def _piece_distance(self, i, j):
+        # Search the original graph restricted to the piece of i and j and its neighbours
+        if self._piece_members is None:
+            order = np.argsort(self.pieces, kind="stable")
+            bounds = np.searchsorted(self.pieces[order], np.arange(self.pieces.max(initial=-1) + 2))
+            self._piece_members = order, bounds
+        order, bounds = self._piece_members
+        piece = self.pieces[i]
+        members = order[bounds[piece]:bounds[piece + 1]]
+        matrix = self.original.matrix
+        nodes = np.union1d(members, matrix[members].indices)
+        local = matrix[nodes][:, nodes]
+        positions = np.searchsorted(nodes, [i, j])
+        return dijkstra(local, directed=False, indices=positions[0])[positions[1]]
+
+    def index_distance(self, i, j):
+        """
+        Lifted distance between the original node indices i and j, as a float.
+        """
+        if i == j:
+            return 0.0
+        sources = [(p, o) for p, o in zip(self.portals[i], self.offsets[i]) if p >= 0]
+        targets = [(p, o) for p, o in zip(self.portals[j], self.offsets[j]) if p >= 0]
+        best = np.inf
+        if sources and targets:
+            rows = dijkstra(self.reduced.matrix, directed=self.reduced.directed, indices=[p for p, _ in sources])
+            for (_, source_offset), row in zip(sources, rows):
+                for target, target_offset in targets:
+                    best = min(best, source_offset + row[target] + target_offset)
+        if self.pieces[i] >= 0 and self.pieces[i] == self.pieces[j]:
+            best = min(best, self._piece_distance(i, j))
+        return float(best)
+
+    def distance(self, source, target):
+        """
+        Lifted distance between two nodes of the original graph, typed like networkx
+        lengths (see CSRGraph.length_value).
+        Raises nx.NodeNotFound for unknown nodes.
+        """
+        i, j = self.original.node_index(source), self.original.node_index(target)
+        return self.original.length_value(self.index_distance(i, j))
+
+
+class ChainReduction(GraphReduction):
+    """
+    GraphReduction of contract_chains, which answers pairs of the same piece without
+    a search. Every removed node hangs in a tree from a node left after peeling, its
+    `anchor` (itself for the others), at `anchor_offset`; `parent` and `depth` walk
+    up that tree. `chain_position` is the offset of a chain node from the first end
+    of its chain.
+    """
+
+    def __init__(self, original, reduced, kept, portals, offsets, pieces, parent, depth, anchor, anchor_offset,
+                 chain_position):
+        super().__init__("chains", original, reduced, kept, portals, offsets, pieces, 1)
+        self.parent = parent
+        self.depth = depth
+        self.anchor = anchor
+        self.anchor_offset = anchor_offset
+        self.chain_position = chain_position
+
+    def _piece_distance(self, i, j):
+        ai, aj = self.anchor[i], self.anchor[j]
+        if ai != aj:
+            # Trees hanging from two nodes of one chain: along the chain between them
+            return self.anchor_offset[i] + abs(self.chain_position[ai] - self.chain_position[aj]) + \
+                self.anchor_offset[j]
+        # Same tree: through the lowest common ancestor
+        u, v = i, j
+        while self.depth[u] > self.depth[v]:
+            u = self.parent[u]
+        while self.depth[v] > self.depth[u]:
+            v = self.parent[v]
+        while u != v:
+            u, v = self.parent[u], self.parent[v]
+        return self.anchor_offset[i] + self.anchor_offset[j] - 2 * self.anchor_offset[u]
+
+
+def _undirected_arcs(csr):
+    # Rows, columns and weights of the arcs of an undirected graph, without self-loops
+    if csr.directed:
+        raise ValueError("Graph reduction supports undirected graphs only.")
+    if csr.weights.size and csr.weights.min() < 0:
+        raise ValueError("Graph reduction requires non-negative weights.")
+    rows = np.repeat(np.arange(csr.number_of_nodes(), dtype=np.int64), np.diff(csr.indptr))
+    cols = np.asarray(csr.indices, dtype=np.int64)
+    loops = rows == cols
+    return rows[~loops], cols[~loops], csr.weights[~loops]
+
+
+def _build_reduced(csr, kept, rows, cols, weights):
+    # CSRGraph on the kept nodes from arcs given in original indices, keeping the lightest of parallel arcs
+    position = np.full(csr.number_of_nodes(), -1, dtype=np.int64)
+    position[kept] = np.arange(len(kept))
+    rows, cols = position[rows], position[cols]
+    order = np.lexsort((weights, cols, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    matrix = coo_matrix((weights[first], (rows[first], cols[first])), shape=(len(kept), len(kept))).tocsr()
+    index_dtype = np.int32 if max(len(kept), matrix.nnz) < 2 ** 31 else np.int64
+    node_ids = [csr.node_ids[i] for i in kept.tolist()]
+    return CSRGraph(matrix.indptr.astype(index_dtype), matrix.indices.astype(index_dtype), matrix.data, node_ids,
+                    directed=False, integral=csr.integral)
+
+
+def contract_chains(G, weight=None):
+    """
+    Exact reduction of an undirected graph: trees hanging from the rest of the graph
+    are peeled off leaf by leaf, then every chain of degree-2 nodes between two
+    other nodes is replaced by a single edge weighted with the chain's length (the
+    lightest one when several chains or an edge join the same nodes). Nodes of a
+    chain lift through both of its ends, hanging nodes through the node they hang from.
+    """
+    csr = as_csr(G, weight)
+    num_nodes = csr.number_of_nodes()
+    rows, cols, weights = _undirected_arcs(csr)
+    starts = np.zeros(num_nodes + 1, dtype=np.int64)
+    starts[1:] = np.cumsum(np.bincount(rows, minlength=num_nodes))
+    cols_list, weights_list = cols.tolist(), weights.tolist()
+    degree = np.diff(starts).tolist()
+
+    # Peel degree-1 nodes; parent is the neighbour a node hung from when it was removed
+    removed = [False] * num_nodes
+    parent = [-1] * num_nodes
+    parent_weight = [0.0] * num_nodes
+    removal_order = []
+    queue = [i for i in range(num_nodes) if degree[i] == 1]
+    while queue:
+        v = queue.pop()
+        if removed[v] or degree[v] != 1:
+            continue
+        for position in range(starts[v], starts[v + 1]):
+            p = cols_list[position]
+            if not removed[p]:
+                break
+        removed[v] = True
+        parent[v], parent_weight[v] = p, weights_list[position]
+        removal_order.append(v)
+        degree[v] = 0
+        degree[p] -= 1
+        if degree[p] == 1:
+            queue.append(p)
+
+    # Remaining neighbours of the nodes left after peeling
+    alive = ~np.array(removed, dtype=bool)
+    live = alive[rows] & alive[cols]
+    live_rows, live_cols, live_weights = rows[live], cols[live], weights[live]
+    live_degree = np.bincount(live_rows, minlength=num_nodes)
+    chain = alive & (live_degree == 2)
+    chain_arcs = chain[live_rows]
+    links = {}
+    for v, u, w in zip(live_rows[chain_arcs].tolist(), live_cols[chain_arcs].tolist(),
+                       live_weights[chain_arcs].tolist()):
+        links.setdefault(v, []).append((u, w))
+
+    # Walk every chain from one of its ends; cycles made only of chain nodes keep one node as an end
+    is_chain = chain.tolist()
+    ends = [(-1, 0.0, -1, 0.0)] * num_nodes
+    piece = [-1] * num_nodes
+    chain_edges = []
+    hubs = np.flatnonzero(alive & ~chain).tolist()
+    hub_arcs = ~chain[live_rows] & chain[live_cols]
+    starts_from = list(zip(live_rows[hub_arcs].tolist(), live_cols[hub_arcs].tolist(),
+                           live_weights[hub_arcs].tolist()))
+    num_chains = 0
+    for v in np.flatnonzero(chain).tolist() + [None]:
+        while starts_from:
+            a, x, w = starts_from.pop()
+            if piece[x] >= 0:
+                continue
+            members, lengths = [], []
+            previous, current, length = a, x, w
+            while is_chain[current]:
+                members.append(current)
+                lengths.append(length)
+                piece[current] = num_chains
+                (n1, w1), (n2, w2) = links[current]
+                previous, current, length = (current, n2, length + w2) if n1 == previous else \
+                    (current, n1, length + w1)
+            b = current
+            for member, offset in zip(members, lengths):
+                ends[member] = (a, offset, b, length - offset)
+            if a != b:
+                chain_edges.append((a, b, length))
+            num_chains += 1
+        if v is not None and piece[v] < 0:
+            # An unvisited chain node lies on a cycle without ends, it becomes one
+            is_chain[v] = False
+            hubs.append(v)
+            starts_from.extend((v, u, w) for u, w in links[v])
+
+    kept = np.array(sorted(hubs), dtype=np.int64)
+    is_kept = np.zeros(num_nodes, dtype=bool)
+    is_kept[kept] = True
+    hub_edges = is_kept[live_rows] & is_kept[live_cols]
+    if chain_edges:
+        extra = np.array(chain_edges, dtype=np.float64)
+        a, b = extra[:, 0].astype(np.int64), extra[:, 1].astype(np.int64)
+        edge_rows = np.concatenate([live_rows[hub_edges], a, b])
+        edge_cols = np.concatenate([live_cols[hub_edges], b, a])
+        edge_weights = np.concatenate([live_weights[hub_edges], extra[:, 2], extra[:, 2]])
+    else:
+        edge_rows, edge_cols, edge_weights = live_rows[hub_edges], live_cols[hub_edges], live_weights[hub_edges]
+    reduced = _build_reduced(csr, kept, edge_rows, edge_cols, edge_weights)
+
+    position = np.full(num_nodes, -1, dtype=np.int64)
+    position[kept] = np.arange(len(kept))
+    portals = np.full((num_nodes, 2), -1, dtype=np.int64)
+    offsets = np.zeros((num_nodes, 2), dtype=np.float64)
+    portals[kept, 0] = position[kept]
+    for v in range(num_nodes):
+        if piece[v] >= 0:
+            a, da, b, db = ends[v]
+            portals[v] = position[a], position[b]
+            offsets[v] = da, db
+
+    # Hanging nodes take the portals of the node they hang from, plus the way there; nodes
+    # are visited in reverse removal order, so a removed parent has already been placed
+    hang_piece = {}
+    depth = [0] * num_nodes
+    anchor = list(range(num_nodes))
+    anchor_offset = [0.0] * num_nodes
+    for v in reversed(removal_order):
+        p, w = parent[v], parent_weight[v]
+        portals[v], offsets[v] = portals[p], offsets[p] + w
+        depth[v], anchor[v], anchor_offset[v] = depth[p] + 1, anchor[p], anchor_offset[p] + w
+        if removed[p] or piece[p] >= 0:
+            piece[v] = piece[p]
+        else:
+            piece[v] = hang_piece.setdefault(p, num_chains + len(hang_piece))
+    chain_position = [ends[v][1] for v in range(num_nodes)]
+    return ChainReduction(csr, reduced, kept, portals, offsets, np.array(piece, dtype=np.int64), parent, depth,
+                          anchor, anchor_offset, chain_position)
+
+
+def peel_core(G, k=DEFAULT_CORE_K, weight=None):
+    """
+    Reduce an undirected graph to its k-core. Every node outside the core lifts
+    through its nearest core node, so lifted distances are upper bounds: a path
+    through the periphery that is shorter than any path in the core is missed.
+    """
+    csr = as_csr(G, weight)
+    rows, cols, weights = _undirected_arcs(csr)
+    in_core = np.asarray(core_numbers(csr)) >= k
+    kept = np.flatnonzero(in_core)
+    if not len(kept):
+        logging.warning(f"The graph has an empty {k}-core, every query falls back to a search of the whole graph.")
+    inside = in_core[rows] & in_core[cols]
+    reduced = _build_reduced(csr, kept, rows[inside], cols[inside], weights[inside])
+
+    num_nodes = csr.number_of_nodes()
+    position = np.full(num_nodes, -1, dtype=np.int64)
+    position[kept] = np.arange(len(kept))
+    portals = np.full((num_nodes, 2), -1, dtype=np.int64)
+    offsets = np.zeros((num_nodes, 2), dtype=np.float64)
+    if len(kept):
+        distances, _, sources = dijkstra(csr.matrix, directed=False, indices=kept, min_only=True,
+                                         return_predecessors=True)
+        reachable = np.isfinite(distances)
+        portals[reachable, 0] = position[sources[reachable]]
+        offsets[reachable, 0] = distances[reachable]
+
+    # Pieces: the components of the graph restricted to the nodes outside the core
+    outside = ~in_core
+    periphery = coo_matrix((weights[outside[rows] & outside[cols]],
+                            (rows[outside[rows] & outside[cols]], cols[outside[rows] & outside[cols]])),
+                           shape=(num_nodes, num_nodes)).tocsr()
+    _, labels = connected_components(periphery, directed=False)
+    pieces = np.where(outside, labels, -1).astype(np.int64)
+    return GraphReduction("kcore", csr, reduced, kept, portals, offsets, pieces, None)
+
+
+def build_spanner(G, stretch=DEFAULT_STRETCH, weight=None, seed=None):
+    """
+    Sparsify an undirected graph into a spanner keeping every node (Baswana-Sen,
+    networkx.spanner): distances in the spanner are at most `stretch` times the
+    original ones, which is the error bound of every lifted distance. A spanner has
+    O(stretch * n^(1 + 2 / (stretch + 1))) edges, so it only sparsifies dense graphs.
+    """
+    csr = as_csr(G, weight)
+    rows, cols, weights = _undirected_arcs(csr)
+    upper = rows < cols
+    H = nx.Graph()
+    H.add_nodes_from(range(csr.number_of_nodes()))
+    H.add_weighted_edges_from(zip(rows[upper].tolist(), cols[upper].tolist(), weights[upper].tolist()))
+    spanner = nx.spanner(H, stretch, weight="weight", seed=seed)
+
+    edges = np.array([(u, v, d["weight"]) for u, v, d in spanner.edges(data=True)], dtype=np.float64).reshape(-1, 3)
+    u, v = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+    kept = np.arange(csr.number_of_nodes(), dtype=np.int64)
+    reduced = _build_reduced(csr, kept, np.concatenate([u, v]), np.concatenate([v, u]),
+                             np.concatenate([edges[:, 2], edges[:, 2]]))
+
+    portals = np.full((len(kept), 2), -1, dtype=np.int64)
+    portals[:, 0] = kept
+    return GraphReduction("spanner", csr, reduced, kept, portals, np.zeros((len(kept), 2)),
+                          np.full(len(kept), -1, dtype=np.int64), stretch)
+
+
+def reduce_graph(G, strategy="chains", weight=None, k=DEFAULT_CORE_K, stretch=DEFAULT_STRETCH, seed=None):
+    """
+    Reduce an undirected graph with one of REDUCTION_STRATEGIES and return the
+    GraphReduction:
+      - "chains": exact, see contract_chains
+      - "kcore": the k-core, upper bounds, see peel_core
+      - "spanner": a `stretch`-spanner, see build_spanner
+    Raises ValueError for unknown strategies and directed graphs.
+    """
+    start_time = time.perf_counter()
+    if strategy == "chains":
+        reduction = contract_chains(G, weight)
+    elif strategy == "kcore":
+        reduction = peel_core(G, k, weight)
+    elif strategy == "spanner":
+        reduction = build_spanner(G, stretch, weight, seed)
+    else:
+        raise ValueError(f"Unknown reduction strategy {strategy}.")
+    reduction.build_time = time.perf_counter() - start_time
+
+    stats = reduction.stats()
+    logging.info(f"Reduced graph with {strategy}: {stats['nodes'][0]} -> {stats['nodes'][1]} nodes, "
+                 f"{stats['edges'][0]} -> {stats['edges'][1]} edges in {reduction.build_time:.2f} seconds.")
+    return reduction
+
+
+def evaluate_reduction(reduction, num_pairs=DEFAULT_EVALUATION_PAIRS, seed=42):
+    """
+    Answer `num_pairs` random node pairs exactly on the original graph and lifted
+    from the reduced one, and report the reduction stats with the mean query times
+    (milliseconds), the speedup and the relative error of the lifted distances
+    (pairs with no path on either side are compared for equality only).
+    """
+    rng = np.random.default_rng(seed)
+    original = reduction.original
+    pairs = rng.integers(original.number_of_nodes(), size=(num_pairs, 2))
+
+    start_time = time.perf_counter()
+    exact = np.array([dijkstra(original.matrix, directed=False, indices=i)[j] for i, j in pairs.tolist()])
+    original_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    lifted = np.array([reduction.index_distance(i, j) for i, j in pairs.tolist()])
+    reduced_time = time.perf_counter() - start_time
+
+    finite = np.isfinite(exact) & np.isfinite(lifted) & (exact > 0)
+    errors = (lifted[finite] - exact[finite]) / exact[finite]
+    report = reduction.stats()
+    report.update({
+        "pairs": num_pairs,
+        "original_ms": round(original_time / num_pairs * 1000, 4),
+        "reduced_ms": round(reduced_time / num_pairs * 1000, 4),
+        "speedup": round(original_time / reduced_time, 2) if reduced_time else None,
+        "exact_pairs": int(np.count_nonzero(np.isclose(lifted, exact) | (np.isinf(lifted) & np.isinf(exact)))),
+        "unreachable_mismatches": int(np.count_nonzero(np.isinf(exact) != np.isinf(lifted))),
+        "mean_relative_error": float(errors.mean()) if errors.size else 0.0,
+        "max_relative_error": float(errors.max()) if errors.size else 0.0,
+    })
+    return report
+
+
+def compare_reductions(G, strategies=REDUCTION_STRATEGIES, num_pairs=DEFAULT_EVALUATION_PAIRS, seed=42, **options):
+    """
+    Reduce G with each strategy and return the evaluate_reduction report of each,
+    keyed by strategy. `options` are passed on to reduce_graph.
+    """
+    csr = as_csr(G, options.pop("weight", None))
+    return {strategy: evaluate_reduction(reduce_graph(csr, strategy, seed=seed, **options), num_pairs, seed)
+            for strategy in strategies}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare graph reduction strategies on a graph file.")
+    parser.add_argument("graph_file")
+    parser.add_argument("--format", default="edgelist", choices=["edgelist", "graphml", "gbin"])
+    parser.add_argument("--strategies", nargs="+", default=list(REDUCTION_STRATEGIES), choices=REDUCTION_STRATEGIES)
+    parser.add_argument("--pairs", type=int, default=DEFAULT_EVALUATION_PAIRS)
+    parser.add_argument("--k", type=int, default=DEFAULT_CORE_K)
+    parser.add_argument("--stretch", type=int, default=DEFAULT_STRETCH)
+    args = parser.parse_args(argv)
+
+    from src.serving.graph_registry import GRAPH_READERS
+
+    G = GRAPH_READERS[args.format](args.graph_file)
+    reports = compare_reductions(G, args.strategies, args.pairs, k=args.k, stretch=args.stretch)
+    for strategy, report in reports.items():
+        logging.info(f"{strategy}: {report}")
+
+
+if __name__ == "__main__":
+    main()
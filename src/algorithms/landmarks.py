@@ -0,0 +1,246 @@
+import argparse
+import os
+import logging
+
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+
+from src.algorithms.csr_graph import as_csr
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_NUM_LANDMARKS = 16
+
+# Hop counts are stored as uint16, with the largest value marking unreachable nodes
+UNREACHABLE = np.iinfo(np.uint16).max
+
+# Weighted distances are stored as float32; lower bounds are shrunk by this factor so
+# that rounding never makes them exceed the true distance
+FLOAT32_SAFETY = 1 - 1e-6
+
+
+def landmark_file(graph_file):
+    """
+    Return the path the landmark index of a graph file is persisted to.
+    """
+    return graph_file + ".landmarks.npz"
+
+
+def _compact(distances, weighted):
+    # Hop counts fit in uint16 on any graph with a diameter below 65535
+    finite = distances[np.isfinite(distances)]
+    if not weighted and (finite.size == 0 or finite.max() < UNREACHABLE):
+        compact = np.full(distances.shape, UNREACHABLE, dtype=np.uint16)
+        reachable = np.isfinite(distances)
+        compact[reachable] = distances[reachable]
+        return compact
+    return distances.astype(np.float32)
+
+
+def select_landmarks(csr, num_landmarks, strategy, weighted, rng):
+    """
+    Pick landmark node indices:
+      - "degree": the highest-degree nodes
+      - "random": uniformly random nodes
+      - "farthest": start from the highest-degree node, then repeatedly add the node
+        farthest from all landmarks chosen so far (nodes in unreached components first)
+    """
+    num_nodes = csr.number_of_nodes()
+    num_landmarks = min(num_landmarks, num_nodes)
+    degrees = np.diff(csr.indptr)
+
+    if strategy == "degree":
+        return np.argsort(-degrees, kind="stable")[:num_landmarks].astype(np.int32)
+    if strategy == "random":
+        return np.sort(rng.choice(num_nodes, size=num_landmarks, replace=False)).astype(np.int32)
+    if strategy != "farthest":
+        raise ValueError(f"Unsupported landmark strategy: {strategy}")
+
+    landmarks = [int(np.argmax(degrees))] if num_landmarks else []
+    closest = np.full(num_nodes, np.inf)
+    while len(landmarks) < num_landmarks:
+        distances = shortest_path(csr.matrix, method="D", directed=False, unweighted=not weighted,
+                                  indices=landmarks[-1])
+        closest = np.minimum(closest, distances)
+        closest[landmarks] = -1
+        landmarks.append(int(np.argmax(closest)))
+    return np.array(landmarks, dtype=np.int32)
+
+
+class LandmarkIndex:
+    """
+    ALT-style landmark distance index.
+
+    For k landmarks the index stores the k x V distances from every landmark
+    (`dist_from`) and, on directed graphs, to every landmark (`dist_to`), as uint16 hop
+    counts or float32 weighted distances. By the triangle inequality they give a lower
+    and an upper bound of the distance between any two nodes, which serve both as a
+    fast distance estimate and as an A* heuristic.
+
+    The rows are aligned with the node indices of the CSR graph the index was built on;
+    `graph_hash` records that graph's fingerprint and `weight` the edge attribute the
+    distances were measured with (None for hop counts).
+    """
+
+    def __init__(self, landmarks, dist_from, dist_to, graph_hash, index=None, weight=None):
+        self.landmarks = landmarks
+        self.dist_from = dist_from
+        self.dist_to = dist_to
+        self.graph_hash = graph_hash
+        self.index = index
+        self.weight = weight
+
+    @classmethod
+    def build(cls, G, num_landmarks=DEFAULT_NUM_LANDMARKS, strategy="farthest", weight=None, seed=42):
+        """
+        Build the index of G (networkx or CSRGraph). Distances are hop counts when weight
+        is None and weighted lengths otherwise.
+        """
+        csr = as_csr(G, weight)
+        weighted = weight is not None
+        rng = np.random.default_rng(seed)
+        landmarks = select_landmarks(csr, num_landmarks, strategy, weighted, rng)
+
+        dist_from = shortest_path(csr.matrix, method="D", directed=True, unweighted=not weighted, indices=landmarks)
+        dist_to = None
+        if csr.directed:
+            dist_to = shortest_path(csr.matrix.T.tocsr(), method="D", directed=True, unweighted=not weighted,
+                                    indices=landmarks)
+            dist_to = _compact(dist_to, weighted)
+
+        logging.info(f"Built landmark index with {len(landmarks)} landmarks ({strategy}) "
+                     f"over {csr.number_of_nodes()} nodes.")
+        return cls(landmarks, _compact(dist_from, weighted), dist_to, csr.fingerprint(), csr.index, weight)
+
+    @property
+    def nbytes(self):
+        return self.dist_from.nbytes + (self.dist_to.nbytes if self.dist_to is not None else 0)
+
+    def _as_float(self, distances):
+        # Decode stored distances into float64 with inf for unreachable nodes
+        if distances.dtype == np.uint16:
+            decoded = distances.astype(np.float64)
+            decoded[distances == UNREACHABLE] = np.inf
+            return decoded
+        return distances.astype(np.float64)
+
+    def bounds_indices(self, sources, targets):
+        """
+        Vectorized lower and upper bounds of the distances between node indices
+        `sources[i]` and `targets[i]`.
+        """
+        from_s = self._as_float(self.dist_from[:, sources])
+        from_t = self._as_float(self.dist_from[:, targets])
+
+        with np.errstate(invalid="ignore"):
+            if self.dist_to is None:
+                # d(s, t) >= |d(l, s) - d(l, t)| and d(s, t) <= d(l, s) + d(l, t)
+                lower = np.fmax.reduce(np.abs(from_s - from_t), axis=0)
+                upper = np.min(from_s + from_t, axis=0)
+            else:
+                # d(s, t) >= d(l, t) - d(l, s), d(s, t) >= d(s, l) - d(t, l), d(s, t) <= d(s, l) + d(l, t)
+                to_s = self._as_float(self.dist_to[:, sources])
+                to_t = self._as_float(self.dist_to[:, targets])
+                lower = np.fmax(np.fmax.reduce(from_t - from_s, axis=0), np.fmax.reduce(to_s - to_t, axis=0))
+                upper = np.min(to_s + from_t, axis=0)
+
+        lower = np.nan_to_num(np.maximum(lower, 0), nan=0.0, posinf=np.inf)
+        if self.dist_from.dtype != np.uint16:
+            lower = lower * FLOAT32_SAFETY
+        # A pair of identical nodes is at distance zero whatever the landmarks say
+        same = np.asarray(sources) == np.asarray(targets)
+        lower[same] = 0
+        upper[same] = 0
+        return lower, upper
+
+    def bounds(self, source, target):
+        """
+        Return the (lower, upper) bounds of the distance between two node ids.
+        """
+        lower, upper = self.bounds_indices(np.array([self.index[source]]), np.array([self.index[target]]))
+        return float(lower[0]), float(upper[0])
+
+    def potential(self, target):
+        """
+        Return the lower bounds of the distances from every node to `target`,
+        usable as the A* potential of a search towards it.
+        """
+        num_nodes = self.dist_from.shape[1]
+        t = self.index[target]
+        lower, _ = self.bounds_indices(np.arange(num_nodes), np.full(num_nodes, t))
+        return lower
+
+    def heuristic(self, u, v):
+        """
+        Lower bound of the distance from u to v, in the form networkx's astar_path expects.
+        """
+        return self.bounds(u, v)[0]
+
+    def save(self, path):
+        np.savez(path, landmarks=self.landmarks, dist_from=self.dist_from,
+                 dist_to=self.dist_to if self.dist_to is not None else np.empty(0),
+                 graph_hash=np.array(self.graph_hash), weight=np.array(self.weight or ""))
+        logging.info(f"Landmark index saved to {path}.")
+
+    @classmethod
+    def load(cls, path, csr, weight=None):
+        """
+        Load a persisted index for the CSR graph `csr`, with distances measured by the
+        edge attribute `weight` (hop counts when None).
+        Raises ValueError if the index was built on a different graph or with other weights.
+        """
+        with np.load(path) as data:
+            graph_hash = str(data["graph_hash"])
+            if graph_hash != csr.fingerprint():
+                raise ValueError(f"Landmark index {path} was built for a different graph.")
+            if "weight" in data:
+                stored = str(data["weight"]) or None
+            elif data["dist_from"].dtype == np.uint16:
+                stored = None
+            else:
+                raise ValueError(f"Landmark index {path} does not record its edge weights.")
+            if stored != weight:
+                raise ValueError(f"Landmark index {path} holds {_distance_kind(stored)}, "
+                                 f"{_distance_kind(weight)} were asked for.")
+            dist_to = data["dist_to"] if data["dist_to"].size else None
+            return cls(data["landmarks"], data["dist_from"], dist_to, graph_hash, csr.index, stored)
+
+
+def _distance_kind(weight):
+    return "hop counts" if weight is None else f"distances weighted by {weight!r}"
+
+
+def load_or_build_landmarks(graph_file, csr, weight=None):
+    """
+    Load the landmark index persisted next to graph_file, or build one in memory with
+    the default settings if there is none, it is stale or it holds other distances.
+    """
+    path = landmark_file(graph_file)
+    if os.path.exists(path):
+        try:
+            return LandmarkIndex.load(path, csr, weight)
+        except ValueError as e:
+            logging.warning(f"{e} Rebuilding it in memory.")
+    return LandmarkIndex.build(csr, weight=weight)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the landmark distance index of a graph file.")
+    parser.add_argument("graph_file")
+    parser.add_argument("--format", choices=["edgelist", "graphml"], default="edgelist")
+    parser.add_argument("--landmarks", type=int, default=DEFAULT_NUM_LANDMARKS)
+    parser.add_argument("--strategy", choices=["farthest", "degree", "random"], default="farthest")
+    parser.add_argument("--weight", default=None, help="edge attribute holding the weights (default: hop counts)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from src.serving.graph_registry import GRAPH_READERS
+    G = GRAPH_READERS[args.format](args.graph_file)
+    index = LandmarkIndex.build(G, num_landmarks=args.landmarks, strategy=args.strategy,
+                                weight=args.weight, seed=args.seed)
+    index.save(landmark_file(args.graph_file))
+
+
+if __name__ == "__main__":
+    # Example: python -m src.algorithms.landmarks data/processed/social_networks/facebook_graph.edgelist
+    main()
@@ -1,23 +1,119 @@
-from flask import Flask, request, jsonify
-import joblib
-import networkx as nx
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
+import json
 import os
+import threading
+import time
 import logging
-from src.algorithms.classical_algorithms import dijkstra_shortest_path
-from src.models.train_shortest_path_model import generate_training_data, train_model
-from src.models.graph_reduction_and_model_compression import compress_model, reduce_graph_size
-from src.models.adapt_models_for_new_graphs import adapt_model_to_new_graph, evaluate_model_on_new_task
+import numpy as np
+from src.algorithms.classical_algorithms import POINT_TO_POINT_ALGORITHMS, coordinate_heuristic, point_to_point_search
+from src.algorithms.csr_graph import CSRGraph, as_csr
+from src.algorithms.dynamic_shortest_paths import apply_csr_edge_delta, apply_edge_delta, index_changes, updated_csr
+from src.algorithms.landmarks import LandmarkIndex, load_or_build_landmarks
+from src.models.batch_inference import parse_pair, predict_pairs
+from src.models.graph_features import DEFAULT_FEATURE_DIR, feature_spec, load_or_compute_node_features
+from src.serving.distance_cache import distance_cache
+from src.serving.graph_registry import graph_format, graph_registry
+from src.serving.job_queue import STATS_MAX_AGE, job_queue
+from src.serving.metrics import metrics, process_rss_bytes
+from src.serving.model_manager import model_manager
+from src.serving.preload import load_preload_manifest, readiness
+from src.serving.profiler import PROFILE_DIR, PROFILE_SLOW_REQUEST_MS, SamplingProfiler
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-app = Flask(__name__)
+# Routes of the API, served by the apps made by create_app
+api = Blueprint('api', __name__)
 
-@app.route('/predict', methods=['POST'])
+DEFAULT_GRAPH_FILE = "data/processed/social_networks/facebook_graph.edgelist"
+
+# Upper bound on the number of pairs accepted by /predict/batch in one request
+MAX_BATCH_PAIRS = 100000
+
+# Number of results serialized per chunk of a streamed batch response
+BATCH_RESPONSE_CHUNK = 1000
+
+# Model answering /predict and /predict/batch: "compressed" (the random forest) or
+# "flat" (the same forest compressed by compress_model, served without scikit-learn)
+SERVING_MODEL = os.environ.get("SERVING_MODEL", "compressed")
+
+# Serializes live edge updates, so that concurrent updates of a graph are not lost
+GRAPH_UPDATE_LOCK = threading.Lock()
+
+def serving_models():
+    """
+    The model manager of the app serving the current request.
+    """
+    return current_app.config['MODEL_MANAGER']
+
+def serving_distance_cache():
+    """
+    The distance cache of the app serving the current request.
+    """
+    return current_app.config['DISTANCE_CACHE']
+
+def timed(route, stage):
+    """
+    Time a stage of a request to `route` ("graph", "model", "compute" or "encode")
+    into its stage_seconds histogram.
+    """
+    return metrics.histogram("stage_seconds", route=route, stage=stage).time()
+
+@api.before_app_request
+def start_request_timer():
+    g.start_time = time.perf_counter()
+    if PROFILE_SLOW_REQUEST_MS > 0:
+        # Every request is profiled, the profile is only kept if the request was slow
+        g.profiler = SamplingProfiler().start()
+
+@api.after_app_request
+def record_status(response):
+    g.status = response.status_code
+    return response
+
+@api.teardown_app_request
+def record_request(exc):
+    start_time = g.pop('start_time', None)
+    if start_time is None:
+        return
+    duration = time.perf_counter() - start_time
+    route = (request.endpoint or 'unknown').rpartition('.')[2]
+    metrics.observe("request_seconds", duration, route=route)
+    metrics.increment("requests_total", route=route, status=g.pop('status', 500))
+
+    profiler = g.pop('profiler', None) if PROFILE_SLOW_REQUEST_MS > 0 else None
+    if profiler is not None:
+        profiler.stop()
+        if duration * 1000 >= PROFILE_SLOW_REQUEST_MS:
+            path = profiler.write(route, PROFILE_DIR)
+            logging.warning("Slow request %s %s took %.1f ms, profile written to %s.",
+                            request.method, request.path, duration * 1000, path)
+    metrics.maybe_export()
+
+def serving_gauges(flask_app):
+    """
+    Current sizes of the caches of `flask_app`, the job queue and the process, for /metrics.
+    """
+    graphs, distances = graph_registry.stats(), flask_app.config['DISTANCE_CACHE'].stats()
+    jobs = job_queue.stats(max_age=STATS_MAX_AGE)["jobs"]
+    return [
+        ("graph_registry_graphs", graphs["graphs"], {}),
+        ("graph_registry_bytes", graphs["bytes"], {}),
+        ("distance_cache_entries", distances["entries"], {}),
+        ("distance_cache_bytes", distances["bytes"], {}),
+        ("models_loaded", len(flask_app.config['MODEL_MANAGER'].stats()["models"]), {}),
+        ("job_queue_depth", jobs.get("queued", 0), {"status": "queued"}),
+        ("job_queue_depth", jobs.get("running", 0), {"status": "running"}),
+        ("process_rss_bytes", process_rss_bytes(), {}),
+        ("ready", int(readiness.ready), {}),
+    ]
+
+@api.route('/predict', methods=['POST'])
 def predict():
     """
     Predict the shortest path length using the machine learning model.
     This endpoint expects JSON input with source and target nodes, and an optional graph file path.
+    An optional mode of "landmarks" answers from the landmark distance index instead of the model.
     """
     data = request.get_json()
     
@@ -29,14 +125,16 @@ def predict():
         return jsonify({'error': 'Invalid input data types.'}), 400
     
     # Load the graph from the provided file or use the default path
-    graph_file = data.get('graph_file', "data/processed/social_networks/facebook_graph.edgelist")
+    graph_file = data.get('graph_file', DEFAULT_GRAPH_FILE)
     
     # Check if the file exists before loading
     if not os.path.exists(graph_file):
         logging.error(f"Graph file {graph_file} not found.")
         return jsonify({'error': f"Graph file {graph_file} not found."}), 400
     
-    G = nx.read_edgelist(graph_file)
+    fmt = graph_format(graph_file)
+    with timed("predict", "graph"):
+        G = graph_registry.get(graph_file, fmt=fmt)
     
     # Check if the graph is empty
     if G.number_of_nodes() == 0:
@@ -45,105 +143,478 @@ def predict():
     
     # Check for self-loop case
     if source == target and G.has_edge(source, target):
-        logging.info(f"Self-loop detected for node {source}.")
+        logging.debug("Self-loop detected for node %s.", source)
         return jsonify({'predicted_length': 0})
     
-    # Load the pre-trained machine learning model
-    model = joblib.load("src/models/compressed_shortest_path_model.pkl")
+    # Answer from the landmark index instead of the model if asked to
+    mode = data.get('mode', 'model')
+    if mode == 'landmarks':
+        return predict_with_landmarks(graph_file, G, source, target)
+    if mode != 'model':
+        return jsonify({'error': f"Unknown prediction mode {mode}."}), 400
+    
+    # Get the pre-trained machine learning model
+    with timed("predict", "model"):
+        model = serving_models().get(SERVING_MODEL)
+    
+    # Models trained on structural features are fed the pair features of the graph
+    with timed("predict", "graph"):
+        node_features = serving_node_features(graph_file, model, fmt=fmt)
+    if node_features is None:
+        X = [[source, target]]
+    else:
+        for node in (source, target):
+            if node not in G:
+                return jsonify({'error': f"Node {node} not found in graph."}), 400
+        X = node_features.pair_features([node_features.index[source]], [node_features.index[target]])
     
     # Predict the shortest path length between the source and target nodes
-    predicted_length = model.predict([[source, target]])[0]
+    with timed("predict", "compute"):
+        predicted_length = model.predict(X)[0]
     
-    logging.info(f"Predicted length from {source} to {target} is {predicted_length}.")
+    # Per-request details are only logged at debug level, formatted lazily
+    logging.debug("Predicted length from %s to %s is %s.", source, target, predicted_length)
     
     # Return the predicted length as a JSON response
-    return jsonify({'predicted_length': int(predicted_length)})
+    with timed("predict", "encode"):
+        return jsonify({'predicted_length': int(predicted_length)})
+
+def serving_node_features(graph_file, model, fmt):
+    """
+    Return the structural node features of a registry graph for the feature spec of
+    the model, computed once per loaded graph, or None if the model was trained on raw node ids.
+    """
+    spec = feature_spec(model)
+    if spec is None:
+        return None
+    name = "node_features:" + json.dumps(spec, sort_keys=True)
+    cache_dir = current_app.config['FEATURE_DIR']
+    return graph_registry.get_derived(graph_file, name, lambda G: load_or_compute_node_features(G, spec, cache_dir),
+                                      fmt=fmt)
+
+def landmark_index(graph_file, fmt):
+    """
+    Return the hop-count landmark index of a registry graph. The index persisted next
+    to the graph file is used if present, otherwise one is built once in memory.
+    """
+    csr = graph_registry.get_derived(graph_file, "csr", as_csr, fmt=fmt)
+    return graph_registry.get_derived(graph_file, "landmarks", lambda G: load_or_build_landmarks(graph_file, csr),
+                                      fmt=fmt)
+
+def predict_with_landmarks(graph_file, G, source, target):
+    """
+    Estimate the shortest path length from the landmark index of the graph.
+    The estimate is the landmark upper bound, the length of an actual path through the
+    best landmark; the lower bound is returned alongside it.
+    """
+    for node in (source, target):
+        if node not in G:
+            return jsonify({'error': f"Node {node} not found in graph."}), 400
+    
+    index = landmark_index(graph_file, graph_format(graph_file))
+    lower, upper = index.bounds(source, target)
+    
+    if lower == float('inf'):
+        return jsonify({'error': f"No path between {source} and {target}."}), 400
+    if upper == float('inf'):
+        return jsonify({'error': f"No landmark reaches both {source} and {target}."}), 400
+    
+    return jsonify({'predicted_length': int(round(upper)), 'lower_bound': lower, 'upper_bound': upper})
+
+def read_batch_pairs():
+    """
+    Read the pairs of a /predict/batch request and the graph file they refer to.
+    Supports a JSON body, an NDJSON body with one pair per line, and a binary body
+    of little-endian int64 (source, target) node id pairs.
+    For NDJSON and binary bodies the graph file is passed as a query parameter.
+    """
+    mimetype = request.mimetype
+
+    if mimetype == 'application/x-ndjson':
+        lines = request.get_data(as_text=True).splitlines()
+        pairs = [parse_pair(json.loads(line)) for line in lines if line.strip()]
+        return pairs, request.args.get('graph_file', DEFAULT_GRAPH_FILE)
+
+    if mimetype == 'application/octet-stream':
+        body = request.get_data()
+        if len(body) % 16:
+            raise ValueError('Binary body must contain int64 (source, target) pairs.')
+        ids = np.frombuffer(body, dtype='<i8').reshape(-1, 2)
+        pairs = [(str(source), str(target)) for source, target in ids.tolist()]
+        return pairs, request.args.get('graph_file', DEFAULT_GRAPH_FILE)
+
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('pairs'), list):
+        raise ValueError('Request body must contain a list of pairs.')
+    pairs = [parse_pair(item) for item in data['pairs']]
+    return pairs, data.get('graph_file', DEFAULT_GRAPH_FILE)
+
+def stream_batch_results(results, ndjson):
+    """
+    Serialize batch results in input order, a chunk at a time.
+    """
+    # Timed here, the chunks are serialized while the response is sent after the view returned
+    start_time = time.perf_counter()
+    if not ndjson:
+        yield '{"results": ['
+    for start in range(0, len(results), BATCH_RESPONSE_CHUNK):
+        chunk = [json.dumps(result) for result in results[start:start + BATCH_RESPONSE_CHUNK]]
+        if ndjson:
+            yield '\n'.join(chunk) + '\n'
+        else:
+            yield (',' if start else '') + ','.join(chunk)
+    if not ndjson:
+        yield ']}'
+    metrics.observe("stage_seconds", time.perf_counter() - start_time, route="predict_batch", stage="encode")
+
+@api.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Predict the shortest path lengths of many source/target pairs with one model call.
+    Results are streamed back in the order of the pairs, with a per-pair error for
+    unknown nodes or invalid ids.
+    """
+    try:
+        pairs, graph_file = read_batch_pairs()
+    except ValueError as e:
+        return jsonify({'error': f"Invalid batch request: {e}"}), 400
+    
+    if len(pairs) > MAX_BATCH_PAIRS:
+        return jsonify({'error': f"Too many pairs, at most {MAX_BATCH_PAIRS} are allowed per request."}), 400
+    
+    # Check if the file exists before loading
+    if not os.path.exists(graph_file):
+        logging.error(f"Graph file {graph_file} not found.")
+        return jsonify({'error': f"Graph file {graph_file} not found."}), 400
+    
+    fmt = graph_format(graph_file)
+    with timed("predict_batch", "graph"):
+        G = graph_registry.get(graph_file, fmt=fmt)
+    
+    # Check if the graph is empty
+    if G.number_of_nodes() == 0:
+        logging.error("Graph is empty.")
+        return jsonify({'error': 'Graph is empty.'}), 400
+    
+    with timed("predict_batch", "model"):
+        model = serving_models().get(SERVING_MODEL)
+    with timed("predict_batch", "graph"):
+        node_features = serving_node_features(graph_file, model, fmt=fmt)
+    with timed("predict_batch", "compute"):
+        results = predict_pairs(model, G, pairs, node_features)
+    
+    # Answer NDJSON requests (or clients asking for it) with NDJSON, everything else with JSON
+    ndjson = request.mimetype == 'application/x-ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(stream_batch_results(results, ndjson), mimetype=mimetype)
 
-@app.route('/dijkstra', methods=['POST'])
+def astar_heuristic(graph_file, G, name):
+    """
+    Return the A* heuristic of a registry graph: "landmarks" for the landmark distance
+    bounds, or "coordinates" for the straight-line distance between the x/y node attributes.
+    """
+    fmt = graph_format(graph_file)
+    if name == 'coordinates':
+        return graph_registry.get_derived(graph_file, "coordinates", coordinate_heuristic, fmt=fmt)
+    if name != 'landmarks':
+        raise ValueError(f"Unknown heuristic {name}.")
+    
+    if G.weights.size and (G.weights == 1).all():
+        # Hop-count bounds, shared with the landmarks prediction mode
+        return graph_registry.get_derived(graph_file, "landmarks",
+                                          lambda _: load_or_build_landmarks(graph_file, G), fmt=fmt)
+    return graph_registry.get_derived(graph_file, "landmarks:weight",
+                                      lambda _: LandmarkIndex.build(G, weight='weight'), fmt=fmt)
+
+@api.route('/dijkstra', methods=['POST'])
 def dijkstra():
     """
     Calculate the shortest path length using Dijkstra's algorithm.
     This endpoint expects JSON input with source and target nodes, and an optional graph file path.
+    An optional algorithm picks a point-to-point strategy (see POINT_TO_POINT_ALGORITHMS);
+    the response reports the number of nodes the search settled.
     """
     data = request.get_json()
     source = data['source']
     target = data['target']
+    algorithm = data.get('algorithm', 'dijkstra')
+    
+    if algorithm not in POINT_TO_POINT_ALGORITHMS:
+        return jsonify({'error': f"Unknown algorithm {algorithm}."}), 400
     
     # Load the graph from the provided file or use the default path
-    graph_file = data.get('graph_file', "data/processed/social_networks/facebook_graph.edgelist")
-    G = nx.read_edgelist(graph_file)
+    graph_file = data.get('graph_file', DEFAULT_GRAPH_FILE)
+    # Search on the compact CSR form of the graph, built once per loaded graph
+    with timed("dijkstra", "graph"):
+        G = graph_registry.get_derived(graph_file, "csr", as_csr, fmt=graph_format(graph_file))
     
-    # Compute the shortest path and its length using Dijkstra's algorithm
-    path, length = dijkstra_shortest_path(G, source, target)
+    if algorithm == 'dijkstra':
+        # Compute the shortest path and its length using Dijkstra's algorithm, or answer from the cache
+        with timed("dijkstra", "compute"):
+            path, length, settled = serving_distance_cache().search(os.path.abspath(graph_file), G, source, target)
+    else:
+        try:
+            with timed("dijkstra", "graph"):
+                heuristic = astar_heuristic(graph_file, G, data.get('heuristic', 'landmarks')) \
+                    if algorithm == 'astar' else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with timed("dijkstra", "compute"):
+            path, length, settled = point_to_point_search(G, source, target, algorithm, heuristic)
     
-    logging.info(f"Dijkstra path from {source} to {target} is {path} with length {length}.")
+    logging.debug("%s path from %s to %s is %s with length %s, %s nodes settled.",
+                  algorithm, source, target, path, length, settled)
     
     # Return the path and length as a JSON response
-    return jsonify({'path': path, 'length': length})
+    with timed("dijkstra", "encode"):
+        return jsonify({'path': path, 'length': length, 'algorithm': algorithm, 'settled': settled})
+
+@api.route('/graph/edges', methods=['POST'])
+def update_graph_edges():
+    """
+    Apply edge insertions, deletions and weight updates to a loaded graph without reloading its file.
+    This endpoint expects JSON input with the graph file path and lists of edges to "remove" ([u, v]),
+    "add" ([u, v] or [u, v, weight]) and "update" ([u, v, weight]); added edges only create
+    nodes with "new_nodes": true. The cached shortest path trees of the graph are repaired
+    around the changed edges instead of being dropped.
+    The update only lives in the memory of the serving process, until the file itself changes,
+    so it is refused when the app is one of several serving workers (see asgi_app).
+    """
+    if not current_app.config['GRAPH_UPDATES']:
+        return jsonify({'error': "Edge updates would only reach one of several serving workers; "
+                                 "serve with a single worker or rewrite the graph file."}), 409
 
-@app.route('/adapt', methods=['POST'])
+    data = request.get_json()
+    graph_file = data.get('graph_file', DEFAULT_GRAPH_FILE)
+    if not os.path.exists(graph_file):
+        return jsonify({'error': f"Graph file {graph_file} not found."}), 400
+
+    fmt = graph_format(graph_file)
+    start_time = time.perf_counter()
+    # Updates of a graph are applied one at a time, requests reading it are never blocked
+    with GRAPH_UPDATE_LOCK:
+        old_csr = graph_registry.get_derived(graph_file, "csr", as_csr, fmt=fmt)
+        G = graph_registry.get(graph_file, fmt=fmt)
+        delta = {'add': data.get('add', []), 'remove': data.get('remove', []), 'update': data.get('update', []),
+                 'new_nodes': data.get('new_nodes') is True}
+        try:
+            if isinstance(G, CSRGraph):
+                # Binary graphs are served in CSR form only
+                csr, changes = apply_csr_edge_delta(G, **delta)
+                H = csr
+            else:
+                H, changes = apply_edge_delta(G, **delta)
+                csr = updated_csr(old_csr, H, changes)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        graph_registry.replace(graph_file, H, fmt=fmt, derived={"csr": csr})
+        trees, touched = serving_distance_cache().repair(os.path.abspath(graph_file), old_csr, csr,
+                                               index_changes(csr.index, changes))
+    duration = time.perf_counter() - start_time
+
+    logging.info(f"Applied {len(changes)} arc changes to {graph_file} in {duration:.3f} seconds, "
+                 f"{trees} cached trees repaired.")
+    return jsonify({'nodes': H.number_of_nodes(), 'edges': H.number_of_edges(), 'changed_arcs': len(changes),
+                    'repaired_trees': trees, 'touched_nodes': touched, 'seconds': duration})
+
+@api.route('/adapt', methods=['POST'])
 def adapt():
     """
     Adapt the machine learning model to a new graph.
-    This endpoint expects JSON input with the graph file path. 
-    It adapts the pre-trained model to the new graph and saves the adapted model.
+    This endpoint expects JSON input with the graph file path, and an optional sampling spec
+    to retrain on a sample of node pairs for large graphs. With mode "incremental" the last
+    adapted model is only updated with the pairs whose distance changed.
+    The retraining runs as a background job: the response carries the job id to follow
+    on /jobs/<job_id>, and the adapted model is published when the job succeeds.
+    With "wait": true the request blocks until the model is adapted and saved instead.
     """
     data = request.get_json()
     
-    # Load the new graph from the provided file path
+    # Check the new graph file before queueing the job
     graph_file = data['graph_file']
-    G = nx.read_graphml(graph_file)
+    if not os.path.exists(graph_file):
+        logging.error(f"Graph file {graph_file} not found.")
+        return jsonify({'error': f"Graph file {graph_file} not found."}), 400
     
-    # Load the pre-trained machine learning model
-    model = joblib.load("src/models/compressed_shortest_path_model.pkl")
+    # Imported on use, the adaptation code pulls in scikit-learn which serving otherwise does not need
+    from src.models.adapt_models_for_new_graphs import ADAPTATION_MODES
+
+    mode = data.get('mode', 'full')
+    if mode not in ADAPTATION_MODES:
+        return jsonify({'error': f"Unknown adaptation mode {mode}."}), 400
     
-    # Adapt the model to the new graph
-    adapted_model = adapt_model_to_new_graph(model, G)
+    # Identical adaptations that are still queued or running are coalesced into one job
+    job, coalesced = job_queue.submit_adapt(graph_file, fmt=graph_format(graph_file, "graphml"),
+                                            sampling=data.get('sampling'), mode=mode,
+                                            model_paths=serving_models().paths)
     
-    if adapted_model:
-        # Save the adapted model if adaptation was successful
-        joblib.dump(adapted_model, "src/models/adapted_shortest_path_model.pkl")
+    if not data.get('wait', False):
+        response = jsonify({'job_id': job['id'], 'status': job['status'], 'coalesced': coalesced})
+        return response, 202, {'Location': f"/jobs/{job['id']}"}
+    
+    job = job_queue.wait(job['id'])
+    if job['status'] == 'succeeded':
         logging.info(f"Model adapted and saved for graph {graph_file}.")
-        return jsonify({'status': 'Model adapted and saved.'})
-    else:
-        logging.error(f"Adaptation failed for graph {graph_file} due to no valid path.")
-        # Return an error message if adaptation failed due to no valid path
-        return jsonify({'status': 'Adaptation failed due to no valid path in the graph.'}), 400
+        return jsonify({'status': 'Model adapted and saved.', 'job_id': job['id']})
+    if job['status'] == 'cancelled':
+        return jsonify({'status': 'Adaptation cancelled.', 'job_id': job['id']}), 409
+    
+    logging.error(f"Adaptation failed for graph {graph_file}: {job['error']}")
+    # Return an error message if adaptation failed due to no valid path
+    return jsonify({'status': 'Adaptation failed due to no valid path in the graph.',
+                    'error': job['error'], 'job_id': job['id']}), 400
 
-@app.route('/evaluate', methods=['POST'])
+@api.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Report the status, stage and progress of a background job, and its result or error once finished.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Job {job_id} not found."}), 404
+    return jsonify(job)
+
+@api.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a background job. Queued jobs are cancelled at once, running jobs at their next stage.
+    """
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f"Job {job_id} not found."}), 404
+    if job['status'] in ('succeeded', 'failed'):
+        return jsonify({'error': f"Job {job_id} has already {job['status']}.", 'job': job}), 409
+    return jsonify(job)
+
+@api.route('/evaluate', methods=['POST'])
 def evaluate():
     """
     Evaluate the adapted model on a new task.
     This endpoint expects JSON input with source and target nodes, and the graph file path.
     It returns the accuracy of the adapted model on the specified task.
     """
+    from src.models.adapt_models_for_new_graphs import evaluate_model_on_new_task
+
     data = request.get_json()
     source = data['source']
     target = data['target']
     
-    # Check if the adapted model exists before attempting to load it
-    model_path = "src/models/adapted_shortest_path_model.pkl"
-    
-    if not os.path.exists(model_path):
+    # Get the adapted machine learning model, it only exists once /adapt has succeeded
+    try:
+        adapted_model = serving_models().get("adapted")
+    except FileNotFoundError:
         # Return an error if the adapted model is not found
         logging.error("Adapted model not found. Please adapt the model first.")
         return jsonify({'error': 'Adapted model not found. Please adapt the model first.'}), 400
     
-    # Load the adapted machine learning model
-    adapted_model = joblib.load(model_path)
-    
     # Load the graph from the provided file path
     graph_file = data['graph_file']
-    G = nx.read_graphml(graph_file)
+    fmt = graph_format(graph_file, "graphml")
+    G = graph_registry.get(graph_file, fmt=fmt)
     
     # Evaluate the adapted model's accuracy on the new task
-    accuracy = evaluate_model_on_new_task(adapted_model, G, source, target)
+    accuracy = evaluate_model_on_new_task(adapted_model, G, source, target,
+                                          serving_node_features(graph_file, adapted_model, fmt=fmt))
     
     logging.info(f"Evaluation accuracy for adapted model on graph {graph_file}: {accuracy}.")
     
     # Return the accuracy as a JSON response
     return jsonify({'accuracy': accuracy})
 
+@api.route('/stats', methods=['GET'])
+def stats():
+    """
+    Report the state of the serving caches: loaded graphs, models and cached distances,
+    with their hit ratios and memory usage.
+    """
+    return jsonify({
+        'graph_registry': graph_registry.stats(),
+        'models': serving_models().stats(),
+        'distance_cache': serving_distance_cache().stats(),
+        'jobs': job_queue.stats(),
+    })
+
+def warm_start(manifest):
+    """
+    Load the models and graphs of a preload manifest (see load_preload_manifest), with
+    the derived data their requests use, so that first requests do not pay for them.
+    Returns the seconds spent per model and graph.
+    """
+    with app.app_context():
+        return _warm_start(manifest)
+
+def _warm_start(manifest):
+    timings = {}
+    for name in model_manager.paths if manifest["models"] is None else manifest["models"]:
+        start_time = time.perf_counter()
+        model_manager.preload([name])
+        timings[f"model:{name}"] = time.perf_counter() - start_time
+
+    for graph in manifest["graphs"]:
+        graph_file, fmt = graph["path"], graph["format"]
+        if not os.path.exists(graph_file):
+            logging.warning("Graph file %s not found, skipping preload.", graph_file)
+            continue
+        start_time = time.perf_counter()
+        graph_registry.get(graph_file, fmt=fmt)
+        if "csr" in graph["derived"]:
+            graph_registry.get_derived(graph_file, "csr", as_csr, fmt=fmt)
+        if "landmarks" in graph["derived"]:
+            landmark_index(graph_file, fmt)
+        if "node_features" in graph["derived"]:
+            try:
+                serving_node_features(graph_file, model_manager.get(SERVING_MODEL), fmt=fmt)
+            except FileNotFoundError:
+                logging.warning("Model %s not found, skipping node features of %s.", SERVING_MODEL, graph_file)
+        timings[f"graph:{graph_file}"] = time.perf_counter() - start_time
+    return timings
+
+@api.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 200 once the graphs and models of the preload manifest
+    (SERVING_PRELOAD_MANIFEST) are loaded, 503 while they are loading or if loading failed.
+    The first call starts the warm start if the server did not.
+    """
+    readiness.start(lambda: warm_start(load_preload_manifest()))
+    status = readiness.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Expose request and per-stage latency histograms, request counts, cache sizes,
+    job queue depth and process RSS in the Prometheus text format.
+    """
+    # The gauges of the app answering, which may serve other caches than the process app
+    gauges = serving_gauges(current_app)
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+def create_app(models=None, distances=None, feature_dir=DEFAULT_FEATURE_DIR):
+    """
+    Create a Flask app serving the API. It uses the model manager and distance cache of
+    the process unless others are given, for instance by a benchmark serving its own
+    model with the distance cache disabled. Graphs always come from the process registry.
+    Set the GRAPH_UPDATES config to False where /graph/edges would only update one of
+    several processes serving the same graphs.
+    """
+    flask_app = Flask(__name__)
+    flask_app.config.update(MODEL_MANAGER=model_manager if models is None else models,
+                            DISTANCE_CACHE=distance_cache if distances is None else distances,
+                            FEATURE_DIR=feature_dir, GRAPH_UPDATES=True)
+    flask_app.register_blueprint(api)
+    return flask_app
+
+# The app of the process, serving its shared models and caches
+app = create_app()
+# Exports happen outside requests too, they report the caches of the process app
+metrics.register_gauges(lambda: serving_gauges(app))
+
 if __name__ == "__main__":
+    # Load the models and graphs of the preload manifest while the server starts, /ready reports when it is done
+    readiness.start(lambda: warm_start(load_preload_manifest()))
+    
     # Run the Flask app in debug mode
     app.run(debug=True)
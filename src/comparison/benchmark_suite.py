@@ -0,0 +1,314 @@
+import argparse
+import csv
+import functools
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import logging
+
+import joblib
+import networkx as nx
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from src.algorithms.all_pairs import all_pairs_shortest_paths
+from src.algorithms.classical_algorithms import point_to_point_search
+from src.algorithms.csr_graph import CSRGraph, csr_bellman_ford, csr_dijkstra
+from src.comparison.stats import summarize
+from src.models.graph_features import load_or_compute_node_features
+from src.models.training_data import generate_training_data
+
+logging.basicConfig(level=logging.INFO)
+
+GRAPH_FAMILIES = ("gnm", "ba", "grid")
+
+BENCHMARKS = (
+    "dijkstra", "bidirectional-dijkstra", "bellman-ford", "all-pairs",
+    "model-predict", "model-batch", "endpoint-predict", "endpoint-predict-batch", "endpoint-dijkstra",
+)
+
+# Largest graphs each benchmark runs on; beyond them a single run takes minutes
+MAX_NODES = {
+    "bellman-ford": 100000,
+    "all-pairs": 5000,
+}
+
+# Sampling spec of the small model trained for the inference benchmarks
+MODEL_SAMPLING = {"num_sources": 16, "pair_budget": 20000, "stratify": "degree", "seed": 42}
+
+# Relative slowdown of the median over the baseline reported as a regression
+DEFAULT_TOLERANCE = 0.2
+
+CSV_FIELDS = ["family", "size", "nodes", "edges", "benchmark", "count",
+              "mean_ms", "p50_ms", "p90_ms", "p99_ms", "min_ms", "max_ms", "peak_rss_mb"]
+
+
+def generate_graph(family, size, seed=42):
+    """
+    Generate a graph of about `size` nodes: "gnm" (random, 4 edges per node),
+    "ba" (Barabasi-Albert, 3 edges per new node) or "grid" (square 2D lattice).
+    """
+    if family == "gnm":
+        return nx.gnm_random_graph(size, 4 * size, seed=seed)
+    if family == "ba":
+        return nx.barabasi_albert_graph(size, 3, seed=seed)
+    if family == "grid":
+        side = max(int(round(size ** 0.5)), 1)
+        return nx.convert_node_labels_to_integers(nx.grid_2d_graph(side, side))
+    raise ValueError(f"Unsupported graph family: {family}")
+
+
+def sample_pairs(csr, num_pairs, seed=42):
+    """
+    Draw reproducible random (source, target) node id pairs.
+    """
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, csr.number_of_nodes(), size=(num_pairs, 2))
+    return [(csr.node_ids[s], csr.node_ids[t]) for s, t in indices.tolist()]
+
+
+def time_calls(fn, calls, warmup, repeats):
+    """
+    Time fn(*args) for every args in `calls`, `repeats` times over, after `warmup`
+    untimed calls. Returns the durations in nanoseconds.
+    """
+    for args in calls[:warmup]:
+        fn(*args)
+    samples = []
+    for _ in range(repeats):
+        for args in calls:
+            start = time.perf_counter_ns()
+            fn(*args)
+            samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def train_benchmark_model(G, feature_dir):
+    """
+    Train a small structural-feature model on G for the inference benchmarks.
+    """
+    node_features = load_or_compute_node_features(G, cache_dir=feature_dir)
+    data, labels = generate_training_data(G, sampling=MODEL_SAMPLING, node_features=node_features)
+    model = RandomForestRegressor(n_estimators=20, max_depth=12, min_samples_leaf=2, random_state=42)
+    model.fit(data, labels)
+    model.feature_spec_ = node_features.spec
+    return model, node_features
+
+
+def benchmark_graph(G, benchmarks, num_pairs, warmup, repeats, seed, work_dir):
+    """
+    Run the selected benchmarks on one graph and return {benchmark: summary}.
+    Benchmarks that exceed their node limit in MAX_NODES are skipped.
+    """
+    csr = CSRGraph.from_networkx(G)
+    pairs = sample_pairs(csr, num_pairs, seed)
+    num_nodes = csr.number_of_nodes()
+    selected = [name for name in benchmarks if num_nodes <= MAX_NODES.get(name, num_nodes)]
+    for name in set(benchmarks) - set(selected):
+        logging.info(f"Skipping {name} on {num_nodes} nodes (limit {MAX_NODES[name]}).")
+
+    # The API reads its graphs from files, with string node ids
+    graph_file = os.path.join(work_dir, "graph.edgelist")
+    nx.write_edgelist(nx.relabel_nodes(G, str), graph_file, data=False)
+    G_file = nx.read_edgelist(graph_file)
+    # Isolated nodes are not written to the edgelist
+    string_pairs = [(str(s), str(t)) for s, t in pairs if str(s) in G_file and str(t) in G_file]
+
+    model = node_features = None
+    model_path = os.path.join(work_dir, "model.pkl")
+    if any(name.startswith(("model", "endpoint-predict")) for name in selected):
+        model, node_features = train_benchmark_model(G, work_dir)
+        joblib.dump(model, model_path)
+
+    results = {}
+    for name in selected:
+        if name == "dijkstra":
+            samples = time_calls(functools.partial(csr_dijkstra, csr), pairs, warmup, repeats)
+        elif name == "bidirectional-dijkstra":
+            search = functools.partial(point_to_point_search, csr, algorithm="bidirectional-dijkstra")
+            samples = time_calls(search, pairs, warmup, repeats)
+        elif name == "bellman-ford":
+            samples = time_calls(functools.partial(csr_bellman_ford, csr), pairs, warmup, repeats)
+        elif name == "all-pairs":
+            samples = time_calls(all_pairs_shortest_paths, [(csr,)], min(warmup, 1), repeats)
+        elif name == "model-predict":
+            rows = [(node_features.pair_features([node_features.index[s]], [node_features.index[t]]),)
+                    for s, t in pairs]
+            samples = time_calls(model.predict, rows, warmup, repeats)
+        elif name == "model-batch":
+            sources, targets = zip(*[(node_features.index[s], node_features.index[t]) for s, t in pairs])
+            samples = time_calls(lambda: model.predict(node_features.pair_features(sources, targets)),
+                                 [()], min(warmup, 1), repeats)
+        else:
+            samples = benchmark_endpoint(name, graph_file, string_pairs, model_path, warmup, repeats, work_dir)
+        results[name] = dict(summarize(samples), peak_rss_mb=peak_rss_mb())
+        logging.info(f"{name}: p50 {results[name]['p50_ms']:.3f} ms, p99 {results[name]['p99_ms']:.3f} ms.")
+    return results
+
+
+def benchmark_endpoint(name, graph_file, pairs, model_path, warmup, repeats, work_dir):
+    """
+    Time one Flask endpoint through the test client, serving the benchmark graph and model.
+    The distance cache is disabled so that /dijkstra repeats measure the search itself.
+    """
+    # Imported here so that the algorithm benchmarks do not pay for the API and its models
+    from src.api import create_app
+    from src.serving.distance_cache import DistanceCache
+    from src.serving.graph_registry import graph_registry
+    from src.serving.model_manager import ModelManager
+
+    app = create_app(models=ModelManager(paths={"compressed": model_path}),
+                     distances=DistanceCache(max_bytes=0), feature_dir=work_dir)
+    client = app.test_client()
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} answered {response.status_code}: {response.get_data(as_text=True)}")
+
+    if name == "endpoint-predict":
+        calls = [("/predict", {"source": s, "target": t, "graph_file": graph_file}) for s, t in pairs]
+    elif name == "endpoint-dijkstra":
+        calls = [("/dijkstra", {"source": s, "target": t, "graph_file": graph_file}) for s, t in pairs]
+    elif name == "endpoint-predict-batch":
+        calls = [("/predict/batch", {"pairs": [list(pair) for pair in pairs], "graph_file": graph_file})]
+    else:
+        raise ValueError(f"Unsupported benchmark: {name}")
+    samples = time_calls(post, calls, max(warmup, 1), repeats)
+
+    graph_registry.invalidate(graph_file)
+    return samples
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare median latencies against a baseline report and return the results whose
+    p50 grew by more than `tolerance` (relative).
+    """
+    previous = {(row["family"], row["size"], row["benchmark"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["family"], row["size"], row["benchmark"]))
+        if before is None or before["p50_ms"] <= 0:
+            continue
+        ratio = row["p50_ms"] / before["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append({"family": row["family"], "size": row["size"], "benchmark": row["benchmark"],
+                                "baseline_p50_ms": before["p50_ms"], "p50_ms": row["p50_ms"], "ratio": ratio})
+    return regressions
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "networkx": nx.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_suite(families=GRAPH_FAMILIES, sizes=(1000, 10000), edgelists=(), benchmarks=BENCHMARKS,
+              num_pairs=100, warmup=5, repeats=3, seed=42):
+    """
+    Run the benchmarks on every generated family and size and on every edgelist file.
+    Returns a report with the configuration, the environment and one result row per
+    graph and benchmark.
+    """
+    graphs = [(family, size, functools.partial(generate_graph, family, size, seed))
+              for family in families for size in sizes]
+    graphs += [(path, None, functools.partial(nx.read_edgelist, path)) for path in edgelists]
+
+    rows = []
+    work_dir = tempfile.mkdtemp(prefix="benchmark_suite_")
+    try:
+        for family, size, load in graphs:
+            G = load()
+            logging.info(f"Benchmarking {family} graph with {G.number_of_nodes()} nodes, "
+                         f"{G.number_of_edges()} edges.")
+            results = benchmark_graph(G, benchmarks, num_pairs, warmup, repeats, seed, work_dir)
+            for name, summary in results.items():
+                rows.append(dict(family=family, size=size if size is not None else G.number_of_nodes(),
+                                 nodes=G.number_of_nodes(), edges=G.number_of_edges(), benchmark=name, **summary))
+    finally:
+        shutil.rmtree(work_dir)
+
+    return {
+        "config": {"families": list(families), "sizes": list(sizes), "edgelists": list(edgelists),
+                   "benchmarks": list(benchmarks), "pairs": num_pairs, "warmup": warmup,
+                   "repeats": repeats, "seed": seed},
+        "environment": environment(),
+        "results": rows,
+    }
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row[field] for field in CSV_FIELDS})
+
+
+def _list(value):
+    return [item for item in value.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the shortest path algorithms, model and API.")
+    parser.add_argument("--families", type=_list, default=list(GRAPH_FAMILIES),
+                        help="comma-separated generated graph families (gnm, ba, grid)")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in _list(value)], default=[1000, 10000],
+                        help="comma-separated node counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--edgelist", action="append", default=[], help="real graph edgelist to benchmark too")
+    parser.add_argument("--benchmarks", type=_list, default=list(BENCHMARKS),
+                        help=f"comma-separated benchmarks among {', '.join(BENCHMARKS)}")
+    parser.add_argument("--pairs", type=int, default=100, help="query pairs per graph")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON report path")
+    parser.add_argument("--csv", default=None, help="also write the results as CSV")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative p50 slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = run_suite(args.families, args.sizes, args.edgelist, args.benchmarks,
+                       args.pairs, args.warmup, args.repeats, args.seed)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = find_regressions(report["results"], json.load(f), args.tolerance)
+        for regression in report["regressions"]:
+            logging.warning(f"Regression: {regression['benchmark']} on {regression['family']} "
+                            f"({regression['size']}) p50 {regression['baseline_p50_ms']:.3f} -> "
+                            f"{regression['p50_ms']:.3f} ms.")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Benchmark report saved to {args.output}")
+    if args.csv:
+        write_csv(report["results"], args.csv)
+
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    # Example: python -m src.comparison.benchmark_suite --sizes 1000,10000 --csv benchmark_results.csv
+    sys.exit(main())
@@ -1,34 +1,60 @@
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import networkx as nx
-from src.algorithms.classical_algorithms import dijkstra_shortest_path, bellman_ford_shortest_path, floyd_warshall_shortest_paths
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+from src.algorithms.all_pairs import all_pairs_shortest_paths
+from src.algorithms.classical_algorithms import dijkstra_shortest_path, bellman_ford_shortest_path
+from src.algorithms.csr_graph import CSRGraph, csr_bellman_ford, csr_bidirectional_dijkstra, csr_dijkstra
+from src.comparison.stats import summarize
+from src.models.training_data import generate_pair_distances
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
+# Single-pair algorithms of the batch mode, run by the worker processes
+PAIR_ALGORITHMS = {
+    "Dijkstra": csr_dijkstra,
+    "Bellman-Ford": csr_bellman_ford,
+    "Bidirectional Dijkstra": csr_bidirectional_dijkstra,
+}
+
+# Pairs per task sent to the process pool
+PAIRS_PER_TASK = 256
+
+# Largest graph the all-pairs matrix is computed for in batch mode (about 100 MB of float32)
+ALL_PAIRS_MAX_NODES = 5000
+
 def compare_algorithms(G, source, target):
     """
     Compare the performance of different shortest path algorithms on the graph G.
     Measures both execution time and accuracy.
+    All algorithms run on the CSR form of G, which is built once up front. Floyd-Warshall
+    goes through the all-pairs engine, its path is rebuilt from the distance row of source.
     """
+    G_csr = CSRGraph.from_networkx(G)
+    
     algorithms = {
         "Dijkstra": dijkstra_shortest_path,
         "Bellman-Ford": bellman_ford_shortest_path,
-        "Floyd-Warshall": floyd_warshall_shortest_paths
+        "Floyd-Warshall": all_pairs_shortest_paths
     }
     
     results = {}
     
     for name, algorithm in algorithms.items():
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         if name == "Floyd-Warshall":
-            all_pairs_paths = algorithm(G)
-            path = all_pairs_paths[source][target] if target in all_pairs_paths[source] else None
-            length = nx.shortest_path_length(G, source=source, target=target) if path else float('inf')
+            all_pairs = algorithm(G_csr, weight='weight', method="floyd-warshall")
+            length = all_pairs.distance(source, target)
+            path = all_pairs.path(G_csr, source, target)
         else:
-            path, length = algorithm(G, source, target)
+            path, length = algorithm(G_csr, source, target)
         
-        end_time = time.time()
+        end_time = time.perf_counter()
         duration = end_time - start_time
         
         results[name] = {
@@ -41,6 +67,167 @@ def compare_algorithms(G, source, target):
     
     return results
 
+_worker_csr = None
+_worker_segments = None
+
+
+def _share_array(array):
+    # Copy an array into a new shared memory segment, returning the segment and how to map it back
+    segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[:] = array
+    return segment, (segment.name, array.shape, array.dtype.str)
+
+
+def _init_worker(shared, node_ids, directed, integral):
+    # Map the CSR arrays of the parent once per worker instead of pickling the graph with every task
+    global _worker_csr, _worker_segments
+    _worker_segments = []
+    arrays = []
+    for name, shape, dtype in shared:
+        segment = shared_memory.SharedMemory(name=name)
+        _worker_segments.append(segment)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+    _worker_csr = CSRGraph(*arrays, node_ids, directed=directed, integral=integral)
+
+
+def _worker_run(task):
+    return _run_pairs(_worker_csr, task)
+
+
+def _run_pairs(csr, task):
+    algorithm, sources, targets = task
+    search = PAIR_ALGORITHMS[algorithm]
+    lengths = np.empty(len(sources), dtype=np.float64)
+    durations = np.empty(len(sources), dtype=np.int64)
+    for i, (s, t) in enumerate(zip(sources, targets)):
+        start = time.perf_counter_ns()
+        _, length = search(csr, csr.node_ids[s], csr.node_ids[t])
+        durations[i] = time.perf_counter_ns() - start
+        lengths[i] = length
+    return algorithm, lengths, durations
+
+
+def batch_pairs(csr, pairs=None, sampling=None):
+    """
+    Resolve the pairs of a batch comparison to node index arrays with their exact
+    distances: either the given (source, target) node id pairs, or pairs drawn with a
+    sampling spec (see training_data.resolve_sampling).
+    """
+    if pairs is None:
+        _, sources, targets, exact = generate_pair_distances(csr, weight='weight', sampling=sampling or {})
+        return sources, targets, exact
+
+    sources = np.array([csr.node_index(s) for s, _ in pairs], dtype=np.int32)
+    targets = np.array([csr.node_index(t) for _, t in pairs], dtype=np.int32)
+    # One exact single-source sweep per distinct source
+    unique_sources, inverse = np.unique(sources, return_inverse=True)
+    distances = shortest_path(csr.matrix, method='D', directed=True, indices=unique_sources)
+    return sources, targets, distances[inverse, targets]
+
+
+def accuracy_report(lengths, exact):
+    """
+    Compare computed lengths with the exact ones.
+    """
+    both_infinite = np.isinf(lengths) & np.isinf(exact)
+    with np.errstate(invalid="ignore"):
+        errors = np.where(both_infinite, 0.0, np.abs(lengths - exact))
+    finite = errors[np.isfinite(errors)]
+    return {
+        "exact_matches": int(np.count_nonzero(np.isclose(lengths, exact) | both_infinite)),
+        "accuracy": float(np.mean(np.isclose(lengths, exact) | both_infinite)) if len(exact) else 1.0,
+        "mean_abs_error": float(finite.mean()) if finite.size else 0.0,
+        "max_abs_error": float(finite.max()) if finite.size else 0.0,
+        "unbounded_errors": int(errors.size - finite.size),
+    }
+
+
+def compare_algorithms_batch(G, pairs=None, sampling=None, algorithms=None, n_jobs=None, model=None):
+    """
+    Compare the shortest path algorithms on many source/target pairs of G at once.
+
+    Pairs are given as a list of (source, target) node ids, or drawn with a sampling
+    spec. Every (algorithm, chunk of pairs) task runs on a process pool whose workers
+    map the CSR arrays of G from shared memory. Floyd-Warshall computes the all-pairs
+    matrix once and answers every pair from it. An optional model trained on structural
+    features (see graph_features) is evaluated with one batched prediction. `algorithms`
+    restricts the single-pair algorithms to a subset of PAIR_ALGORITHMS.
+
+    Returns, per algorithm, the accuracy against the exact distances and the latency
+    distribution per pair, plus the one-off setup time of the all-pairs matrix.
+    """
+    csr = CSRGraph.from_networkx(G)
+    sources, targets, exact = batch_pairs(csr, pairs, sampling)
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    algorithms = list(PAIR_ALGORITHMS) if algorithms is None else algorithms
+    unknown = set(algorithms) - set(PAIR_ALGORITHMS)
+    if unknown:
+        raise ValueError(f"Unsupported algorithms: {sorted(unknown)}")
+
+    lengths = {name: np.empty(len(sources)) for name in algorithms}
+    durations = {name: np.empty(len(sources), dtype=np.int64) for name in algorithms}
+    offsets = {}
+    tasks = []
+    for name in algorithms:
+        for start in range(0, len(sources), PAIRS_PER_TASK):
+            offsets[(name, len(tasks))] = start
+            tasks.append((name, sources[start:start + PAIRS_PER_TASK], targets[start:start + PAIRS_PER_TASK]))
+
+    if n_jobs <= 1:
+        # Run in this process on the CSR itself, without shared memory or worker globals
+        outputs = [_run_pairs(csr, task) for task in tasks]
+    else:
+        segments = []
+        try:
+            shared = []
+            for array in (csr.indptr, csr.indices, csr.weights):
+                segment, spec = _share_array(array)
+                segments.append(segment)
+                shared.append(spec)
+            initargs = (shared, csr.node_ids, csr.directed, csr.integral)
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as executor:
+                outputs = list(executor.map(_worker_run, tasks))
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+    for i, (name, task_lengths, task_durations) in enumerate(outputs):
+        start = offsets[(name, i)]
+        lengths[name][start:start + len(task_lengths)] = task_lengths
+        durations[name][start:start + len(task_durations)] = task_durations
+
+    setup_seconds = {}
+    if csr.number_of_nodes() <= ALL_PAIRS_MAX_NODES:
+        start_time = time.perf_counter()
+        all_pairs = all_pairs_shortest_paths(csr, weight='weight', method="floyd-warshall")
+        setup_seconds["Floyd-Warshall"] = time.perf_counter() - start_time
+        name = "Floyd-Warshall"
+        lengths[name] = np.empty(len(sources))
+        durations[name] = np.empty(len(sources), dtype=np.int64)
+        for i, (s, t) in enumerate(zip(sources.tolist(), targets.tolist())):
+            start = time.perf_counter_ns()
+            lengths[name][i] = all_pairs.lookup([s], [t])[0]
+            durations[name][i] = time.perf_counter_ns() - start
+    else:
+        logging.info(f"Skipping Floyd-Warshall on {csr.number_of_nodes()} nodes.")
+
+    if model is not None:
+        from src.models.graph_features import load_or_compute_node_features, feature_spec
+        node_features = load_or_compute_node_features(csr, feature_spec(model))
+        start = time.perf_counter_ns()
+        lengths["Model"] = model.predict(node_features.pair_features(sources, targets)).astype(np.float64)
+        # One batched call, reported as its average cost per pair
+        durations["Model"] = np.full(len(sources), (time.perf_counter_ns() - start) // max(len(sources), 1))
+
+    report = {"pairs": len(sources), "n_jobs": n_jobs, "setup_seconds": setup_seconds, "algorithms": {}}
+    for name in lengths:
+        report["algorithms"][name] = dict(accuracy_report(lengths[name], exact), **summarize(durations[name]))
+        logging.info(f"{name}: accuracy {report['algorithms'][name]['accuracy']:.3f}, "
+                     f"p50 {report['algorithms'][name]['p50_ms']:.3f} ms per pair")
+    return report
+
 if __name__ == "__main__":
     # Example usage with a generated graph
     G = nx.gnm_random_graph(100, 200)
@@ -49,3 +236,6 @@ if __name__ == "__main__":
     results = compare_algorithms(G, source, target)
     for algorithm, result in results.items():
         logging.info(f"{algorithm} result: {result}")
+    
+    # Batch mode over a sample of pairs
+    compare_algorithms_batch(G, sampling={'num_sources': 20, 'pair_budget': 2000})
@@ -0,0 +1,51 @@
+import json
+import random
+import time
+import logging
+import networkx as nx
+from src.api import app
+
+logging.basicConfig(level=logging.INFO)
+
+def compare_batch_prediction(graph_file, num_pairs=1000, seed=42):
+    """
+    Compare the throughput of looping over /predict with a single /predict/batch request
+    for the same random node pairs of the graph stored in graph_file.
+    """
+    G = nx.read_edgelist(graph_file)
+    nodes = list(G.nodes())
+    rng = random.Random(seed)
+    pairs = [[rng.choice(nodes), rng.choice(nodes)] for _ in range(num_pairs)]
+
+    client = app.test_client()
+
+    # Warm up the graph registry and model manager so both modes are measured hot
+    client.post('/predict/batch', json={'pairs': pairs[:1], 'graph_file': graph_file})
+
+    start_time = time.perf_counter()
+    for source, target in pairs:
+        client.post('/predict', json={'source': source, 'target': target, 'graph_file': graph_file})
+    loop_duration = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    response = client.post('/predict/batch', json={'pairs': pairs, 'graph_file': graph_file})
+    results = json.loads(response.get_data(as_text=True))['results']
+    batch_duration = time.perf_counter() - start_time
+
+    report = {
+        "pairs": num_pairs,
+        "loop_seconds": loop_duration,
+        "batch_seconds": batch_duration,
+        "loop_pairs_per_second": num_pairs / loop_duration,
+        "batch_pairs_per_second": len(results) / batch_duration,
+        "speedup": loop_duration / batch_duration,
+    }
+
+    logging.info(f"Looping /predict: {report['loop_pairs_per_second']:.0f} pairs/s, "
+                 f"/predict/batch: {report['batch_pairs_per_second']:.0f} pairs/s "
+                 f"({report['speedup']:.1f}x).")
+    return report
+
+if __name__ == "__main__":
+    # Example usage with the default graph of the API
+    compare_batch_prediction("data/processed/social_networks/facebook_graph.edgelist")
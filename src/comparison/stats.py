@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def summarize(samples):
+    """
+    Percentiles of durations in nanoseconds, in milliseconds.
+    """
+    milliseconds = np.asarray(samples, dtype=np.float64) / 1e6
+    return {
+        "count": len(samples),
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p90_ms": float(np.percentile(milliseconds, 90)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+        "min_ms": float(milliseconds.min()),
+        "max_ms": float(milliseconds.max()),
+    }
@@ -1,48 +1,240 @@
-import networkx as nx
-import random
+import os
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import networkx as nx
+
+from src.algorithms.csr_graph import CSRGraph, as_csr
 
 logging.basicConfig(level=logging.INFO)
 
-def add_random_edges(G, num_edges):
+# Graphs with fewer edges are augmented in-process, a process pool would cost more than it saves
+PARALLEL_MIN_EDGES = 100000
+
+# Rejection sampling draws extra candidates so that most requests are served by one batch
+OVERSAMPLING = 1.2
+
+
+def _pair_keys(sources, targets, num_nodes, directed):
+    # One int64 key per node pair, the same for both directions of an undirected edge
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if not directed:
+        sources, targets = np.minimum(sources, targets), np.maximum(sources, targets)
+    return sources * num_nodes + targets
+
+
+def edge_keys(csr):
+    """
+    Return the sorted keys of the node pairs joined by an edge, and for every arc of
+    the CSR arrays the position of its pair among them (both arcs of an undirected
+    edge share a position). Computed once per graph and reused by every variant.
+    """
+    num_nodes = csr.number_of_nodes()
+    rows = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(csr.indptr))
+    keys, arc_edges = np.unique(_pair_keys(rows, csr.indices, num_nodes, csr.directed), return_inverse=True)
+    return keys, arc_edges
+
+
+def _contains(sorted_keys, keys):
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), max(len(sorted_keys) - 1, 0))
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    return sorted_keys[positions] == keys
+
+
+def sample_non_edges(csr, num_edges, seed=None, keys=None):
+    """
+    Draw `num_edges` distinct node pairs of a CSRGraph that are not joined by an edge,
+    see sample_free_pairs. `keys` are the sorted edge keys from edge_keys(csr).
+    """
+    if keys is None:
+        keys, _ = edge_keys(csr)
+    return sample_free_pairs(keys, csr.number_of_nodes(), csr.directed, num_edges, seed)
+
+
+def sample_free_pairs(keys, num_nodes, directed, num_edges, seed=None):
+    """
+    Draw `num_edges` distinct node pairs that are not joined by an edge (no self-loops),
+    uniformly at random, and return them as source and target index arrays. `keys`
+    are the sorted keys (source * num_nodes + target, smaller index first when
+    undirected) of the node pairs joined by an edge.
+
+    Pairs are drawn in vectorized batches and rejected when they hit an existing edge
+    (a binary search in the sorted edge keys) or were drawn before, so the cost grows
+    with `num_edges`, not with the number of node pairs. When the request covers most
+    of the free pairs, those are enumerated instead. Fewer pairs are returned, with a
+    warning, if the graph does not have enough free pairs.
+    """
+    rng = np.random.default_rng(seed)
+    self_loops = int(np.count_nonzero(keys // num_nodes == keys % num_nodes)) if num_nodes else 0
+    pairs = num_nodes * (num_nodes - 1) // (1 if directed else 2)
+    free = pairs - (len(keys) - self_loops)
+    if num_edges > free:
+        logging.warning(f"Only {free} node pairs are not joined by an edge, adding {free} instead of {num_edges}.")
+        num_edges = free
+    if num_edges <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    if 2 * num_edges > free:
+        # Dense case, rejection would waste most draws: enumerate the free pairs
+        sources, targets = np.nonzero(np.ones((num_nodes, num_nodes), dtype=bool))
+        candidates = sources * num_nodes + targets
+        candidates = candidates[(sources != targets) & (directed | (sources < targets))]
+        chosen = rng.permutation(candidates[~_contains(keys, candidates)])[:num_edges]
+        return chosen // num_nodes, chosen % num_nodes
+
+    acceptance = free / pairs
+    chosen = np.empty(0, dtype=np.int64)
+    while len(chosen) < num_edges:
+        batch = int((num_edges - len(chosen)) / acceptance * OVERSAMPLING) + 16
+        sources = rng.integers(num_nodes, size=batch)
+        targets = rng.integers(num_nodes, size=batch)
+        candidates = _pair_keys(sources, targets, num_nodes, directed)[sources != targets]
+        candidates = np.concatenate([chosen, candidates[~_contains(keys, candidates)]])
+        # Drop repeated pairs, keeping the order in which they were drawn
+        _, first = np.unique(candidates, return_index=True)
+        chosen = candidates[np.sort(first)]
+    chosen = chosen[:num_edges]
+    return chosen // num_nodes, chosen % num_nodes
+
+
+def noisy_weights(weights, noise_level, seed=None, arc_edges=None):
+    """
+    Return a copy of the weights with uniform noise of up to `noise_level` times each
+    weight added. Arcs that share an entry of `arc_edges` (the two directions of an
+    undirected edge, see edge_keys) get the same noise.
+    """
+    rng = np.random.default_rng(seed)
+    if arc_edges is None:
+        noise = rng.uniform(-1, 1, size=len(weights))
+    else:
+        noise = rng.uniform(-1, 1, size=int(arc_edges.max()) + 1 if len(arc_edges) else 0)[arc_edges]
+    return weights + noise * noise_level * weights
+
+
+def add_random_edges(G, num_edges, seed=None):
     """
     Add a specified number of random edges to the graph G.
     """
-    possible_edges = list(nx.non_edges(G))
-    random.shuffle(possible_edges)
-    
-    edges_to_add = possible_edges[:num_edges]
-    G.add_edges_from(edges_to_add)
-    
-    logging.info(f"Added {num_edges} random edges to the graph.")
+    node_ids = list(G.nodes())
+    index = {node: i for i, node in enumerate(node_ids)}
+    ends = np.fromiter((index[node] for edge in G.edges() for node in edge), dtype=np.int64,
+                       count=2 * G.number_of_edges())
+    keys = np.unique(_pair_keys(ends[0::2], ends[1::2], len(node_ids), G.is_directed()))
+    sources, targets = sample_free_pairs(keys, len(node_ids), G.is_directed(), num_edges, seed)
+    G.add_edges_from((node_ids[u], node_ids[v]) for u, v in zip(sources.tolist(), targets.tolist()))
+
+    logging.info(f"Added {len(sources)} random edges to the graph.")
     return G
 
-def add_noise_to_edges(G, noise_level=0.1):
+def add_noise_to_edges(G, noise_level=0.1, seed=None):
     """
     Add noise to the weights of the edges in the graph.
     The noise level determines the fraction of the original weight added as noise.
     """
-    for u, v, d in G.edges(data=True):
-        if 'weight' in d:
-            noise = random.uniform(-1, 1) * noise_level * d['weight']
-            d['weight'] += noise
-    
+    edges = [d for _, _, d in G.edges(data=True) if 'weight' in d]
+    weights = noisy_weights(np.array([d['weight'] for d in edges], dtype=np.float64), noise_level, seed)
+    for d, weight in zip(edges, weights.tolist()):
+        d['weight'] = weight
+
     logging.info(f"Added noise to the edges with a noise level of {noise_level}.")
     return G
 
-def augment_graph(G, num_edges=10, noise_level=0.1):
+def augment_graph(G, num_edges=10, noise_level=0.1, seed=None):
     """
     Augment the graph by adding random edges and noise to edge weights.
     """
-    G_augmented = add_random_edges(G, num_edges)
-    G_augmented = add_noise_to_edges(G_augmented, noise_level)
-    
+    rng = np.random.default_rng(seed)
+    G_augmented = add_random_edges(G, num_edges, rng)
+    G_augmented = add_noise_to_edges(G_augmented, noise_level, rng)
+
     logging.info("Graph augmentation complete.")
     return G_augmented
 
+
+def augment_csr(csr, num_edges=10, noise_level=0.1, seed=None, index=None):
+    """
+    Return an augmented copy of a CSRGraph: `num_edges` random edges of weight 1 are
+    added and noise is applied to the weights of the existing edges, like
+    augment_graph does for edges that have a weight. `index` is the result of
+    edge_keys(csr), to share it between variants.
+    """
+    rng = np.random.default_rng(seed)
+    keys, arc_edges = edge_keys(csr) if index is None else index
+    sources, targets = sample_non_edges(csr, num_edges, rng, keys)
+    weights = noisy_weights(csr.weights, noise_level, rng, None if csr.directed else arc_edges)
+
+    if not csr.directed:
+        sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+    noisy = CSRGraph(csr.indptr, csr.indices, weights, csr.node_ids, directed=csr.directed,
+                     integral=csr.integral and noise_level == 0)
+    return noisy.with_arc_changes(sources, targets, np.ones(len(sources)))
+
+
+_worker_csr = None
+_worker_index = None
+
+
+def _init_worker(indptr, indices, weights, num_nodes, directed, integral):
+    # Each worker rebuilds the graph and its edge keys once instead of receiving them with every task
+    global _worker_csr, _worker_index
+    _worker_csr = CSRGraph(indptr, indices, weights, range(num_nodes), directed=directed, integral=integral)
+    _worker_index = edge_keys(_worker_csr)
+
+
+def _worker_augment(num_edges, noise_level, seed):
+    variant = augment_csr(_worker_csr, num_edges, noise_level, seed, _worker_index)
+    return variant.indptr, variant.indices, variant.weights, variant.integral
+
+
+def iter_augmented_variants(G, num_variants, num_edges=10, noise_level=0.1, seed=42, n_jobs=None):
+    """
+    Yield `num_variants` augmented copies of G (see augment_csr) as CSRGraphs, in order.
+
+    Variant i is seeded with the i-th child of SeedSequence(seed), so a seed always
+    gives the same variants, whatever the number of jobs. With several jobs the
+    variants are generated by a process pool, at most two per worker ahead of the
+    consumer, so a long stream of variants never piles up in memory.
+    """
+    csr = as_csr(G)
+    seeds = np.random.SeedSequence(seed).spawn(num_variants)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() if len(csr.indices) >= PARALLEL_MIN_EDGES else 1
+
+    if n_jobs <= 1 or num_variants <= 1:
+        index = edge_keys(csr)
+        for variant_seed in seeds:
+            yield augment_csr(csr, num_edges, noise_level, variant_seed, index)
+        return
+
+    initargs = (csr.indptr, csr.indices, csr.weights, csr.number_of_nodes(), csr.directed, csr.integral)
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as executor:
+        pending = deque()
+        try:
+            for variant_seed in seeds:
+                pending.append(executor.submit(_worker_augment, num_edges, noise_level, variant_seed))
+                if len(pending) >= 2 * n_jobs:
+                    indptr, indices, weights, integral = pending.popleft().result()
+                    yield CSRGraph(indptr, indices, weights, csr.node_ids, directed=csr.directed, integral=integral)
+            while pending:
+                indptr, indices, weights, integral = pending.popleft().result()
+                yield CSRGraph(indptr, indices, weights, csr.node_ids, directed=csr.directed, integral=integral)
+        finally:
+            # The consumer may stop early, variants that have not started are not needed
+            for future in pending:
+                future.cancel()
+
+
 if __name__ == "__main__":
     # Example usage with a generated graph
     G = nx.gnm_random_graph(100, 200)
-    G_augmented = augment_graph(G, num_edges=15, noise_level=0.05)
+    G_augmented = augment_graph(G, num_edges=15, noise_level=0.05, seed=42)
     nx.write_edgelist(G_augmented, "data/processed/augmented_graph.edgelist")
     logging.info("Augmented graph saved to data/processed/augmented_graph.edgelist")
+
+    # A reproducible stream of weighted variants, generated in parallel
+    for i, variant in enumerate(iter_augmented_variants(G, num_variants=8, num_edges=15, noise_level=0.05, n_jobs=2)):
+        logging.info(f"Variant {i}: {variant.number_of_edges()} edges, fingerprint {variant.fingerprint()[:12]}.")
@@ -1,36 +1,96 @@
 import networkx as nx
 from sklearn.ensemble import RandomForestRegressor
+from src.algorithms.csr_graph import CSRGraph, csr_bfs
+from src.models.graph_features import feature_spec, load_or_compute_node_features
+from src.models.incremental_adaptation import incremental_adapt, record_snapshot
 from src.models.train_shortest_path_model import generate_training_data
 import joblib
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
-def adapt_model_to_new_graph(model, G):
+class AdaptationCancelled(Exception):
+    """
+    Raised by a progress callback to stop an adaptation that is no longer wanted.
+    """
+
+ADAPTATION_MODES = ("full", "incremental")
+
+def _no_progress(stage, fraction):
+    # Default progress callback of adapt_model_to_new_graph
+    return None
+
+def adapt_model_to_new_graph(model, G, sampling=None, progress=None, mode="full"):
     """
     Adapt the given model to a new graph by retraining it on the new graph's data.
+    Pass a sampling spec (see training_data.resolve_sampling) to retrain on a bounded,
+    reproducible sample of node pairs instead of all pairs.
+    With mode="incremental" a forest that carries the snapshot of its training graph is
+    only updated with the pairs whose distance changed (see incremental_adaptation), and
+    the report of the update is stored as the model's `adaptation_report_`; other
+    models, and graphs that changed too much, are retrained in full.
+    An optional progress(stage, fraction) callback is called before each stage; it may
+    raise AdaptationCancelled, which is passed on to the caller.
     """
+    if mode not in ADAPTATION_MODES:
+        raise ValueError(f"Unsupported adaptation mode: {mode}")
+    if progress is None:
+        progress = _no_progress
     try:
-        data, labels = generate_training_data(G)
+        if mode == "incremental":
+            progress("incremental", 0.1)
+            try:
+                model, report = incremental_adapt(model, G)
+                model.adaptation_report_ = report
+                progress("fitted", 0.9)
+                return model
+            except ValueError as e:
+                logging.warning(f"Retraining the model in full: {e}")
+        
+        # Models trained on structural features are retrained on the same features of the new graph
+        spec = feature_spec(model)
+        progress("features", 0.1)
+        node_features = load_or_compute_node_features(G, spec) if spec is not None else None
+        progress("training_data", 0.3)
+        data, labels = generate_training_data(G, sampling=sampling, node_features=node_features)
         
-        if not data or not labels:
+        if len(labels) == 0:
             logging.error("No valid training data generated from the graph.")
             return None
         
+        progress("fit", 0.6)
         model.fit(data, labels)
+        record_snapshot(model, G)
+        progress("fitted", 0.9)
         logging.info("Model successfully adapted to the new graph.")
         return model
+    except AdaptationCancelled:
+        raise
     except Exception as e:
         logging.error(f"Failed to adapt model: {e}")
         return None
 
-def evaluate_model_on_new_task(model, G, source, target):
+def evaluate_model_on_new_task(model, G, source, target, node_features=None):
     """
     Evaluate the adapted model's accuracy on predicting the shortest path between the source and target in the new graph.
+    For models trained on structural features, pass the graph's NodeFeatures to avoid recomputing them.
     """
     try:
-        actual_length = nx.shortest_path_length(G, source=source, target=target)
-        predicted_length = model.predict([[source, target]])[0]
+        if isinstance(G, CSRGraph):
+            # Binary graphs are served in CSR form, hop count like networkx without weights
+            path, actual_length = csr_bfs(G, source, target)
+            if not path:
+                raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        else:
+            actual_length = nx.shortest_path_length(G, source=source, target=target)
+        spec = feature_spec(model)
+        if spec is None:
+            predicted_length = model.predict([[source, target]])[0]
+        else:
+            if node_features is None:
+                node_features = load_or_compute_node_features(G, spec)
+            X = node_features.pair_features([node_features.index[source]], [node_features.index[target]])
+            predicted_length = model.predict(X)[0]
         
         # Accuracy can be defined as how close the predicted length is to the actual length
         accuracy = 1 - abs(predicted_length - actual_length) / actual_length
@@ -0,0 +1,100 @@
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+
+def parse_pair(item):
+    """
+    Accept a pair given either as a [source, target] list or as a {"source", "target"} object.
+    Returns a (source, target) tuple, or None if the item is malformed.
+    """
+    if isinstance(item, dict):
+        item = (item.get('source'), item.get('target'))
+    if not isinstance(item, (list, tuple)) or len(item) != 2:
+        return None
+    return item[0], item[1]
+
+
+def validate_pairs(G, pairs):
+    """
+    Validate all pairs against the graph in one pass.
+    Returns the indices of the pairs that need a model prediction and a dict of
+    per-pair results (errors and self-loop answers) keyed by pair index.
+    """
+    to_predict = []
+    answered = {}
+
+    for i, pair in enumerate(pairs):
+        if pair is None:
+            answered[i] = {'error': 'Each pair must be [source, target] or {"source", "target"}.'}
+            continue
+
+        source, target = pair
+        if not isinstance(source, str) or not isinstance(target, str):
+            answered[i] = {'error': 'Invalid input data types.'}
+        elif source not in G:
+            answered[i] = {'error': f"Node {source} not found in graph."}
+        elif target not in G:
+            answered[i] = {'error': f"Node {target} not found in graph."}
+        elif source == target and G.has_edge(source, target):
+            # Same shortcut as /predict for self-loops
+            answered[i] = {'predicted_length': 0}
+        else:
+            to_predict.append(i)
+
+    return to_predict, answered
+
+
+def build_feature_matrix(pairs, indices, node_features=None):
+    """
+    Build the model input for the selected pairs as a single float matrix.
+    Models trained on structural features get the pair features assembled from the
+    graph's NodeFeatures. Models trained on raw numeric node ids get the ids, so ids
+    that are not numeric cannot be encoded and are reported back as per-pair errors.
+    """
+    if node_features is not None:
+        sources = [node_features.index[pairs[i][0]] for i in indices]
+        targets = [node_features.index[pairs[i][1]] for i in indices]
+        return node_features.pair_features(sources, targets), list(indices), {}
+
+    X = np.empty((len(indices), 2), dtype=np.float64)
+    encoded = []
+    errors = {}
+
+    for i in indices:
+        source, target = pairs[i]
+        try:
+            X[len(encoded)] = (float(source), float(target))
+        except ValueError:
+            errors[i] = {'error': f"Node ids {source} and {target} cannot be encoded for the model."}
+            continue
+        encoded.append(i)
+
+    return X[:len(encoded)], encoded, errors
+
+
+def predict_pairs(model, G, pairs, node_features=None):
+    """
+    Predict the shortest path length for many (source, target) pairs with a single
+    call to `model.predict`. Pass the graph's NodeFeatures for models trained on
+    structural features.
+    Returns one result dict per pair, in the order of the input.
+    """
+    to_predict, results = validate_pairs(G, pairs)
+    X, encoded, errors = build_feature_matrix(pairs, to_predict, node_features)
+    results.update(errors)
+
+    if encoded:
+        predictions = model.predict(X)
+        for i, predicted_length in zip(encoded, predictions):
+            results[i] = {'predicted_length': int(predicted_length)}
+
+    logging.info("Predicted %d of %d pairs in one batch.", len(encoded), len(pairs))
+
+    ordered = []
+    for i, pair in enumerate(pairs):
+        result = {'source': pair[0], 'target': pair[1]} if pair is not None else {}
+        result.update(results[i])
+        ordered.append(result)
+    return ordered
@@ -0,0 +1,189 @@
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+# Rows routed through the forest at once; the work arrays hold rows x trees node indices
+PREDICT_CHUNK_ROWS = 8192
+
+# Attributes of the source model carried over to the flat model, e.g. the feature spec serving relies on
+CARRIED_ATTRIBUTES = ("feature_spec_", "graph_snapshot_")
+
+
+class FlatForest:
+    """
+    Regression forest stored as flat NumPy arrays, predicting without scikit-learn.
+
+    All trees share the node arrays: node i tests `X[:, feature[i]] <= threshold[i]`
+    and continues at left[i] or right[i]; tree t starts at roots[t]. Leaves point to
+    themselves on both sides, so predict walks all rows and trees at once with one
+    vectorized gather per level, dropping (row, tree) pairs as they reach a leaf.
+    The prediction is the mean of the leaf values, like a RandomForestRegressor.
+
+    Thresholds and values can be stored in reduced precision (see quantized); a flat
+    forest pickles to a fraction of the size of the sklearn forest and loads without
+    rebuilding any sklearn objects.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features_in):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features_in_ = n_features_in
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.left, self.right,
+                                              self.value, self.roots))
+
+    def predict(self, X):
+        """
+        Predict the mean leaf value of every row of X, as float64.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got an array of shape {X.shape}.")
+        # Integer thresholds compare exactly with integer features; float ones like sklearn, in float32
+        if self.threshold.dtype.kind == "f":
+            threshold = self.threshold.astype(np.float32)
+        else:
+            threshold = self.threshold
+
+        children = self._children()
+        predictions = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            chunk = X[start:start + PREDICT_CHUNK_ROWS]
+            n = len(chunk)
+            flat_X = chunk.ravel()
+            # One entry per (row, tree) pair; pairs that reached a leaf drop out of the active set
+            nodes = np.tile(self.roots, n).astype(np.int64)
+            active = np.arange(len(nodes))
+            current = nodes.copy()
+            row_offsets = np.repeat(np.arange(n, dtype=np.int64) * self.n_features_in_, self.n_trees)
+            for _ in range(self.max_depth):
+                goes_right = flat_X[row_offsets + self.feature.take(current)] > threshold.take(current)
+                following = children.take(2 * current + goes_right)
+                nodes[active] = following
+                moving = following != current
+                active, current, row_offsets = active[moving], following[moving], row_offsets[moving]
+                if not len(active):
+                    break
+            predictions[start:start + n] = self.value.take(nodes).astype(np.float64).reshape(n, self.n_trees).mean(axis=1)
+        return predictions
+
+    def _children(self):
+        # left and right interleaved, so one gather picks the next node; rebuilt after unpickling
+        if getattr(self, "_children_cache", None) is None:
+            self._children_cache = np.stack([self.left, self.right], axis=1).ravel().astype(np.int64)
+        return self._children_cache
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_children_cache", None)
+        return state
+
+    def quantized(self, thresholds="float32", values="float32"):
+        """
+        Return a copy with thresholds stored as "float32", "float16" or "int" and leaf
+        values as "float32" or "float16". Integer thresholds are the floor of the split
+        points, which routes integer-valued features exactly like the original splits.
+        """
+        if thresholds == "int":
+            floors = np.floor(self.threshold.astype(np.float64))
+            limit = np.iinfo(np.int32).max
+            threshold = np.clip(np.nan_to_num(floors, posinf=limit, neginf=-limit), -limit, limit).astype(np.int32)
+        elif thresholds in ("float32", "float16"):
+            threshold = self.threshold.astype(thresholds)
+        else:
+            raise ValueError(f"Unsupported threshold type {thresholds}.")
+        if values not in ("float32", "float16"):
+            raise ValueError(f"Unsupported value type {values}.")
+        flat = FlatForest(self.feature, threshold, self.left, self.right, self.value.astype(values), self.roots,
+                          self.max_depth, self.n_features_in_)
+        _carry_attributes(self, flat)
+        return flat
+
+
+def _carry_attributes(source, target):
+    for name in CARRIED_ATTRIBUTES:
+        if hasattr(source, name):
+            setattr(target, name, getattr(source, name))
+
+
+def _node_depths(left, right):
+    # Depth of every node of one sklearn tree, computed level by level
+    depth = np.zeros(len(left), dtype=np.int32)
+    frontier = np.array([0])
+    level = 0
+    while len(frontier):
+        depth[frontier] = level
+        children = np.concatenate([left[frontier], right[frontier]])
+        frontier = children[children >= 0]
+        level += 1
+    return depth
+
+
+def flatten_forest(model, trees=None, max_depth=None):
+    """
+    Export the trees of a fitted RandomForestRegressor (all of them, or the given tree
+    indices) into a FlatForest with float32 thresholds and values. With max_depth,
+    nodes at that depth become leaves predicting their mean training target, which is
+    what sklearn stores as the value of every node.
+    Raises ValueError for multi-output forests.
+    """
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output forests can be flattened.")
+    estimators = [model.estimators_[i] for i in (range(len(model.estimators_)) if trees is None else trees)]
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    depth_reached = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        left, right = tree.children_left, tree.children_right
+        depth = _node_depths(left, right)
+        limit = depth.max() if max_depth is None else max_depth
+        kept = depth <= limit
+        leaf = (left < 0) | (depth == limit)
+        new_index = np.cumsum(kept) - 1 + offset
+
+        ids = np.flatnonzero(kept)
+        own = new_index[ids]
+        is_leaf = leaf[ids]
+        lefts.append(np.where(is_leaf, own, new_index[np.maximum(left[ids], 0)]).astype(np.int32))
+        rights.append(np.where(is_leaf, own, new_index[np.maximum(right[ids], 0)]).astype(np.int32))
+        features.append(np.where(is_leaf, 0, tree.feature[ids]).astype(np.int32))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold[ids]).astype(np.float32))
+        values.append(tree.value[ids, 0, 0].astype(np.float32))
+        roots.append(offset)
+        depth_reached = max(depth_reached, int(depth[kept].max()))
+        offset += len(ids)
+
+    feature = np.concatenate(features)
+    feature_dtype = np.uint8 if model.n_features_in_ <= np.iinfo(np.uint8).max else np.int32
+    flat = FlatForest(feature.astype(feature_dtype), np.concatenate(thresholds), np.concatenate(lefts),
+                      np.concatenate(rights), np.concatenate(values), np.array(roots, dtype=np.int32),
+                      depth_reached, model.n_features_in_)
+    _carry_attributes(model, flat)
+    return flat
+
+
+def tree_predictions(model, X):
+    """
+    Predictions of every tree of a fitted forest, as a (trees, rows) float64 array.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    return np.array([estimator.predict(X) for estimator in model.estimators_], dtype=np.float64)
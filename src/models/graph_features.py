@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import logging
+
+import numpy as np
+from scipy.linalg import eigh
+from scipy.sparse.csgraph import connected_components, laplacian
+from scipy.sparse.linalg import eigsh
+
+from src.algorithms.csr_graph import as_csr
+from src.algorithms.landmarks import LandmarkIndex
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_FEATURE_DIR = "data/processed/node_features"
+
+# Feature spec of models trained on structural features, stored on the model as `feature_spec_`
+DEFAULT_FEATURE_SPEC = {
+    "type": "structural",
+    "num_landmarks": 8,
+    "spectral_dims": 0,
+    "weight": None,
+}
+
+PAIR_FEATURE_NAMES = [
+    "source_degree", "target_degree", "source_core", "target_core",
+    "same_component", "landmark_lower_bound", "landmark_upper_bound",
+]
+
+
+def feature_spec(model):
+    """
+    Return the structural feature spec a model was trained with, or None for models
+    trained on raw node ids.
+    """
+    return getattr(model, "feature_spec_", None)
+
+
+def core_numbers(csr):
+    """
+    Core number of every node (Batagelj-Zaversnik bucket algorithm), ignoring edge
+    directions and self-loops.
+    """
+    matrix = csr.matrix
+    if csr.directed:
+        matrix = (matrix + matrix.T).tocsr()
+    indptr, indices = matrix.indptr, matrix.indices.tolist()
+    num_nodes = csr.number_of_nodes()
+
+    neighbours = [[j for j in indices[indptr[i]:indptr[i + 1]] if j != i] for i in range(num_nodes)]
+    degree = [len(adjacent) for adjacent in neighbours]
+    max_degree = max(degree, default=0)
+
+    # Nodes sorted by degree, with the start of every degree bucket
+    bins = [0] * (max_degree + 1)
+    for d in degree:
+        bins[d] += 1
+    start = 0
+    for d in range(max_degree + 1):
+        bins[d], start = start, start + bins[d]
+    order = [0] * num_nodes
+    position = [0] * num_nodes
+    for i, d in enumerate(degree):
+        position[i] = bins[d]
+        order[position[i]] = i
+        bins[d] += 1
+    for d in range(max_degree, 0, -1):
+        bins[d] = bins[d - 1]
+    bins[0] = 0
+
+    for i in order:
+        for j in neighbours[i]:
+            if degree[j] > degree[i]:
+                # Move j to the front of its bucket, then shrink its degree by one
+                dj = degree[j]
+                first = order[bins[dj]]
+                if first != j:
+                    order[position[j]], order[bins[dj]] = first, j
+                    position[first], position[j] = position[j], bins[dj]
+                bins[dj] += 1
+                degree[j] -= 1
+
+    return np.array(degree, dtype=np.float32)
+
+
+def spectral_coordinates(csr, dims):
+    """
+    Coordinates of every node on the `dims` smallest non-trivial eigenvectors of the
+    normalized Laplacian.
+    """
+    matrix = csr.matrix
+    if csr.directed:
+        matrix = matrix + matrix.T
+    structure = matrix.copy()
+    structure.data = np.ones_like(structure.data)
+    lap = laplacian(structure, normed=True)
+
+    num_nodes = csr.number_of_nodes()
+    k = min(dims + 1, num_nodes)
+    if num_nodes <= 2 * k + 1:
+        _, vectors = eigh(lap.toarray())
+        vectors = vectors[:, :k]
+    else:
+        _, vectors = eigsh(lap, k=k, which="SM", tol=1e-4)
+    coordinates = np.zeros((num_nodes, dims), dtype=np.float32)
+    coordinates[:, :k - 1] = vectors[:, 1:k]
+    return coordinates
+
+
+class NodeFeatures:
+    """
+    Per-node structural features of one graph, computed once and reused for every pair:
+    degree, core number, connected component, a landmark distance index and optionally
+    spectral coordinates. Rows are aligned with the node indices of the CSR graph.
+    """
+
+    def __init__(self, spec, degree, core, component, landmarks, spectral, graph_hash, index=None):
+        self.spec = spec
+        self.degree = degree
+        self.core = core
+        self.component = component
+        self.landmarks = landmarks
+        self.spectral = spectral
+        self.graph_hash = graph_hash
+        self.index = index
+
+    @classmethod
+    def compute(cls, G, spec=None):
+        spec = dict(DEFAULT_FEATURE_SPEC, **(spec or {}))
+        csr = as_csr(G, spec["weight"])
+
+        degree = np.diff(csr.indptr).astype(np.float32)
+        core = core_numbers(csr)
+        _, component = connected_components(csr.matrix, directed=csr.directed, connection="weak")
+        landmarks = LandmarkIndex.build(csr, num_landmarks=spec["num_landmarks"], weight=spec["weight"])
+        spectral = spectral_coordinates(csr, spec["spectral_dims"]) if spec["spectral_dims"] else None
+
+        return cls(spec, degree, core, component.astype(np.int32), landmarks, spectral, csr.fingerprint(), csr.index)
+
+    @property
+    def nbytes(self):
+        spectral_bytes = self.spectral.nbytes if self.spectral is not None else 0
+        return self.degree.nbytes + self.core.nbytes + self.component.nbytes + self.landmarks.nbytes + spectral_bytes
+
+    @property
+    def num_features(self):
+        return len(PAIR_FEATURE_NAMES) + (1 if self.spectral is not None else 0)
+
+    def pair_features(self, sources, targets):
+        """
+        Assemble the feature rows of node index pairs (sources[i], targets[i]) as a float32 matrix.
+        """
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        num_nodes = len(self.degree)
+
+        lower, upper = self.landmarks.bounds_indices(sources, targets)
+        X = np.empty((len(sources), self.num_features), dtype=np.float32)
+        X[:, 0] = self.degree[sources]
+        X[:, 1] = self.degree[targets]
+        X[:, 2] = self.core[sources]
+        X[:, 3] = self.core[targets]
+        X[:, 4] = self.component[sources] == self.component[targets]
+        # Unknown bounds are encoded as the number of nodes, above any hop count
+        X[:, 5] = np.nan_to_num(lower, posinf=num_nodes)
+        X[:, 6] = np.nan_to_num(upper, posinf=num_nodes)
+        if self.spectral is not None:
+            X[:, 7] = np.linalg.norm(self.spectral[sources] - self.spectral[targets], axis=1)
+        return X
+
+    def save(self, path):
+        np.savez(path, spec=np.array(json.dumps(self.spec)), degree=self.degree, core=self.core,
+                 component=self.component, landmarks=self.landmarks.landmarks,
+                 dist_from=self.landmarks.dist_from,
+                 dist_to=self.landmarks.dist_to if self.landmarks.dist_to is not None else np.empty(0),
+                 spectral=self.spectral if self.spectral is not None else np.empty(0),
+                 graph_hash=np.array(self.graph_hash))
+
+    @classmethod
+    def load(cls, path, csr):
+        with np.load(path) as data:
+            graph_hash = str(data["graph_hash"])
+            if graph_hash != csr.fingerprint():
+                raise ValueError(f"Node features {path} were computed for a different graph.")
+            dist_to = data["dist_to"] if data["dist_to"].size else None
+            spec = json.loads(str(data["spec"]))
+            landmarks = LandmarkIndex(data["landmarks"], data["dist_from"], dist_to, graph_hash, csr.index,
+                                      spec["weight"])
+            spectral = data["spectral"] if data["spectral"].size else None
+            return cls(spec, data["degree"], data["core"], data["component"],
+                       landmarks, spectral, graph_hash, csr.index)
+
+
+def load_or_compute_node_features(G, spec=None, cache_dir=DEFAULT_FEATURE_DIR):
+    """
+    Return the node features of G for the given spec, reading them from the cache
+    directory if they were computed before for the same graph content, and caching
+    them there otherwise. Pass cache_dir=None to skip the disk cache.
+    """
+    spec = dict(DEFAULT_FEATURE_SPEC, **(spec or {}))
+    csr = as_csr(G, spec["weight"])
+    if cache_dir is None:
+        return NodeFeatures.compute(csr, spec)
+
+    key = hashlib.sha256((csr.fingerprint() + json.dumps(spec, sort_keys=True)).encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, key[:16] + ".npz")
+    if os.path.exists(path):
+        try:
+            return NodeFeatures.load(path, csr)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring cached node features {path}: {e}")
+
+    features = NodeFeatures.compute(csr, spec)
+    os.makedirs(cache_dir, exist_ok=True)
+    features.save(path)
+    logging.info(f"Node features cached in {path}.")
+    return features
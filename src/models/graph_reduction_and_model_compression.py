@@ -1,49 +1,193 @@
+import json
+import os
+import tempfile
+import time
+import numpy as np
 import networkx as nx
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
 import joblib
+from src.algorithms.graph_reduction import evaluate_reduction, reduce_graph
+from src.models.flat_forest import flatten_forest, tree_predictions
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
-def reduce_graph_size(G, percentage=0.5):
-    """
-    Reduce the size of the graph by a specified percentage.
-    This can be useful for model compression or reducing computational complexity.
-    """
-    num_nodes_to_remove = int(len(G) * percentage)
-    
-    nodes_to_remove = list(G.nodes())[:num_nodes_to_remove]
-    G_reduced = G.copy()
-    G_reduced.remove_nodes_from(nodes_to_remove)
-    
-    logging.info(f"Reduced graph size by {percentage * 100}%. Number of nodes removed: {num_nodes_to_remove}")
-    return G_reduced
-
-def compress_model(model):
-    """
-    Apply model compression techniques to reduce the size of the trained model.
-    This function currently supports reducing the number of trees in a Random Forest.
-    """
-    if isinstance(model, RandomForestRegressor):
-        original_num_trees = len(model.estimators_)
-        compressed_model = RandomForestRegressor(
-            n_estimators=int(original_num_trees * 0.5),
-            random_state=42
-        )
-        compressed_model.fit(model.estimators_[0].estimators_, model.estimators_)
-        
-        logging.info(f"Compressed model by reducing the number of trees from {original_num_trees} to {len(compressed_model.estimators_)}.")
-        return compressed_model
-    else:
+FLAT_MODEL_PATH = "src/models/flat_shortest_path_model.pkl"
+
+# A compressed model may have a validation MSE at most this fraction above the full forest's
+MAX_MSE_INCREASE = float(os.environ.get("COMPRESSION_MAX_MSE_INCREASE", "0.02"))
+
+# Fraction of the validation rows compress_model holds out to report the MSE on, the
+# compression choices are made on the other rows
+REPORT_FRACTION = float(os.environ.get("COMPRESSION_REPORT_FRACTION", "0.5"))
+
+# Graph the trained forest was trained on and is compressed against, the default graph of the API
+SERVING_GRAPH_FILE = os.environ.get("COMPRESSION_GRAPH_FILE", "data/processed/social_networks/facebook_graph.edgelist")
+
+# Depth caps tried by compress_model, the smallest one within the MSE bound wins
+DEPTH_CAPS = (6, 8, 10, 12, 16, 20)
+
+# Rows of the batch used to measure batch prediction latency
+LATENCY_ROWS = 10000
+
+def reduce_graph_size(G, strategy="chains", **options):
+    """
+    Reduce the size of the graph with a distance-preserving strategy ("chains",
+    "kcore" or "spanner", see src.algorithms.graph_reduction.reduce_graph). Returns
+    the GraphReduction: the `reduced` graph and the map lifting distances on it
+    back to G, exactly for "chains" and within the stretch bound for "spanner".
+    """
+    return reduce_graph(G, strategy, **options)
+
+
+def select_trees(predictions, y, max_mse):
+    """
+    Greedy forward selection of trees: starting from none, repeatedly add the tree
+    whose inclusion gives the lowest MSE of the averaged predictions, until the MSE
+    is at most max_mse. `predictions` is the (trees, rows) output of tree_predictions.
+    Returns the selected tree indices, all of them if max_mse is never reached.
+    """
+    remaining = list(range(len(predictions)))
+    selected = []
+    total = np.zeros(predictions.shape[1], dtype=np.float64)
+    while remaining:
+        errors = (((total + predictions[remaining]) / (len(selected) + 1) - y) ** 2).mean(axis=1)
+        best = int(np.argmin(errors))
+        total += predictions[remaining[best]]
+        selected.append(remaining.pop(best))
+        if errors[best] <= max_mse:
+            break
+    return selected
+
+
+def _timed(function, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start_time) / repeat
+
+
+def model_profile(model, X_val, y_val, latency_rows=LATENCY_ROWS, repeat=20):
+    """
+    Measure a model: pickled size in bytes, joblib load time, latency of a single-row
+    and of a batch prediction (latency_rows validation rows) in milliseconds, and
+    MSE on the validation set with its number of rows.
+    """
+    X_val = np.asarray(X_val)
+    fd, path = tempfile.mkstemp(suffix=".pkl")
+    os.close(fd)
+    try:
+        joblib.dump(model, path)
+        size = os.path.getsize(path)
+        load_seconds = _timed(lambda: joblib.load(path), 3)
+    finally:
+        os.remove(path)
+
+    batch = X_val[:latency_rows]
+    return {
+        "bytes": size,
+        "load_seconds": round(load_seconds, 4),
+        "single_row_ms": round(_timed(lambda: model.predict(X_val[:1]), repeat) * 1000, 3),
+        "batch_ms": round(_timed(lambda: model.predict(batch), max(repeat // 10, 1)) * 1000, 3),
+        "batch_rows": len(batch),
+        "mse": float(mean_squared_error(y_val, model.predict(X_val))),
+        "rows": len(X_val),
+    }
+
+
+def compress_model(model, X_val, y_val, max_mse_increase=MAX_MSE_INCREASE, depth_caps=DEPTH_CAPS,
+                   integer_features=None, report=True, report_fraction=REPORT_FRACTION, random_state=42):
+    """
+    Compress a fitted RandomForestRegressor into a FlatForest that serves without
+    scikit-learn. The validation rows are split: the compression choices keep the MSE
+    on the selection rows within (1 + max_mse_increase) times that of the full forest,
+    and the held-out report_fraction of the rows measures the result:
+
+    1. prune the forest to the trees chosen by select_trees, which may use half of
+       the allowed MSE increase;
+    2. cap the depth at the smallest of depth_caps that stays within the bound,
+       turning deeper subtrees into leaves predicting their mean target;
+    3. store thresholds as int32 when every feature is integer-valued (inferred from
+       X_val unless integer_features is given, routing is then exact) or float16 if
+       that stays within the bound, and leaf values as float16 if it does.
+
+    The returned model carries `compression_report_`, the choices made, the MSE of both
+    models on the selection rows and, with report=True, the model_profile of the
+    forest and of the flat model on the held-out rows.
+    Models other than random forests are returned unchanged, with a warning.
+    """
+    if not isinstance(model, RandomForestRegressor):
         logging.warning("Model compression not supported for this type of model.")
         return model
 
+    X_val = np.asarray(X_val, dtype=np.float32)
+    y_val = np.asarray(y_val, dtype=np.float64)
+    # The rows the choices are tuned on would flatter the compressed model in the report
+    X_select, X_report, y_select, y_report = train_test_split(X_val, y_val, test_size=report_fraction,
+                                                              random_state=random_state)
+    predictions = tree_predictions(model, X_select)
+    base_mse = float(((predictions.mean(axis=0) - y_select) ** 2).mean())
+    max_mse = base_mse * (1 + max_mse_increase)
+
+    def mse(flat):
+        return float(((flat.predict(X_select) - y_select) ** 2).mean())
+
+    trees = select_trees(predictions, y_select, base_mse * (1 + max_mse_increase / 2))
+    flat = flatten_forest(model, trees=trees)
+    for depth in sorted(depth_caps):
+        if depth >= flat.max_depth:
+            break
+        capped = flatten_forest(model, trees=trees, max_depth=depth)
+        if mse(capped) <= max_mse:
+            flat = capped
+            break
+
+    if integer_features is None:
+        integer_features = bool(np.all(X_val == np.round(X_val))) and np.abs(X_val).max(initial=0) < 2 ** 31
+    candidates = [("int", "float16"), ("int", "float32")] if integer_features else \
+        [("float16", "float16"), ("float32", "float16"), ("float16", "float32"), ("float32", "float32")]
+    for thresholds, values in candidates:
+        quantized = flat.quantized(thresholds, values)
+        if mse(quantized) <= max_mse or (thresholds, values) == candidates[-1]:
+            flat = quantized
+            break
+
+    flat.compression_report_ = {
+        "trees": [len(model.estimators_), flat.n_trees],
+        "nodes": [sum(estimator.tree_.node_count for estimator in model.estimators_), flat.node_count],
+        "max_depth": [max(estimator.tree_.max_depth for estimator in model.estimators_), flat.max_depth],
+        "threshold_dtype": flat.threshold.dtype.name,
+        "value_dtype": flat.value.dtype.name,
+        "max_mse_increase": max_mse_increase,
+        "selection_mse": [base_mse, mse(flat)],
+        "selection_rows": len(X_select),
+    }
+    if report:
+        flat.compression_report_["before"] = model_profile(model, X_report, y_report)
+        flat.compression_report_["after"] = model_profile(flat, X_report, y_report)
+    logging.info(f"Compressed model from {len(model.estimators_)} to {flat.n_trees} trees "
+                 f"(depth {flat.max_depth}, {flat.threshold.dtype.name} thresholds, "
+                 f"{flat.value.dtype.name} values).")
+    return flat
+
 if __name__ == "__main__":
     # Example usage with a generated graph
-    G = nx.gnm_random_graph(100, 200)
-    G_reduced = reduce_graph_size(G, percentage=0.5)
-    
-    model = joblib.load("src/models/compressed_shortest_path_model.pkl")
-    compressed_model = compress_model(model)
-    joblib.dump(compressed_model, "src/models/compressed_shortest_path_model.pkl")
-    logging.info("Compressed model saved to src/models/compressed_shortest_path_model.pkl")
+    G = nx.gnm_random_graph(100, 120)
+    reduction = reduce_graph_size(G, strategy="chains")
+    logging.info(f"Graph reduction report: {evaluate_reduction(reduction)}")
+
+    # Compress the trained forest into the flat model served with SERVING_MODEL=flat. It
+    # saw every pair of its graph but the ones train_model held out, only those are used.
+    from src.models.train_shortest_path_model import held_out_split
+    from src.serving.graph_registry import graph_format, graph_registry
+    from src.serving.model_manager import MODEL_PATHS
+
+    model = joblib.load(MODEL_PATHS["compressed"])
+    G = graph_registry.get(SERVING_GRAPH_FILE, fmt=graph_format(SERVING_GRAPH_FILE))
+    X_val, y_val = held_out_split(model, G)
+    flat_model = compress_model(model, X_val, y_val)
+    joblib.dump(flat_model, FLAT_MODEL_PATH)
+    logging.info(f"Compression report: {json.dumps(flat_model.compression_report_, indent=2)}")
+    logging.info(f"Flat model saved to {FLAT_MODEL_PATH}")
@@ -0,0 +1,346 @@
+import hashlib
+import time
+import logging
+
+import numpy as np
+import networkx as nx
+from scipy.sparse.csgraph import shortest_path
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error
+
+from src.algorithms.csr_graph import CSRGraph, as_csr
+from src.models.graph_features import feature_spec, load_or_compute_node_features
+from src.models.training_data import generate_training_data, node_feature_values, source_chunks
+
+logging.basicConfig(level=logging.INFO)
+
+# Trees added per update, as a fraction of the trees of the forest being updated
+DEFAULT_DELTA_TREE_FRACTION = 0.25
+
+# The forest is trimmed to this multiple of its size when it was last fully trained,
+# dropping the oldest trees first
+MAX_FOREST_GROWTH = 2.0
+
+# Unchanged pairs replayed with the changed ones, per changed pair, so the new trees
+# do not only see the part of the graph that moved
+DEFAULT_REPLAY_RATIO = 1.0
+
+# Upper bound on the changed pairs the new trees are trained on
+DEFAULT_MAX_DELTA_PAIRS = 200000
+
+# Sources swept for the replay and evaluation samples
+SAMPLE_SOURCES = 16
+
+# Fraction of the changed pairs held out to measure the accuracy of the update
+HOLDOUT_FRACTION = 0.2
+
+# Graphs that differ in more than this fraction of their arcs are not updated incrementally,
+# a full refit is both cheaper and more accurate then
+MAX_CHANGED_ARC_FRACTION = 0.1
+
+
+def graph_snapshot(G):
+    """
+    Record the structure of the graph a model is trained on (node ids and hop
+    adjacency, weights are ignored like in training), so that a later adaptation can
+    diff the new graph against it. Stored on the model as `graph_snapshot_`.
+    """
+    csr = as_csr(G)
+    digest = hashlib.sha256()
+    digest.update(b"directed" if csr.directed else b"undirected")
+    digest.update("\n".join(map(repr, csr.node_ids)).encode("utf-8"))
+    digest.update(np.ascontiguousarray(csr.indptr, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(csr.indices, dtype=np.int64).tobytes())
+    return {
+        "node_ids": list(csr.node_ids),
+        "indptr": np.asarray(csr.indptr, dtype=np.int64),
+        "indices": np.asarray(csr.indices, dtype=np.int32),
+        "directed": csr.directed,
+        "fingerprint": digest.hexdigest(),
+    }
+
+
+def snapshot_csr(snapshot):
+    """
+    Rebuild the unit-weight CSRGraph of a graph snapshot.
+    """
+    indices = snapshot["indices"]
+    return CSRGraph(snapshot["indptr"], indices, np.ones(len(indices)), snapshot["node_ids"],
+                    directed=snapshot["directed"])
+
+
+def record_snapshot(model, G):
+    """
+    Store the snapshot of the graph `model` was just fully trained on.
+    """
+    model.graph_snapshot_ = graph_snapshot(G)
+    if isinstance(model, RandomForestRegressor):
+        model.base_estimators_ = len(model.estimators_)
+    return model
+
+
+def _arcs(csr):
+    rows = np.repeat(np.arange(csr.number_of_nodes(), dtype=np.int64), np.diff(csr.indptr))
+    return rows, np.asarray(csr.indices, dtype=np.int64)
+
+
+def _reverse_matrix(csr):
+    return csr.matrix.T.tocsr() if csr.directed else csr.matrix
+
+
+def _distances_to(reverse, targets):
+    # Row k holds the hop distance from every node to targets[k]
+    return shortest_path(reverse, method='D', directed=True, unweighted=True, indices=np.asarray(targets))
+
+
+def diff_graphs(old, new):
+    """
+    Compare two CSR graphs by node id.
+    Returns the index maps between them (-1 for nodes missing on the other side) and
+    the removed arcs, in old indices, and the added arcs, in new indices. Undirected
+    edges count as two arcs.
+    """
+    old_to_new = np.array([new.index.get(node, -1) for node in old.node_ids], dtype=np.int64)
+    new_to_old = np.array([old.index.get(node, -1) for node in new.node_ids], dtype=np.int64)
+    num_new = new.number_of_nodes()
+
+    old_rows, old_cols = _arcs(old)
+    new_rows, new_cols = _arcs(new)
+    mapped_rows, mapped_cols = old_to_new[old_rows], old_to_new[old_cols]
+    kept = (mapped_rows >= 0) & (mapped_cols >= 0)
+
+    old_keys = np.where(kept, mapped_rows * num_new + mapped_cols, -1)
+    new_keys = new_rows * num_new + new_cols
+    removed = ~kept | ~np.isin(old_keys, new_keys)
+    added = ~np.isin(new_keys, old_keys[kept])
+
+    return {
+        "old_to_new": old_to_new,
+        "new_to_old": new_to_old,
+        "removed_arcs": (old_rows[removed], old_cols[removed]),
+        "added_arcs": (new_rows[added], new_cols[added]),
+    }
+
+
+def affected_sources(old, new, diff):
+    """
+    Return the new indices of the sources whose hop distances may differ between the
+    two graphs; every other source has exactly the same distances in both.
+
+    A removed arc u->v can only lengthen paths from s if it was the last shortest path
+    arc into v, i.e. d(s,v) = d(s,u) + 1 and no surviving arc w->v has d(s,w) = d(s,u).
+    An added arc u->v can only shorten paths from s if d_new(s,u) + 1 < d_old(s,v).
+    Each test runs full backward searches over the graph: 2 + in-degree(v) of them per
+    removed arc and at most 2 per added arc, so the cost is O(arcs x degree x (V + E)).
+    A sweep from every source costs O(V x (V + E)), so this only pays off while the
+    changed arcs times their in-degree stay well below the number of nodes, which
+    MAX_CHANGED_ARC_FRACTION does not guarantee on dense graphs. The sources it returns
+    then bound the sweeps of changed_pairs.
+    """
+    old_to_new, new_to_old = diff["old_to_new"], diff["new_to_old"]
+    candidates_old = np.zeros(old.number_of_nodes(), dtype=bool)
+    candidates_new = new_to_old < 0
+
+    removed_rows, removed_cols = diff["removed_arcs"]
+    if len(removed_rows):
+        reverse = _reverse_matrix(old)
+        removed = set(zip(removed_rows.tolist(), removed_cols.tolist()))
+        for u, v in removed:
+            incoming = reverse.indices[reverse.indptr[v]:reverse.indptr[v + 1]].tolist()
+            alternatives = [w for w in incoming if w != u and (w, v) not in removed]
+            distances = _distances_to(reverse, [u, v] + alternatives)
+            last_arc = np.isfinite(distances[0]) & (distances[1] == distances[0] + 1)
+            if alternatives:
+                last_arc &= ~np.any(distances[2:] == distances[0], axis=0)
+            candidates_old |= last_arc
+        kept = old_to_new[candidates_old]
+        candidates_new[kept[kept >= 0]] = True
+
+    added_rows, added_cols = diff["added_arcs"]
+    if len(added_rows):
+        new_reverse = _reverse_matrix(new)
+        old_reverse = _reverse_matrix(old)
+        for u, v in set(zip(added_rows.tolist(), added_cols.tolist())):
+            to_u = _distances_to(new_reverse, [u])[0]
+            to_v_old = np.full(new.number_of_nodes(), np.inf)
+            if new_to_old[v] >= 0:
+                old_row = _distances_to(old_reverse, [new_to_old[v]])[0]
+                known = new_to_old >= 0
+                to_v_old[known] = old_row[new_to_old[known]]
+            candidates_new |= to_u + 1 < to_v_old
+
+    return np.flatnonzero(candidates_new).astype(np.int32)
+
+
+def changed_pairs(old, new, diff, sources):
+    """
+    Sweep the affected sources on both graphs and return the (source, target, new
+    distance) index arrays of the reachable pairs whose distance changed or that are new.
+    """
+    new_to_old = diff["new_to_old"]
+    known = new_to_old >= 0
+    blocks = []
+
+    for chunk in source_chunks(sources, new.number_of_nodes()):
+        new_rows = shortest_path(new.matrix, method='D', directed=True, unweighted=True, indices=chunk)
+        old_rows = np.full_like(new_rows, np.inf)
+        old_sources = new_to_old[chunk]
+        swept = old_sources >= 0
+        if swept.any():
+            rows = shortest_path(old.matrix, method='D', directed=True, unweighted=True,
+                                 indices=old_sources[swept].astype(np.int32))
+            old_rows[np.ix_(np.flatnonzero(swept), np.flatnonzero(known))] = rows[:, new_to_old[known]]
+
+        new_rows[np.arange(len(chunk)), chunk] = np.inf
+        rows, targets = np.nonzero(np.isfinite(new_rows) & (new_rows != old_rows))
+        blocks.append((chunk[rows], targets.astype(np.int32), new_rows[rows, targets]))
+
+    if not blocks:
+        return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0)
+    return tuple(np.concatenate(parts) for parts in zip(*blocks))
+
+
+def sample_pairs(csr, num_pairs, rng, num_sources=SAMPLE_SOURCES):
+    """
+    Sample up to `num_pairs` reachable pairs of the graph with their hop distances,
+    from a few random sources.
+    """
+    num_nodes = csr.number_of_nodes()
+    if num_pairs <= 0 or num_nodes < 2:
+        return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0)
+    sources = rng.choice(num_nodes, size=min(num_sources, num_nodes), replace=False).astype(np.int32)
+    rows = shortest_path(csr.matrix, method='D', directed=True, unweighted=True, indices=sources)
+    rows[np.arange(len(sources)), sources] = np.inf
+    row_index, targets = np.nonzero(np.isfinite(rows))
+    keep = rng.choice(len(targets), size=min(num_pairs, len(targets)), replace=False)
+    return sources[row_index[keep]], targets[keep].astype(np.int32), rows[row_index[keep], targets[keep]]
+
+
+def _features(model, G, csr):
+    # Encoder of (source, target) index arrays into the model's input
+    spec = feature_spec(model)
+    if spec is not None:
+        node_features = load_or_compute_node_features(G, spec)
+        return node_features.pair_features
+    values = node_feature_values(csr)
+    return lambda sources, targets: np.column_stack([values[sources], values[targets]])
+
+
+def _mse(model, encode, pairs):
+    sources, targets, distances = pairs
+    if not len(distances):
+        return None
+    return float(mean_squared_error(distances, model.predict(encode(sources, targets))))
+
+
+def incremental_adapt(model, G, delta_tree_fraction=DEFAULT_DELTA_TREE_FRACTION,
+                      replay_ratio=DEFAULT_REPLAY_RATIO, max_delta_pairs=DEFAULT_MAX_DELTA_PAIRS,
+                      compare_full=False, seed=42):
+    """
+    Update a random forest to a changed graph without retraining it from scratch.
+
+    The graph is diffed against the snapshot the model was trained on, the sources
+    whose distances may have changed are found from the changed arcs, and only those
+    are swept to collect the pairs whose distance changed. New trees are then grown
+    with warm_start on these pairs plus a replay sample of unchanged pairs, and the
+    oldest trees are dropped once the forest outgrows MAX_FOREST_GROWTH times its size.
+
+    Returns the updated model and a report of the size of the change, the time spent
+    and the accuracy trade-off: the MSE before and after the update on held-out changed
+    pairs and on random pairs, and with compare_full=True the MSE and time of a full refit.
+    Raises ValueError if the model has no snapshot or is not a random forest, or if
+    more than MAX_CHANGED_ARC_FRACTION of the arcs changed.
+    """
+    snapshot = getattr(model, "graph_snapshot_", None)
+    if snapshot is None or not isinstance(model, RandomForestRegressor):
+        raise ValueError("Incremental adaptation needs a random forest with a graph snapshot.")
+
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    old = snapshot_csr(snapshot)
+    new = as_csr(G)
+    new_snapshot = graph_snapshot(new)
+    report = {"nodes": new.number_of_nodes(), "edges": new.number_of_edges()}
+
+    if new_snapshot["fingerprint"] == snapshot["fingerprint"]:
+        report.update({"changed_arcs": 0, "affected_sources": 0, "changed_pairs": 0,
+                       "seconds": time.perf_counter() - start_time})
+        logging.info("Graph unchanged since the model was trained, nothing to adapt.")
+        return model, report
+
+    diff = diff_graphs(old, new)
+    changed_arcs = len(diff["removed_arcs"][0]) + len(diff["added_arcs"][0])
+    if changed_arcs > MAX_CHANGED_ARC_FRACTION * max(len(old.indices), len(new.indices), 1):
+        raise ValueError(f"{changed_arcs} arcs changed, too many for an incremental update.")
+    sources = affected_sources(old, new, diff)
+    delta = changed_pairs(old, new, diff, sources)
+    report.update({
+        "removed_arcs": len(diff["removed_arcs"][0]),
+        "added_arcs": len(diff["added_arcs"][0]),
+        "affected_sources": len(sources),
+        "changed_pairs": len(delta[2]),
+        "diff_seconds": time.perf_counter() - start_time,
+    })
+
+    # Hold out part of the changed pairs, and cap the rest
+    order = rng.permutation(len(delta[2]))
+    num_holdout = int(len(order) * HOLDOUT_FRACTION)
+    holdout = tuple(part[order[:num_holdout]] for part in delta)
+    train = tuple(part[order[num_holdout:num_holdout + max_delta_pairs]] for part in delta)
+    replay = sample_pairs(new, int(len(train[2]) * replay_ratio), rng)
+    random_pairs = sample_pairs(new, max(num_holdout, 1000), rng)
+
+    encode = _features(model, G, new)
+    report["mse_before"] = {"changed": _mse(model, encode, holdout), "random": _mse(model, encode, random_pairs)}
+
+    fit_start = time.perf_counter()
+    X = encode(np.concatenate([train[0], replay[0]]), np.concatenate([train[1], replay[1]]))
+    y = np.concatenate([train[2], replay[2]])
+    if len(y):
+        num_trees = len(model.estimators_)
+        new_trees = max(1, int(round(num_trees * delta_tree_fraction)))
+        model.set_params(warm_start=True, n_estimators=num_trees + new_trees)
+        model.fit(X, y)
+        model.set_params(warm_start=False)
+
+        max_trees = int(getattr(model, "base_estimators_", num_trees) * MAX_FOREST_GROWTH)
+        if len(model.estimators_) > max_trees:
+            model.estimators_ = model.estimators_[-max_trees:]
+            model.set_params(n_estimators=max_trees)
+        report["trees_added"] = new_trees
+    report["trees"] = len(model.estimators_)
+    report["training_pairs"] = len(y)
+    report["fit_seconds"] = time.perf_counter() - fit_start
+
+    model.graph_snapshot_ = new_snapshot
+    report["seconds"] = time.perf_counter() - start_time
+    report["mse_after"] = {"changed": _mse(model, encode, holdout), "random": _mse(model, encode, random_pairs)}
+
+    if compare_full:
+        full_start = time.perf_counter()
+        node_features = load_or_compute_node_features(G, feature_spec(model)) if feature_spec(model) else None
+        full_model = clone(model).set_params(n_estimators=getattr(model, "base_estimators_", len(model.estimators_)))
+        full_model.fit(*generate_training_data(G, node_features=node_features))
+        report["full_refit"] = {
+            "seconds": time.perf_counter() - full_start,
+            "mse": {"changed": _mse(full_model, encode, holdout), "random": _mse(full_model, encode, random_pairs)},
+        }
+
+    logging.info(f"Incrementally adapted the model: {report['changed_pairs']} changed pairs from "
+                 f"{report['affected_sources']} affected sources in {report['seconds']:.2f} seconds, "
+                 f"MSE on changed pairs {report['mse_before']['changed']} -> {report['mse_after']['changed']}.")
+    return model, report
+
+
+if __name__ == "__main__":
+    # Example usage with a generated graph that loses and gains a few edges
+    G = nx.relabel_nodes(nx.barabasi_albert_graph(500, 2, seed=42), str)
+    data, labels = generate_training_data(G)
+    model = record_snapshot(RandomForestRegressor(n_estimators=20, random_state=42).fit(data, labels), G)
+
+    G_changed = G.copy()
+    G_changed.remove_edges_from(list(G.edges())[:5])
+    G_changed.add_edges_from([("0", "499"), ("10", "400")])
+    model, report = incremental_adapt(model, G_changed, compare_full=True)
+    print(report)
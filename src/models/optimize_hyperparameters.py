@@ -1,78 +1,349 @@
+import hashlib
+import json
+import math
+import os
+import time
+import numpy as np
 from skopt import BayesSearchCV
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import KFold, train_test_split
 from sklearn.metrics import mean_squared_error
 import joblib
+from src.algorithms.csr_graph import as_csr
+from src.models.graph_features import load_or_compute_node_features
+from src.models.training_data import generate_training_data
 import networkx as nx
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
-def generate_training_data(G):
-    """
-    Generate training data for the shortest path model.
-    For each pair of nodes, compute the shortest path length.
-    """
-    data = []
-    labels = []
-
-    for source in G.nodes():
-        for target in G.nodes():
-            if source != target:
-                try:
-                    length = nx.shortest_path_length(G, source=source, target=target)
-                    data.append([source, target])
-                    labels.append(length)
-                except nx.NetworkXNoPath:
-                    logging.warning(f"No path between {source} and {target}.")
-                    continue
-
-    return data, labels
-
-def optimize_hyperparameters(G):
-    """
-    Optimize hyperparameters for the Random Forest Regressor using Bayesian optimization.
-    """
-    data, labels = generate_training_data(G)
-    
-    X_train, X_test, y_train, y_test = train_test_split(data, labels, test_size=0.2, random_state=42)
-    
-    model = RandomForestRegressor(random_state=42)
-    
-    # Define the hyperparameter search space
-    param_space = {
-        'n_estimators': (50, 500),
-        'max_depth': (5, 50),
-        'min_samples_split': (2, 10),
-        'min_samples_leaf': (1, 4),
+MODEL_PATH = "src/models/compressed_shortest_path_model.pkl"
+
+# Fold scores of finished trials, one JSON lines file per graph and search setup
+DEFAULT_TRIAL_DIR = "data/processed/hyperparameter_trials"
+
+# Define the hyperparameter search space
+PARAM_SPACE = {
+    'n_estimators': (50, 500),
+    'max_depth': (5, 50),
+    'min_samples_split': (2, 10),
+    'min_samples_leaf': (1, 4),
+}
+
+# Wall-clock budget of a search in seconds, the final refit of the best configuration excluded
+DEFAULT_BUDGET_SECONDS = float(os.environ.get("SEARCH_BUDGET_SECONDS", 600))
+
+NUM_FOLDS = 3
+
+# Hyperband: each rung keeps 1 / HALVING_RATE of its configurations and gives them
+# HALVING_RATE times the resource (fraction of the training rows and of n_estimators),
+# starting from MIN_RESOURCE in the most aggressive bracket
+HALVING_RATE = 3
+MIN_RESOURCE = 1 / 27
+MIN_TREES = 10
+
+# A configuration stops between folds once its mean fold MSE is this much above the
+# score it needs to be promoted from its rung
+EARLY_STOP_MARGIN = 0.1
+
+# Number of iterations of the BayesSearchCV baseline
+BAYES_ITERATIONS = 32
+
+
+class TrialCache:
+    """
+    Persistent scores of trials: the validation MSE of one configuration trained on
+    one fold at one resource. Scores are appended to a JSON lines file as soon as
+    they are known, so a search interrupted at any point resumes from them. A torn
+    last line (a crash while writing) is ignored.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._scores = {}
+        self._torn = False
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._scores[record["key"]] = record["mse"]
+            self._torn = bool(line) and not line.endswith("\n")
+
+    @staticmethod
+    def _key(params, resource, fold):
+        return json.dumps([sorted(params.items()), round(resource, 6), fold])
+
+    def __len__(self):
+        return len(self._scores)
+
+    def get(self, params, resource, fold):
+        return self._scores.get(self._key(params, resource, fold))
+
+    def put(self, params, resource, fold, mse, seconds):
+        key = self._key(params, resource, fold)
+        self._scores[key] = mse
+        if self.path is not None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                if self._torn:
+                    f.write("\n")
+                    self._torn = False
+                f.write(json.dumps({"key": key, "mse": mse, "seconds": round(seconds, 4)}) + "\n")
+
+
+def trial_cache_path(G, sampling, features, param_space, seed, trial_dir=DEFAULT_TRIAL_DIR):
+    """
+    Return the trial cache file of a search: the same graph content, training data,
+    search space and seed give the same file, so re-running the search resumes it.
+    """
+    setup = json.dumps([sampling, features, sorted(param_space.items()), seed, NUM_FOLDS, HALVING_RATE,
+                        MIN_RESOURCE], sort_keys=True, default=str)
+    key = hashlib.sha256((as_csr(G).fingerprint() + setup).encode("utf-8")).hexdigest()
+    return os.path.join(trial_dir, key[:16] + ".jsonl")
+
+
+def sample_configurations(param_space, num_configs, rng):
+    """
+    Draw configurations uniformly from an integer search space of (low, high) bounds.
+    """
+    return [{name: int(rng.integers(low, high + 1)) for name, (low, high) in sorted(param_space.items())}
+            for _ in range(num_configs)]
+
+
+def fold_splits(num_rows, seed=42):
+    """
+    Shuffled K-fold (train, validation) index splits, computed once per search and
+    shared by every trial. A trial at resource r trains on the first r of the
+    training indices, so smaller resources use nested subsets of the same rows.
+    """
+    return list(KFold(NUM_FOLDS, shuffle=True, random_state=seed).split(np.arange(num_rows)))
+
+
+def fit_trial(X, y, folds, params, resource, fold, seed=42):
+    """
+    Train a forest with `params` on the resource fraction of the training rows of a
+    fold, and round(resource * n_estimators) trees (at least MIN_TREES), and return
+    its validation MSE.
+    """
+    train, validation = folds[fold]
+    train = train[:max(int(math.ceil(resource * len(train))), 1)]
+    trees = params["n_estimators"] if resource >= 1 else max(MIN_TREES, int(round(resource * params["n_estimators"])))
+    model = RandomForestRegressor(**dict(params, n_estimators=trees), random_state=seed, n_jobs=-1)
+    model.fit(X[train], y[train])
+    return float(mean_squared_error(y[validation], model.predict(X[validation])))
+
+
+class _BudgetExhausted(Exception):
+    pass
+
+
+def hyperband_search(X, y, folds, param_space=PARAM_SPACE, budget_seconds=DEFAULT_BUDGET_SECONDS, cache=None,
+                     seed=42):
+    """
+    Hyperband over the training set size and n_estimators: brackets of successive
+    halving from the most aggressive (many configurations at MIN_RESOURCE) to plain
+    random search at full resource. A configuration whose MSE after some folds is
+    already EARLY_STOP_MARGIN above the cut of its rung is not trained on the other
+    folds. Fold scores come from the TrialCache when present.
+
+    Stops when the wall-clock budget is spent. Returns a report with the best
+    configuration at the largest resource reached, its cross-validated MSE and the
+    history of (seconds, best full-resource MSE) used for time-to-best.
+    """
+    cache = cache if cache is not None else TrialCache()
+    rng = np.random.default_rng(seed)
+    start_time = time.perf_counter()
+    deadline = start_time + budget_seconds
+    results = []
+    history = []
+    counts = {"trials": 0, "cached": 0, "stopped_early": 0}
+
+    def score(params, resource, cut):
+        fold_scores = []
+        for fold in range(len(folds)):
+            mse = cache.get(params, resource, fold)
+            if mse is None:
+                if time.perf_counter() > deadline:
+                    raise _BudgetExhausted()
+                trial_start = time.perf_counter()
+                mse = fit_trial(X, y, folds, params, resource, fold, seed)
+                cache.put(params, resource, fold, mse, time.perf_counter() - trial_start)
+                counts["trials"] += 1
+            else:
+                counts["cached"] += 1
+            fold_scores.append(mse)
+            if cut is not None and len(fold_scores) < len(folds) and np.mean(fold_scores) > cut * (1 + EARLY_STOP_MARGIN):
+                counts["stopped_early"] += 1
+                return float(np.mean(fold_scores)), False
+        return float(np.mean(fold_scores)), True
+
+    max_bracket = int(round(math.log(1 / MIN_RESOURCE, HALVING_RATE)))
+    try:
+        for bracket in range(max_bracket, -1, -1):
+            num_configs = int(math.ceil((max_bracket + 1) / (bracket + 1) * HALVING_RATE ** bracket))
+            configs = sample_configurations(param_space, num_configs, rng)
+            for rung in range(bracket + 1):
+                resource = HALVING_RATE ** (rung - bracket)
+                keep = max(len(configs) // HALVING_RATE, 1)
+                scored = []
+                for params in configs:
+                    # The cut is the score of the last configuration that would be promoted so far
+                    finished = sorted(mse for mse, complete, _ in scored if complete)
+                    cut = finished[keep - 1] if len(finished) >= keep and rung < bracket else None
+                    mse, complete = score(params, resource, cut)
+                    scored.append((mse, complete, params))
+                    if complete:
+                        results.append((resource, mse, params))
+                        if resource >= 1 and (not history or mse < history[-1][1]):
+                            history.append((round(time.perf_counter() - start_time, 3), mse))
+                ranked = sorted((item for item in scored if item[1]), key=lambda item: item[0])
+                configs = [params for _, _, params in ranked[:keep]]
+    except _BudgetExhausted:
+        logging.info(f"Search budget of {budget_seconds} seconds spent.")
+
+    if not results:
+        raise RuntimeError("The search budget is too small to score a single configuration.")
+    best_resource, best_mse, best_params = min(results, key=lambda result: (-result[0], result[1]))
+    return {
+        "search": "hyperband",
+        "best_params": best_params,
+        "cv_mse": best_mse,
+        "best_resource": best_resource,
+        "seconds": round(time.perf_counter() - start_time, 3),
+        "history": history,
+        **counts,
     }
-    
-    # Set up Bayesian search
+
+
+def bayes_search(X, y, folds, param_space=PARAM_SPACE, budget_seconds=None, n_iter=BAYES_ITERATIONS, seed=42):
+    """
+    The BayesSearchCV baseline: n_iter full-resource configurations, each scored on
+    every fold, optionally stopped once budget_seconds are spent. Returns the same
+    report as hyperband_search.
+    """
+    start_time = time.perf_counter()
+    history = []
+
+    def on_iteration(result):
+        best = float(np.min(result.func_vals))
+        if not history or best < history[-1][1]:
+            history.append((round(time.perf_counter() - start_time, 3), best))
+        return budget_seconds is not None and time.perf_counter() - start_time > budget_seconds
+
     bayes_cv = BayesSearchCV(
-        estimator=model,
+        estimator=RandomForestRegressor(random_state=seed),
         search_spaces=param_space,
-        n_iter=32,
-        cv=3,
+        n_iter=n_iter,
+        cv=folds,
+        scoring="neg_mean_squared_error",
         n_jobs=-1,
-        random_state=42
+        refit=False,
+        random_state=seed,
     )
-    
-    # Perform hyperparameter optimization
-    bayes_cv.fit(X_train, y_train)
-    
+    bayes_cv.fit(X, y, callback=on_iteration)
+    return {
+        "search": "bayes",
+        "best_params": {name: int(value) for name, value in bayes_cv.best_params_.items()},
+        "cv_mse": float(-bayes_cv.best_score_),
+        "best_resource": 1,
+        "seconds": round(time.perf_counter() - start_time, 3),
+        "history": history,
+        "trials": len(bayes_cv.cv_results_["params"]) * len(folds),
+    }
+
+
+def time_to_mse(history, target_mse):
+    """
+    Seconds until a search first reached a cross-validated MSE of at most
+    target_mse, or None if it never did.
+    """
+    return next((seconds for seconds, mse in history if mse <= target_mse), None)
+
+
+def training_data(G, sampling=None, features="structural"):
+    """
+    Generate the training pairs of G once for a search: structural pair features by
+    default, raw node ids with features="ids". Returns X_train, X_test, y_train,
+    y_test and the node features (None for ids).
+    """
+    node_features = load_or_compute_node_features(G) if features == "structural" else None
+    data, labels = generate_training_data(G, sampling=sampling, node_features=node_features)
+    X_train, X_test, y_train, y_test = train_test_split(np.asarray(data), np.asarray(labels), test_size=0.2,
+                                                        random_state=42)
+    return X_train, X_test, y_train, y_test, node_features
+
+
+def optimize_hyperparameters(G, sampling=None, features="structural", search="hyperband",
+                             budget_seconds=DEFAULT_BUDGET_SECONDS, trial_dir=DEFAULT_TRIAL_DIR,
+                             param_space=PARAM_SPACE, model_path=MODEL_PATH, seed=42):
+    """
+    Optimize hyperparameters for the Random Forest Regressor.
+    With search="hyperband" (the default) a Hyperband search (see hyperband_search)
+    runs within budget_seconds and resumes from the trial cache in trial_dir when
+    the same search was run on the same graph before (trial_dir=None disables it).
+    search="bayes" runs the BayesSearchCV baseline.
+    Pass a sampling spec (see training_data.resolve_sampling) to search on a bounded,
+    reproducible sample of node pairs instead of all pairs.
+    The model learns from structural features by default, or from raw node ids with features="ids".
+    The best configuration is refit on the whole training set and saved to model_path;
+    the model is returned with the search report as `search_report_`.
+    """
+    X_train, X_test, y_train, y_test, node_features = training_data(G, sampling, features)
+    folds = fold_splits(len(X_train), seed)
+
+    if search == "hyperband":
+        cache_path = None if trial_dir is None else \
+            trial_cache_path(G, sampling, features, param_space, seed, trial_dir)
+        cache = TrialCache(cache_path)
+        report = hyperband_search(X_train, y_train, folds, param_space, budget_seconds, cache, seed)
+    elif search == "bayes":
+        report = bayes_search(X_train, y_train, folds, param_space, seed=seed)
+    else:
+        raise ValueError(f"Unknown search {search}.")
+
     # Evaluate the optimized model
-    best_model = bayes_cv.best_estimator_
-    predictions = best_model.predict(X_test)
-    mse = mean_squared_error(y_test, predictions)
-    
-    logging.info(f"Best parameters found: {bayes_cv.best_params_}")
-    logging.info(f"Best cross-validation score: {bayes_cv.best_score_}")
-    logging.info(f"Test MSE with optimized model: {mse}")
-    
+    start_time = time.perf_counter()
+    best_model = RandomForestRegressor(**report["best_params"], random_state=seed, n_jobs=-1).fit(X_train, y_train)
+    report["refit_seconds"] = round(time.perf_counter() - start_time, 3)
+    if node_features is not None:
+        best_model.feature_spec_ = node_features.spec
+    report["test_mse"] = float(mean_squared_error(y_test, best_model.predict(X_test)))
+    best_model.search_report_ = report
+
+    logging.info(f"Best parameters found: {report['best_params']}")
+    logging.info(f"Best cross-validation MSE: {report['cv_mse']}")
+    logging.info(f"Test MSE with optimized model: {report['test_mse']}")
+
     # Save the optimized model
-    joblib.dump(best_model, "src/models/compressed_shortest_path_model.pkl")
-    logging.info("Optimized model saved to src/models/compressed_shortest_path_model.pkl")
+    if model_path is not None:
+        joblib.dump(best_model, model_path)
+        logging.info(f"Optimized model saved to {model_path}")
+    return best_model
+
+
+def compare_searches(G, sampling=None, features="structural", budget_seconds=DEFAULT_BUDGET_SECONDS,
+                     param_space=PARAM_SPACE, seed=42):
+    """
+    Run the Hyperband search and the BayesSearchCV baseline on the same training
+    data and folds, without the trial cache, and report for each its best
+    cross-validated MSE, total time and the time it took to get within 1% of the
+    best MSE found by either search.
+    """
+    X_train, _, y_train, _, _ = training_data(G, sampling, features)
+    folds = fold_splits(len(X_train), seed)
+    reports = {
+        "hyperband": hyperband_search(X_train, y_train, folds, param_space, budget_seconds, seed=seed),
+        "bayes": bayes_search(X_train, y_train, folds, param_space, seed=seed),
+    }
+    target = min(report["cv_mse"] for report in reports.values()) * 1.01
+    for report in reports.values():
+        report["time_to_best"] = time_to_mse(report["history"], target)
+    return reports
+
 
 if __name__ == "__main__":
     G = nx.gnm_random_graph(100, 200)
-    optimize_hyperparameters(G)
+    optimize_hyperparameters(G, budget_seconds=60)
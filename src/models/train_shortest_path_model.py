@@ -1,59 +1,144 @@
+import json
+import pickle
+import time
 import networkx as nx
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 import joblib
+from src.models.graph_features import feature_spec, load_or_compute_node_features
+from src.models.incremental_adaptation import graph_snapshot, record_snapshot
+from src.models.training_data import generate_training_data
+from src.models.training_shards import DEFAULT_SHARD_DIR, load_training_shards, split_training_shards, write_training_shards
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
-def generate_training_data(G):
+MODEL_PATH = "src/models/compressed_shortest_path_model.pkl"
+TRAINING_REPORT_PATH = "src/models/training_report.json"
+
+# Forest trained on raw [source, target] node ids
+BASELINE_FOREST_PARAMS = {"n_estimators": 100}
+
+# Structural features carry most of the signal, so a much smaller forest is enough
+STRUCTURAL_FOREST_PARAMS = {"n_estimators": 20, "max_depth": 12, "min_samples_leaf": 2}
+
+def training_split(G, sampling=None, shard_dir=DEFAULT_SHARD_DIR, node_features=None):
     """
-    Generate training data for the shortest path model.
-    For each pair of nodes, compute the shortest path length.
+    Generate the training data of G (node id pairs, or structural pair features when
+    node_features are given) and split it into training and testing sets.
     """
-    data = []
-    labels = []
+    if shard_dir is None:
+        # Generate training data
+        data, labels = generate_training_data(G, sampling=sampling, node_features=node_features)
 
-    for source in G.nodes():
-        for target in G.nodes():
-            if source != target:
-                try:
-                    length = nx.shortest_path_length(G, source=source, target=target)
-                    data.append([source, target])
-                    labels.append(length)
-                except nx.NetworkXNoPath:
-                    logging.warning(f"No path between {source} and {target}.")
-                    continue
+        # Split the data into training and testing sets
+        return train_test_split(data, labels, test_size=0.2, random_state=42)
 
-    return data, labels
+    # Generate (or reuse) the training shards and split them without intermediate lists
+    manifest_path = write_training_shards(G, shard_dir, sampling=sampling, node_features=node_features)
+    return split_training_shards(load_training_shards(manifest_path))
 
-def train_model(G):
+def fit_and_report(params, X_train, X_test, y_train, y_test):
     """
-    Train a machine learning model to predict the shortest path length between nodes.
+    Fit a Random Forest Regressor and measure its test MSE, fit and predict time and size.
     """
-    # Generate training data
-    data, labels = generate_training_data(G)
-    
-    # Split the data into training and testing sets
-    X_train, X_test, y_train, y_test = train_test_split(data, labels, test_size=0.2, random_state=42)
-    
-    # Train a Random Forest Regressor
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model = RandomForestRegressor(random_state=42, **params)
+
+    start_time = time.perf_counter()
     model.fit(X_train, y_train)
-    
-    # Evaluate the model on the test set
+    fit_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
     predictions = model.predict(X_test)
-    mse = mean_squared_error(y_test, predictions)
-    logging.info(f"Model trained with MSE: {mse}")
+    predict_seconds = time.perf_counter() - start_time
+
+    report = {
+        "params": params,
+        "train_rows": len(y_train),
+        "test_rows": len(y_test),
+        "mse": float(mean_squared_error(y_test, predictions)),
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+        "model_bytes": len(pickle.dumps(model)),
+    }
+    return model, report
+
+def train_model(G, sampling=None, shard_dir=DEFAULT_SHARD_DIR, features="structural",
+                compare_baseline=False, report_path=TRAINING_REPORT_PATH, model_path=MODEL_PATH):
+    """
+    Train a machine learning model to predict the shortest path length between nodes.
+    Pass a sampling spec (see training_data.resolve_sampling) to train on a bounded,
+    reproducible sample of node pairs instead of all pairs.
+    The training data is streamed into memory-mapped shards under shard_dir, which are
+    reused when the same graph is trained on again; pass shard_dir=None to keep it in memory.
+    With features="structural" (the default) the model learns from per-node structural
+    features (see graph_features) and records them as its `feature_spec_`; with
+    features="ids" it learns from raw node ids as before. With compare_baseline=True the
+    id-based forest is trained as well and both are compared in the training report.
+    The model records how its test split was drawn as `training_split_`, see held_out_split.
+    """
+    if features not in ("structural", "ids"):
+        raise ValueError(f"Unsupported features: {features}")
+
+    report = {"nodes": G.number_of_nodes(), "edges": G.number_of_edges(), "sampling": sampling}
+
+    if features == "structural":
+        start_time = time.perf_counter()
+        node_features = load_or_compute_node_features(G)
+        report["feature_seconds"] = time.perf_counter() - start_time
+
+        model, report["model"] = fit_and_report(STRUCTURAL_FOREST_PARAMS,
+                                                *training_split(G, sampling, shard_dir, node_features))
+        model.feature_spec_ = node_features.spec
+        report["model"]["features"] = "structural"
+    else:
+        model, report["model"] = fit_and_report(BASELINE_FOREST_PARAMS, *training_split(G, sampling, shard_dir))
+        report["model"]["features"] = "ids"
+
+    logging.info(f"Model trained with MSE: {report['model']['mse']}")
+
+    if compare_baseline and features == "structural":
+        _, report["baseline"] = fit_and_report(BASELINE_FOREST_PARAMS, *training_split(G, sampling, shard_dir))
+        report["baseline"]["features"] = "ids"
+        logging.info(f"Baseline id-based model: MSE {report['baseline']['mse']}, "
+                     f"{report['baseline']['model_bytes']} bytes; structural model: "
+                     f"MSE {report['model']['mse']}, {report['model']['model_bytes']} bytes.")
+
+    # Remember the training graph so that later adaptations can be incremental
+    record_snapshot(model, G)
+    model.training_split_ = {"sampling": sampling, "sharded": shard_dir is not None}
     
     # Save the trained model
-    joblib.dump(model, "src/models/compressed_shortest_path_model.pkl")
-    logging.info("Model saved to src/models/compressed_shortest_path_model.pkl")
+    joblib.dump(model, model_path)
+    logging.info(f"Model saved to {model_path}")
+
+    if report_path is not None:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Training report saved to {report_path}")
 
     return model
 
+def held_out_split(model, G, shard_dir=DEFAULT_SHARD_DIR):
+    """
+    Regenerate the test rows and labels that train_model held out when it trained
+    `model` on G, so that the model can be measured on pairs it never saw.
+    Raises ValueError for models that do not record their split or were trained on another graph.
+    """
+    split = getattr(model, "training_split_", None)
+    snapshot = getattr(model, "graph_snapshot_", None)
+    if split is None or snapshot is None:
+        raise ValueError("The model does not record its training split, train it with train_model.")
+    if snapshot["fingerprint"] != graph_snapshot(G)["fingerprint"]:
+        raise ValueError("The model was trained on another graph.")
+
+    spec = feature_spec(model)
+    node_features = load_or_compute_node_features(G, spec) if spec is not None else None
+    _, X_test, _, y_test = training_split(G, split["sampling"], shard_dir if split["sharded"] else None, node_features)
+    return X_test, y_test
+
 if __name__ == "__main__":
     # Example usage with a generated graph
     G = nx.gnm_random_graph(100, 200)
-    train_model(G)
+    train_model(G, compare_baseline=True)
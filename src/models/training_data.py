@@ -0,0 +1,258 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+
+from src.algorithms.csr_graph import as_csr
+
+logging.basicConfig(level=logging.INFO)
+
+# Graphs with fewer nodes are swept in-process, a process pool would cost more than it saves
+PARALLEL_MIN_NODES = 2000
+
+# Upper bound on the distance entries (sources x nodes) computed by one sweep
+SWEEP_MAX_ENTRIES = 2 ** 22
+
+# Defaults of the sampling mode, see resolve_sampling
+DEFAULT_SAMPLING = {
+    'num_sources': 64,
+    'pair_budget': 100000,
+    'stratify': 'degree',
+    'seed': 42,
+}
+
+
+def node_feature_values(csr):
+    """
+    Encode node ids as the numeric values the model is trained on.
+    Ids are used as numbers when they are numeric (ints or numeric strings); otherwise
+    the node's index in the graph is used instead.
+    """
+    try:
+        return np.array([float(node) for node in csr.node_ids], dtype=np.float64)
+    except (TypeError, ValueError):
+        logging.warning("Node ids are not numeric, encoding nodes by their index instead.")
+        return np.arange(len(csr.node_ids), dtype=np.float64)
+
+
+def sweep_sources(matrix, sources, weighted):
+    """
+    Run one single-source search per source index (BFS when unweighted, Dijkstra
+    otherwise) and return the reachable (source, target, distance) triples, sources in
+    the given order and targets in node order. Self pairs are excluded.
+    """
+    distances = shortest_path(matrix, method='D', directed=True, unweighted=not weighted, indices=sources)
+    distances[np.arange(len(sources)), sources] = np.inf
+
+    rows, targets = np.nonzero(np.isfinite(distances))
+    return sources[rows], targets.astype(np.int32), distances[rows, targets]
+
+
+def source_chunks(sources, num_nodes):
+    """
+    Split source indices into chunks whose distance rows fit SWEEP_MAX_ENTRIES.
+    """
+    chunk_size = max(1, SWEEP_MAX_ENTRIES // max(num_nodes, 1))
+    return [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+
+
+_worker_matrix = None
+_worker_weighted = None
+
+
+def _init_worker(indptr, indices, weights, num_nodes, weighted):
+    # Each worker rebuilds the graph once instead of receiving it with every task
+    global _worker_matrix, _worker_weighted
+    _worker_matrix = csr_matrix((weights, indices, indptr), shape=(num_nodes, num_nodes))
+    _worker_weighted = weighted
+
+
+def _worker_sweep(sources):
+    return sweep_sources(_worker_matrix, sources, _worker_weighted)
+
+
+def iter_sweeps(csr, sources, weighted=False, n_jobs=None):
+    """
+    Yield the (source, target, distance) triples of `sources` chunk by chunk, in order.
+    With several jobs the chunks are sharded across a process pool.
+    """
+    num_nodes = csr.number_of_nodes()
+    if n_jobs is None:
+        n_jobs = os.cpu_count() if num_nodes >= PARALLEL_MIN_NODES else 1
+    chunks = source_chunks(np.asarray(sources, dtype=np.int32), num_nodes)
+
+    if n_jobs <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield sweep_sources(csr.matrix, chunk, weighted)
+        return
+
+    initargs = (csr.indptr, csr.indices, csr.weights, num_nodes, weighted)
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as executor:
+        yield from executor.map(_worker_sweep, chunks)
+
+
+def resolve_sampling(sampling, num_nodes):
+    """
+    Fill in the defaults of a sampling spec and clamp it to the graph size.
+    A sampling spec is a dict with the keys:
+      - num_sources: number of source nodes expanded with a single-source search
+      - pair_budget: maximum number of training pairs
+      - stratify: "degree", "component" or None, how source nodes are spread over the graph
+      - seed: seed of the random generator, so the same spec yields the same pairs
+    """
+    unknown = set(sampling) - set(DEFAULT_SAMPLING)
+    if unknown:
+        raise ValueError(f"Unknown sampling options: {sorted(unknown)}")
+    spec = dict(DEFAULT_SAMPLING, **sampling)
+    if spec['stratify'] not in ('degree', 'component', None):
+        raise ValueError(f"Unsupported stratification: {spec['stratify']}")
+    if spec['pair_budget'] < 1 or spec['num_sources'] < 1:
+        raise ValueError("num_sources and pair_budget must be positive.")
+    spec['num_sources'] = min(spec['num_sources'], spec['pair_budget'], num_nodes)
+    return spec
+
+
+def select_sources(csr, num_sources, stratify, rng):
+    """
+    Pick `num_sources` distinct source indices at random, spread over degree classes
+    (powers of two) or connected components in proportion to their size.
+    """
+    num_nodes = csr.number_of_nodes()
+    if stratify == 'degree':
+        strata = np.floor(np.log2(np.diff(csr.indptr) + 1)).astype(np.int64)
+    elif stratify == 'component':
+        _, strata = connected_components(csr.matrix, directed=csr.directed, connection='weak')
+    else:
+        strata = np.zeros(num_nodes, dtype=np.int64)
+
+    labels, sizes = np.unique(strata, return_counts=True)
+
+    # Largest remainder allocation of the sources to the strata
+    quotas = sizes * num_sources / num_nodes
+    allocation = np.floor(quotas).astype(np.int64)
+    remainder = num_sources - allocation.sum()
+    allocation[np.argsort(allocation - quotas, kind='stable')[:remainder]] += 1
+
+    sources = []
+    for label, count in zip(labels, allocation):
+        if count:
+            members = np.flatnonzero(strata == label)
+            sources.append(rng.choice(members, size=count, replace=False))
+    return np.sort(np.concatenate(sources)).astype(np.int32)
+
+
+def sample_block(block, per_source, rng):
+    """
+    Keep at most `per_source` random targets of every source in a sweep block.
+    """
+    block_sources, block_targets, block_distances = block
+    _, starts, counts = np.unique(block_sources, return_index=True, return_counts=True)
+
+    keep = []
+    for start, count in zip(starts, counts):
+        if count <= per_source:
+            keep.append(np.arange(start, start + count))
+        else:
+            keep.append(start + np.sort(rng.choice(count, size=per_source, replace=False)))
+    keep = np.concatenate(keep) if keep else np.empty(0, dtype=np.int64)
+    return block_sources[keep], block_targets[keep], block_distances[keep]
+
+
+def _pair_plan(csr, sampling):
+    # Sources to sweep, the number of targets kept per source (None for all) and the sampling generator
+    num_nodes = csr.number_of_nodes()
+    if sampling is None:
+        return np.arange(num_nodes, dtype=np.int32), None, None
+
+    spec = resolve_sampling(sampling, num_nodes)
+    rng = np.random.default_rng(spec['seed'])
+    if spec['num_sources']:
+        sources = select_sources(csr, spec['num_sources'], spec['stratify'], rng)
+    else:
+        sources = np.empty(0, dtype=np.int32)
+    return sources, spec['pair_budget'] // max(len(sources), 1), rng
+
+
+def _sweep_blocks(csr, sources, per_source, rng, weight=None, n_jobs=None):
+    for block in iter_sweeps(csr, sources, weighted=weight is not None, n_jobs=n_jobs):
+        yield block if per_source is None else sample_block(block, per_source, rng)
+
+
+def iter_pair_blocks(csr, weight=None, sampling=None, n_jobs=None):
+    """
+    Yield (source indices, target indices, distances) blocks of reachable ordered pairs
+    (source, target), source != target, with one single-source sweep per source.
+    By default every node is a source and every reachable target is kept. With a
+    sampling spec (see resolve_sampling) only a stratified random set of sources is
+    swept and each keeps a random subset of its targets, so the number of pairs is
+    bounded by the pair budget.
+    """
+    sources, per_source, rng = _pair_plan(csr, sampling)
+    return _sweep_blocks(csr, sources, per_source, rng, weight=weight, n_jobs=n_jobs)
+
+
+def generate_pair_distances(G, weight=None, sampling=None, n_jobs=None):
+    """
+    Compute the shortest path lengths of the pairs produced by iter_pair_blocks.
+    Returns the CSR graph and arrays of source indices, target indices and distances.
+    The arrays are allocated once for the largest possible number of pairs and every
+    block is written into place as it arrives; pairs without a path are trimmed off
+    the end in place.
+    """
+    csr = as_csr(G, weight)
+    num_nodes = csr.number_of_nodes()
+
+    sources, per_source, rng = _pair_plan(csr, sampling)
+    capacity = len(sources) * (max(num_nodes - 1, 0) if per_source is None else min(per_source, num_nodes - 1))
+
+    source_index = np.empty(capacity, dtype=np.int32)
+    target_index = np.empty(capacity, dtype=np.int32)
+    distances = np.empty(capacity, dtype=np.float64 if weight is not None else np.int32)
+
+    total = 0
+    for block_sources, block_targets, block_distances in _sweep_blocks(csr, sources, per_source, rng,
+                                                                       weight=weight, n_jobs=n_jobs):
+        end = total + len(block_distances)
+        source_index[total:end] = block_sources
+        target_index[total:end] = block_targets
+        distances[total:end] = block_distances
+        total = end
+
+    if total < capacity:
+        for array in (source_index, target_index, distances):
+            array.resize(total, refcheck=False)
+
+    if sampling is None:
+        unreachable = num_nodes * max(num_nodes - 1, 0) - total
+        if unreachable:
+            logging.warning(f"Skipped {unreachable} ordered node pairs without a path.")
+
+    return csr, source_index, target_index, distances
+
+
+def generate_training_data(G, weight=None, sampling=None, n_jobs=None, node_features=None):
+    """
+    Generate training data for the shortest path model.
+    For each ordered pair of distinct nodes with a path, compute the shortest path length:
+    the number of hops when weight is None, the weighted length otherwise.
+    Pass a sampling spec (see resolve_sampling) to generate a reproducible sample of the
+    pairs bounded by a pair budget instead, for graphs too large for all pairs.
+    Returns a (pairs, 2) array of numeric node ids, or the structural pair features when
+    the graph's NodeFeatures are given, and the matching array of lengths.
+    """
+    csr, source_index, target_index, labels = generate_pair_distances(
+        G, weight=weight, sampling=sampling, n_jobs=n_jobs)
+
+    if node_features is not None:
+        data = node_features.pair_features(source_index, target_index)
+    else:
+        node_values = node_feature_values(csr)
+        data = np.empty((len(labels), 2), dtype=np.float64)
+        data[:, 0] = node_values[source_index]
+        data[:, 1] = node_values[target_index]
+
+    logging.info(f"Generated {len(labels)} training pairs from {csr.number_of_nodes()} nodes.")
+    return data, labels
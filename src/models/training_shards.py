@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import logging
+
+import numpy as np
+
+from src.algorithms.csr_graph import as_csr
+from src.models.training_data import iter_pair_blocks, node_feature_values
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_SHARD_DIR = "data/processed/training_shards"
+
+# Rows per shard; a shard of node id pairs takes 16 bytes per row on disk
+DEFAULT_CHUNK_SIZE = 1000000
+
+MANIFEST_NAME = "manifest.json"
+
+
+def iter_training_chunks(G, chunk_size=DEFAULT_CHUNK_SIZE, weight=None, sampling=None, n_jobs=None,
+                         node_features=None):
+    """
+    Yield the training data of G as (features, labels) chunks of `chunk_size` rows
+    (the last chunk may be shorter), without holding the whole dataset in memory.
+    Features are float32 node id pairs, or structural pair features when the graph's
+    NodeFeatures are given, in the dtype RandomForestRegressor trains on. Labels are
+    float64 shortest path lengths, in the same order as generate_training_data.
+    """
+    csr = as_csr(G, weight)
+    node_values = node_feature_values(csr).astype(np.float32) if node_features is None else None
+    num_columns = 2 if node_features is None else node_features.num_features
+
+    features = np.empty((chunk_size, num_columns), dtype=np.float32)
+    labels = np.empty(chunk_size, dtype=np.float64)
+    filled = 0
+
+    for block_sources, block_targets, block_distances in iter_pair_blocks(
+            csr, weight=weight, sampling=sampling, n_jobs=n_jobs):
+        position = 0
+        while position < len(block_distances):
+            take = min(chunk_size - filled, len(block_distances) - position)
+            rows = slice(position, position + take)
+            if node_features is None:
+                features[filled:filled + take, 0] = node_values[block_sources[rows]]
+                features[filled:filled + take, 1] = node_values[block_targets[rows]]
+            else:
+                features[filled:filled + take] = node_features.pair_features(block_sources[rows], block_targets[rows])
+            labels[filled:filled + take] = block_distances[rows]
+            filled += take
+            position += take
+
+            if filled == chunk_size:
+                yield features, labels
+                features = np.empty((chunk_size, num_columns), dtype=np.float32)
+                labels = np.empty(chunk_size, dtype=np.float64)
+                filled = 0
+
+    if filled:
+        yield features[:filled], labels[:filled]
+
+
+def shard_key(csr, chunk_size, weight, sampling, node_features=None):
+    """
+    Identify a shard set by the graph content and the generation parameters.
+    """
+    params = json.dumps({"chunk_size": chunk_size, "weight": weight, "sampling": sampling,
+                         "features": node_features.spec if node_features is not None else None}, sort_keys=True)
+    return hashlib.sha256((csr.fingerprint() + params).encode("utf-8")).hexdigest()
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_training_shards(G, shard_dir=DEFAULT_SHARD_DIR, chunk_size=DEFAULT_CHUNK_SIZE,
+                          weight=None, sampling=None, n_jobs=None, node_features=None):
+    """
+    Persist the training data of G as .npy shards with a manifest and return the
+    manifest path. Shards live in a subdirectory named after the graph content hash
+    and generation parameters, so a rerun on an unchanged graph reuses them.
+    """
+    csr = as_csr(G, weight)
+    key = shard_key(csr, chunk_size, weight, sampling, node_features)
+    directory = os.path.join(shard_dir, key[:16])
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+
+    manifest = _read_manifest(manifest_path)
+    if manifest is not None and manifest["key"] == key and all(
+            os.path.exists(os.path.join(directory, shard[name]))
+            for shard in manifest["shards"] for name in ("features", "labels")):
+        logging.info(f"Reusing {len(manifest['shards'])} training shards from {directory}.")
+        return manifest_path
+
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    for i, (features, labels) in enumerate(iter_training_chunks(
+            csr, chunk_size=chunk_size, weight=weight, sampling=sampling, n_jobs=n_jobs,
+            node_features=node_features)):
+        shard = {"features": f"features_{i:05d}.npy", "labels": f"labels_{i:05d}.npy", "rows": len(labels)}
+        np.save(os.path.join(directory, shard["features"]), features)
+        np.save(os.path.join(directory, shard["labels"]), labels)
+        shards.append(shard)
+
+    manifest = {
+        "key": key,
+        "graph_hash": csr.fingerprint(),
+        "chunk_size": chunk_size,
+        "weight": weight,
+        "sampling": sampling,
+        "features": node_features.spec if node_features is not None else None,
+        "rows": sum(shard["rows"] for shard in shards),
+        "shards": shards,
+    }
+    # The manifest is written last and renamed into place, so an interrupted run is never reused
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    logging.info(f"Wrote {manifest['rows']} training rows in {len(shards)} shards to {directory}.")
+    return manifest_path
+
+
+def load_training_shards(manifest_path):
+    """
+    Open the shards listed in a manifest as memory-mapped (features, labels) arrays.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(manifest_path)
+    return [
+        (np.load(os.path.join(directory, shard["features"]), mmap_mode="r"),
+         np.load(os.path.join(directory, shard["labels"]), mmap_mode="r"))
+        for shard in manifest["shards"]
+    ]
+
+
+def split_training_shards(shards, test_size=0.2, random_state=42):
+    """
+    Split memory-mapped shards into train and test arrays.
+    Rows are copied shard by shard into preallocated arrays, so peak memory stays at
+    the dataset size plus one shard.
+    """
+    total = sum(len(labels) for _, labels in shards)
+    is_test = np.zeros(total, dtype=bool)
+    rng = np.random.RandomState(random_state)
+    is_test[rng.choice(total, size=int(np.ceil(total * test_size)), replace=False)] = True
+
+    num_test = int(is_test.sum())
+    num_columns = shards[0][0].shape[1] if shards else 2
+    X_train = np.empty((total - num_test, num_columns), dtype=np.float32)
+    X_test = np.empty((num_test, num_columns), dtype=np.float32)
+    y_train = np.empty(total - num_test, dtype=np.float64)
+    y_test = np.empty(num_test, dtype=np.float64)
+
+    offset = train_position = test_position = 0
+    for features, labels in shards:
+        mask = is_test[offset:offset + len(labels)]
+        num_shard_test = int(mask.sum())
+        num_shard_train = len(labels) - num_shard_test
+
+        X_train[train_position:train_position + num_shard_train] = features[~mask]
+        y_train[train_position:train_position + num_shard_train] = labels[~mask]
+        X_test[test_position:test_position + num_shard_test] = features[mask]
+        y_test[test_position:test_position + num_shard_test] = labels[mask]
+
+        offset += len(labels)
+        train_position += num_shard_train
+        test_position += num_shard_test
+
+    return X_train, X_test, y_train, y_test
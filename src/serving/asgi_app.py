@@ -0,0 +1,436 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from src.serving.metrics import MetricsRegistry, merge_exports, process_rss_bytes
+from src.serving.preload import PRELOAD_MANIFEST, load_preload_manifest
+
+logging.basicConfig(level=logging.INFO)
+
+# Worker processes answering requests, each with its own graphs, models and caches
+DEFAULT_WORKERS = int(os.environ.get("SERVING_WORKERS", os.cpu_count() or 1))
+
+# Requests accepted on top of the ones being worked on; past that requests are rejected with 429
+DEFAULT_MAX_QUEUED = int(os.environ.get("SERVING_MAX_QUEUED", 2 * DEFAULT_WORKERS))
+
+# Seconds a request may wait and run before it is answered with 504
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("SERVING_REQUEST_TIMEOUT", 30))
+
+# Retraining takes much longer than a query
+ROUTE_TIMEOUTS = {"/adapt": float(os.environ.get("SERVING_ADAPT_TIMEOUT", 600))}
+
+# Seconds given to accepted requests to finish when the server shuts down
+DEFAULT_SHUTDOWN_TIMEOUT = float(os.environ.get("SERVING_SHUTDOWN_TIMEOUT", 30))
+
+DEFAULT_MAX_BODY_BYTES = int(os.environ.get("SERVING_MAX_BODY_BYTES", 64 * 1024 ** 2))
+
+# Comma separated graph files, each optionally suffixed with :edgelist or :graphml, loaded
+# into every worker before it takes requests
+DEFAULT_PRELOAD_GRAPHS = os.environ.get("SERVING_PRELOAD_GRAPHS", "")
+
+
+def parse_preload_graphs(spec):
+    """
+    Parse a "path[:fmt],path[:fmt]" list into (path, fmt) tuples. Without a suffix
+    .gbin files are binary graphs and anything else an edgelist.
+    """
+    from src.serving.graph_registry import graph_format
+
+    graphs = []
+    for item in filter(None, (item.strip() for item in spec.split(","))):
+        path, _, fmt = item.rpartition(":") if item.endswith((":edgelist", ":graphml")) else (item, "", "")
+        graphs.append((path, fmt or graph_format(path)))
+    return graphs
+
+
+_worker_app = None
+
+
+def preload_manifest(manifest_path=PRELOAD_MANIFEST, preload_graphs=()):
+    """
+    The preload manifest at `manifest_path` with the (path, fmt) tuples of
+    `preload_graphs` added, with the CSR form /dijkstra searches on for edge lists and
+    binary graphs.
+    """
+    manifest = load_preload_manifest(manifest_path)
+    for graph_file, fmt in preload_graphs:
+        derived = ["csr"] if fmt in ("edgelist", "gbin") else []
+        manifest["graphs"].append({"path": graph_file, "format": fmt, "derived": derived})
+    return manifest
+
+
+def _init_worker(manifest, metrics_dir=None, workers=1):
+    # Each worker imports the Flask app and warms the graphs and models of the
+    # manifest once, so requests never pay for loading them
+    global _worker_app
+    from src.api import app, warm_start
+    from src.serving.metrics import metrics
+
+    # An edge update only reaches the registry of the worker that serves it
+    app.config["GRAPH_UPDATES"] = workers <= 1
+
+    if metrics_dir is not None:
+        # Exported for the front end to merge into its /metrics
+        metrics.enable_export(metrics_dir)
+
+    warm_start(manifest)
+    _worker_app = app
+
+
+def _shutdown_executor(executor, futures, wait):
+    # Executor.shutdown only cancels queued futures itself from Python 3.9 on
+    for future in list(futures):
+        future.cancel()
+    executor.shutdown(wait=wait)
+
+
+def _worker_ready():
+    from src.serving.metrics import metrics
+
+    metrics.maybe_export(force=True)
+    return os.getpid()
+
+
+def _worker_handle(method, path, query_string, headers, body):
+    # Run one request through the Flask app and return the buffered response
+    environ = EnvironBuilder(method=method, path=path, query_string=query_string,
+                             headers=headers, data=body).get_environ()
+    app_iter, status, response_headers = run_wsgi_app(_worker_app, environ, buffered=True)
+    try:
+        content = b"".join(app_iter)
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+    return int(status.split(" ", 1)[0]), list(response_headers.items()), content
+
+
+class ServingApp:
+    """
+    ASGI front end of the API for production serving.
+
+    Requests are read on the event loop and handed to a process pool whose workers
+    run the Flask routes of src.api, so CPU-bound searches and model inference run in
+    parallel and never block the loop; every route keeps its request and response format.
+
+    At most `workers + max_queued` requests are accepted at a time, further requests
+    are answered with 429 and a Retry-After header. A request that takes longer than
+    its timeout is answered with 504; if it was still queued it is dropped, otherwise
+    its worker finishes it and it keeps counting against the limit until then.
+    On shutdown new requests get 503 while accepted ones are given `shutdown_timeout`
+    seconds to finish before the pool is stopped.
+
+    GET /ready answers 200 once every worker has warmed the graphs and models of the
+    preload manifest, and 503 while the pool (re)starts or drains.
+    GET /metrics is answered by the front end itself: the metrics the workers export
+    (at most METRICS_EXPORT_INTERVAL seconds old), merged with the end-to-end latency
+    seen by the front end, its queue depth, rejections and its own RSS.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queued=DEFAULT_MAX_QUEUED,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, shutdown_timeout=DEFAULT_SHUTDOWN_TIMEOUT,
+                 max_body_bytes=DEFAULT_MAX_BODY_BYTES, preload_graphs=None, route_timeouts=None,
+                 manifest_path=PRELOAD_MANIFEST):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.request_timeout = request_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.max_body_bytes = max_body_bytes
+        preload_graphs = parse_preload_graphs(DEFAULT_PRELOAD_GRAPHS) if preload_graphs is None \
+            else list(preload_graphs)
+        self.manifest = preload_manifest(manifest_path, preload_graphs)
+        self.route_timeouts = dict(ROUTE_TIMEOUTS if route_timeouts is None else route_timeouts)
+        self.executor = None
+        self.in_flight = 0
+        self._pending = set()
+        self.draining = False
+        self.ready = False
+        self.warm_seconds = None
+        self._idle = None
+        self.requests = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.metrics = MetricsRegistry()
+        self.metrics.register_gauges(self._gauges)
+        # Last exports of the workers that exited, e.g. when a broken pool was restarted
+        self.retired_metrics = MetricsRegistry()
+        self.metrics_dir = None
+
+    @property
+    def capacity(self):
+        return self.workers + self.max_queued
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logging.exception("Serving startup failed.")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _start_executor(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.manifest, self.metrics_dir, self.workers))
+
+    async def startup(self):
+        """
+        Start the worker pool and wait until every worker has loaded its models and graphs.
+        """
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.draining = False
+        if self.metrics_dir is None:
+            self.metrics_dir = tempfile.mkdtemp(prefix="graph-api-metrics-")
+        self._start_executor()
+        await self._warm_workers()
+
+    async def _warm_workers(self):
+        # Workers start on demand, one task per worker gets them all initialized
+        start_time = time.perf_counter()
+        executor = self.executor
+        pids = await asyncio.gather(*(asyncio.wrap_future(executor.submit(_worker_ready))
+                                      for _ in range(self.workers)))
+        self.warm_seconds = time.perf_counter() - start_time
+        if executor is self.executor and not self.draining:
+            self.ready = True
+        logging.info(f"Started {len(set(pids))} serving workers in {self.warm_seconds:.2f} seconds.")
+
+    async def shutdown(self):
+        """
+        Stop accepting requests, let accepted ones finish and stop the worker pool.
+        """
+        self.draining = True
+        self.ready = False
+        if self.in_flight:
+            logging.info(f"Waiting for {self.in_flight} requests to finish.")
+            try:
+                await asyncio.wait_for(self._idle.wait(), self.shutdown_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"{self.in_flight} requests still running after {self.shutdown_timeout} seconds.")
+        if self.executor is not None:
+            executor, self.executor = self.executor, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: _shutdown_executor(executor, self._pending, wait=True))
+        if self.metrics_dir is not None:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+            self.metrics_dir = None
+        logging.info("Serving workers stopped.")
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise ValueError(f"Request body larger than {self.max_body_bytes} bytes.")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _respond(send, status, body, headers=()):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                for name, value in headers]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _respond_error(self, send, status, message, headers=()):
+        body = json.dumps({"error": message}).encode()
+        await self._respond(send, status, body, [("Content-Type", "application/json"),
+                                                 ("Content-Length", str(len(body)))] + list(headers))
+
+    def _release(self, future):
+        self._pending.discard(future)
+        self.in_flight -= 1
+        if not self.in_flight:
+            self._idle.set()
+
+    async def _http(self, scope, receive, send):
+        self.requests += 1
+        if scope["method"] == "GET" and scope["path"] == "/ready":
+            body = json.dumps({"ready": self.ready, "workers": self.workers, "warm_seconds": self.warm_seconds}).encode()
+            await self._respond(send, 200 if self.ready else 503, body,
+                                [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+            return
+        if scope["method"] == "GET" and scope["path"] == "/metrics":
+            # Answered on the loop, so that a saturated pool can still be observed
+            body = self.render_metrics().encode()
+            await self._respond(send, 200, body, [("Content-Type", "text/plain; version=0.0.4"),
+                                                  ("Content-Length", str(len(body)))])
+            return
+        start_time = time.perf_counter()
+        status = await self._dispatch(scope, receive, send)
+        if status is not None:
+            self.metrics.observe("frontend_request_seconds", time.perf_counter() - start_time, status=status)
+
+    async def _dispatch(self, scope, receive, send):
+        # Answer a request and return its status, or None if the client went away
+        if self.draining or self.executor is None:
+            await self._respond_error(send, 503, "Server is shutting down.")
+            return 503
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            await self._respond_error(send, 429, "Server is busy, retry later.", [("Retry-After", "1")])
+            return 429
+
+        # The slot is held until the worker is done with the request, not just until it times out
+        self.in_flight += 1
+        self._idle.clear()
+
+        try:
+            body = await self._read_body(receive)
+        except ValueError as e:
+            self._release(None)
+            await self._respond_error(send, 413, str(e))
+            return 413
+        if body is None:
+            self._release(None)
+            return None
+
+        headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]]
+        try:
+            future = self.executor.submit(_worker_handle, scope["method"], scope["path"],
+                                          scope["query_string"].decode("latin-1"), headers, body)
+        except BrokenProcessPool:
+            self._release(None)
+            await self._restart_executor()
+            await self._respond_error(send, 503, "Worker pool restarted, retry later.")
+            return 503
+
+        self._pending.add(future)
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+
+        timeout = self.route_timeouts.get(scope["path"], self.request_timeout)
+        try:
+            status, response_headers, content = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            # Drops the request if no worker has picked it up yet
+            future.cancel()
+            self.timeouts += 1
+            logging.warning(f"{scope['method']} {scope['path']} timed out after {timeout} seconds.")
+            await self._respond_error(send, 504, f"Request timed out after {timeout} seconds.")
+            return 504
+        except BrokenProcessPool:
+            self.failures += 1
+            logging.error(f"A serving worker died while answering {scope['method']} {scope['path']}.")
+            await self._restart_executor()
+            await self._respond_error(send, 503, "Worker failed, retry later.")
+            return 503
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # Dropped by the shutdown before a worker picked it up
+            await self._respond_error(send, 503, "Server is shutting down.")
+            return 503
+
+        await self._respond(send, status, content, response_headers)
+        return status
+
+    async def _restart_executor(self):
+        if self.executor is None or self.draining:
+            return
+        broken, self.executor = self.executor, None
+        _shutdown_executor(broken, self._pending, wait=False)
+        self.ready = False
+        self._start_executor()
+        logging.info("Restarted the serving worker pool.")
+        # Not ready again until the new workers have warmed up
+        asyncio.ensure_future(self._warm_workers())
+
+    def _gauges(self):
+        return [
+            ("frontend_in_flight", self.in_flight, {}),
+            # Accepted requests no worker has picked up yet
+            ("frontend_queue_depth", max(self.in_flight - self.workers, 0), {}),
+            ("frontend_capacity", self.capacity, {}),
+            ("frontend_ready", int(self.ready), {}),
+            ("frontend_rejected_total", self.rejected, {}),
+            ("frontend_timeouts_total", self.timeouts, {}),
+            ("frontend_failures_total", self.failures, {}),
+            ("process_rss_bytes", process_rss_bytes(), {"worker": "frontend"}),
+        ]
+
+    def render_metrics(self):
+        """
+        Prometheus text of the front end merged with the latest exports of the workers,
+        whose gauges are labelled with their pid, and with the last exports of the
+        workers that exited.
+        """
+        if self.metrics_dir is None:
+            return self.metrics.render()
+        merged, worker_gauges = merge_exports(self.metrics_dir, self.metrics, self.retired_metrics)
+        return merged.render(self.metrics.gauges() + worker_gauges)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+def serve(host="127.0.0.1", port=8000, **kwargs):
+    """
+    Serve the API with uvicorn (`pip install uvicorn`), which handles SIGINT/SIGTERM by
+    closing the listening socket, finishing open requests and running the shutdown above.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("Production serving requires uvicorn, install it with `pip install uvicorn`.")
+    uvicorn.run(ServingApp(**kwargs), host=host, port=port, lifespan="on", log_level="info")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API through the ASGI front end and a worker pool.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED)
+    parser.add_argument("--request-timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT)
+    parser.add_argument("--preload-graphs", default=DEFAULT_PRELOAD_GRAPHS,
+                        help="Comma separated graph files (path[:edgelist|:graphml], or .gbin) to load in every worker.")
+    parser.add_argument("--preload-manifest", default=PRELOAD_MANIFEST,
+                        help="JSON manifest of the graphs, derived data and models every worker warms before serving.")
+    args = parser.parse_args(argv)
+
+    serve(args.host, args.port, workers=args.workers, max_queued=args.max_queued,
+          request_timeout=args.request_timeout, preload_graphs=parse_preload_graphs(args.preload_graphs),
+          manifest_path=args.preload_manifest)
+
+
+if __name__ == "__main__":
+    main()
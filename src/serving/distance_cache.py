@@ -0,0 +1,239 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from src.algorithms.csr_graph import csr_shortest_path_tree
+from src.algorithms.dynamic_shortest_paths import repair_shortest_path_tree
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_MAX_BYTES = int(os.environ.get("DISTANCE_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+# Number of requests from the same source after which its whole shortest path tree is cached
+DEFAULT_HOT_SOURCE_REQUESTS = int(os.environ.get("DISTANCE_CACHE_HOT_SOURCE_REQUESTS", 3))
+
+# Number of sources whose request counts are tracked before the counts are aged
+MAX_TRACKED_SOURCES = 100000
+
+# Rough footprint of a cached (path, length) answer: key, tuple and list overhead plus
+# a reference and a node id string per path node
+PAIR_ENTRY_BYTES = 400
+PATH_NODE_BYTES = 64
+
+
+def estimate_pair_bytes(path):
+    return PAIR_ENTRY_BYTES + PATH_NODE_BYTES * len(path)
+
+
+class _Tree:
+    def __init__(self, distances, predecessors):
+        # float64 distances and int32 predecessors, 12 bytes per node
+        self.distances = distances
+        self.predecessors = predecessors.astype(np.int32)
+        self.nbytes = self.distances.nbytes + self.predecessors.nbytes
+
+
+class DistanceCache:
+    """
+    Exact shortest path cache for skewed query traffic.
+
+    Answers are cached per (graph fingerprint, source, target). Sources that are
+    queried repeatedly get their full shortest path tree cached instead, so any later
+    target from a hot source is answered with a lookup and a predecessor walk.
+
+    Entries are evicted least recently used first once their estimated size exceeds
+    `max_bytes`; a tree costs 12 bytes per node, a single answer a few hundred bytes.
+    Keys include the graph fingerprint, so a changed graph never returns stale
+    answers, and the entries of the previous version are dropped as soon as the new
+    version is seen under the same graph key.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, hot_source_requests=DEFAULT_HOT_SOURCE_REQUESTS):
+        self.max_bytes = max_bytes
+        self.hot_source_requests = hot_source_requests
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._source_requests = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.pair_hits = 0
+        self.tree_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.repaired_trees = 0
+
+    def shortest_path(self, graph_key, csr, source, target):
+        """
+        Return the Dijkstra shortest path and its length between two nodes of `csr`,
+        the CSR graph currently loaded under `graph_key` (e.g. its file path).
+        Raises nx.NodeNotFound for unknown nodes, like csr_dijkstra.
+        """
+        path, length, _ = self.search(graph_key, csr, source, target)
+        return path, length
+
+    def search(self, graph_key, csr, source, target):
+        """
+        Like shortest_path, but also return the number of nodes settled to answer:
+        zero when the answer comes from the cache.
+        """
+        fingerprint = csr.fingerprint()
+        pair_key = ("pair", fingerprint, source, target)
+        tree_key = ("tree", fingerprint, source)
+
+        with self._lock:
+            if self._fingerprints.get(graph_key) != fingerprint:
+                self._drop_graph(graph_key)
+                self._fingerprints[graph_key] = fingerprint
+
+            tree = self._entries.get(tree_key)
+            if tree is not None:
+                self._entries.move_to_end(tree_key)
+                self.tree_hits += 1
+            else:
+                answer = self._entries.get(pair_key)
+                if answer is not None:
+                    self._entries.move_to_end(pair_key)
+                    self.pair_hits += 1
+                    return answer + (0,)
+                self.misses += 1
+                hot = self._count_request(fingerprint, source)
+
+        if tree is not None:
+            return self._answer_from_tree(csr, tree, target) + (0,)
+
+        csr.node_index(target)
+        tree = _Tree(*csr_shortest_path_tree(csr, source))
+        answer = self._answer_from_tree(csr, tree, target)
+        if hot:
+            self._store(tree_key, tree, tree.nbytes)
+        else:
+            self._store(pair_key, answer, estimate_pair_bytes(answer[0]))
+        return answer + (int(np.count_nonzero(np.isfinite(tree.distances))),)
+
+    @staticmethod
+    def _answer_from_tree(csr, tree, target):
+        t = csr.node_index(target)
+        if np.isinf(tree.distances[t]):
+            return [], float('inf')
+        return csr.path_to(tree.predecessors, t), csr.length_value(tree.distances[t])
+
+    def _count_request(self, fingerprint, source):
+        key = (fingerprint, source)
+        count = self._source_requests.get(key, 0) + 1
+        self._source_requests[key] = count
+        if len(self._source_requests) > MAX_TRACKED_SOURCES:
+            # Age the counts so that sources that were hot long ago are forgotten
+            self._source_requests = {k: c // 2 for k, c in self._source_requests.items() if c > 1}
+        return count >= self.hot_source_requests
+
+    def _store(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key[1] not in self._fingerprints.values():
+                # The graph changed while this answer was computed
+                return
+            if key not in self._entries:
+                self.nbytes += nbytes
+                self._sizes[key] = nbytes
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while self.nbytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self.nbytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+
+    def repair(self, graph_key, old_csr, new_csr, changes):
+        """
+        Carry the cached shortest path trees of `graph_key` over to an updated version
+        of its graph, given the old and new CSR graphs and the changed arcs as index
+        arrays (see repair_shortest_path_tree). Trees are repaired instead of dropped,
+        so hot sources stay hot across live edge updates; cached single answers are
+        dropped. Returns the number of trees repaired and of nodes they touched.
+        """
+        old_fingerprint, new_fingerprint = old_csr.fingerprint(), new_csr.fingerprint()
+        with self._lock:
+            if self._fingerprints.get(graph_key) != old_fingerprint:
+                return 0, 0
+            trees = [(key[2], tree) for key, tree in self._entries.items()
+                     if key[0] == "tree" and key[1] == old_fingerprint]
+            hot = {k[1]: c for k, c in self._source_requests.items() if k[0] == old_fingerprint}
+
+        # Repair outside the lock, lookups of other graphs carry on meanwhile
+        repaired = []
+        touched = 0
+        for source, tree in trees:
+            distances, predecessors, count = repair_shortest_path_tree(
+                new_csr, new_csr.node_index(source), tree.distances, tree.predecessors, changes)
+            repaired.append((source, _Tree(distances, predecessors)))
+            touched += count
+
+        with self._lock:
+            if self._fingerprints.get(graph_key) not in (old_fingerprint, new_fingerprint):
+                # Another version of the graph was seen in the meantime
+                return 0, touched
+            self._drop_graph(graph_key)
+            self._fingerprints[graph_key] = new_fingerprint
+            self._source_requests.update(((new_fingerprint, source), count) for source, count in hot.items())
+            self.repaired_trees += len(repaired)
+
+        for source, tree in repaired:
+            self._store(("tree", new_fingerprint, source), tree, tree.nbytes)
+        logging.info("Repaired %d cached shortest path trees of %s, %d nodes touched.", len(repaired), graph_key, touched)
+        return len(repaired), touched
+
+    def _drop_graph(self, graph_key):
+        fingerprint = self._fingerprints.pop(graph_key, None)
+        if fingerprint is None or fingerprint in self._fingerprints.values():
+            return
+        for key in [key for key in self._entries if key[1] == fingerprint]:
+            del self._entries[key]
+            self.nbytes -= self._sizes.pop(key)
+        self._source_requests = {k: c for k, c in self._source_requests.items() if k[0] != fingerprint}
+        self.invalidations += 1
+        logging.info("Dropped cached distances of the previous version of %s.", graph_key)
+
+    def invalidate(self, graph_key=None):
+        """
+        Drop the cached distances of one graph, or of every graph if no key is given.
+        """
+        with self._lock:
+            if graph_key is not None:
+                self._drop_graph(graph_key)
+                return
+            self._entries.clear()
+            self._sizes.clear()
+            self._source_requests.clear()
+            self._fingerprints.clear()
+            self.nbytes = 0
+            self.invalidations += 1
+
+    def stats(self):
+        """
+        Return hit/miss counters, the hit ratio and the current memory usage.
+        """
+        with self._lock:
+            hits = self.pair_hits + self.tree_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "trees": sum(1 for key in self._entries if key[0] == "tree"),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "pair_hits": self.pair_hits,
+                "tree_hits": self.tree_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "repaired_trees": self.repaired_trees,
+            }
+
+
+# Cache shared by all endpoints of the API process.
+distance_cache = DistanceCache()
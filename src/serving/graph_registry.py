@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import networkx as nx
+
+from src.algorithms.binary_graph import BINARY_GRAPH_EXTENSION, read_binary_graph
+from src.algorithms.csr_graph import CSRGraph
+
+logging.basicConfig(level=logging.INFO)
+
+# Rough in-memory footprint of a networkx graph, used for the memory budget.
+# A node costs an entry in _node and _adj, an edge costs adjacency entries in
+# both directions plus its attribute dict.
+NODE_OVERHEAD_BYTES = 600
+EDGE_OVERHEAD_BYTES = 500
+# A node id of an in-memory CSRGraph costs a list entry and an index dict entry
+CSR_NODE_BYTES = 200
+
+DEFAULT_MAX_BYTES = int(os.environ.get("GRAPH_REGISTRY_MAX_BYTES", 2 * 1024 ** 3))
+
+GRAPH_READERS = {
+    "edgelist": nx.read_edgelist,
+    "graphml": nx.read_graphml,
+    # Memory-mapped CSRGraph, see src/algorithms/binary_graph.py
+    "gbin": read_binary_graph,
+}
+
+
+def graph_format(path, default="edgelist"):
+    """
+    Return the format to read a graph file with: binary graphs are recognized by their
+    extension, any other file is read in the default format of the endpoint.
+    """
+    return "gbin" if path.endswith(BINARY_GRAPH_EXTENSION) else default
+
+
+def estimate_graph_bytes(G):
+    """
+    Estimate the memory held by a loaded graph.
+    Memory-mapped arrays of binary graphs are not counted: they live in the page
+    cache, shared by every process that maps the file and reclaimable by the OS.
+    """
+    if isinstance(G, CSRGraph):
+        nbytes = sum(array.nbytes for array in (G.indptr, G.indices, G.weights) if not isinstance(array, np.memmap))
+        if isinstance(G.index, dict):
+            nbytes += G.number_of_nodes() * CSR_NODE_BYTES
+        return nbytes
+    return G.number_of_nodes() * NODE_OVERHEAD_BYTES + G.number_of_edges() * EDGE_OVERHEAD_BYTES
+
+
+class _Entry:
+    def __init__(self, graph, signature, nbytes, load_time):
+        self.graph = graph
+        self.signature = signature
+        self.nbytes = nbytes
+        self.load_time = load_time
+        # Artifacts computed from the graph (e.g. its CSR form), dropped together with it
+        self.derived = {}
+
+
+class GraphRegistry:
+    """
+    Process-wide cache of parsed graph files.
+
+    Each graph file is parsed once and kept in memory, keyed by its absolute path
+    and format. The file's mtime and size are checked on every lookup so that a
+    changed file is reloaded transparently. When the estimated memory of all
+    loaded graphs exceeds `max_bytes`, the least recently used graphs are evicted.
+
+    Graphs handed out by the registry are shared between requests and must not be
+    mutated by callers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.updates = 0
+        self.load_time = 0.0
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, path, fmt="edgelist"):
+        """
+        Return the graph stored in `path`, parsing it only if it is not loaded yet
+        or the file changed since it was loaded.
+        Raises FileNotFoundError if the file does not exist.
+        """
+        if fmt not in GRAPH_READERS:
+            raise ValueError(f"Unsupported graph format: {fmt}")
+
+        key = (os.path.abspath(path), fmt)
+        signature = self._signature(path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.graph
+            load_lock = self._load_locks.setdefault(key, threading.RLock())
+
+        # Parse outside the registry lock so lookups of other graphs are not blocked,
+        # but only once per file even if several requests miss at the same time.
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.signature == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.graph
+                reloading = entry is not None
+
+            start_time = time.perf_counter()
+            G = GRAPH_READERS[fmt](path)
+            duration = time.perf_counter() - start_time
+
+            with self._lock:
+                self.misses += 1
+                self.load_time += duration
+                if reloading:
+                    self.reloads += 1
+                self._entries[key] = _Entry(G, signature, estimate_graph_bytes(G), duration)
+                self._entries.move_to_end(key)
+                self._evict()
+
+        logging.info("Loaded graph %s (%s) in %.3f seconds.", path, fmt, duration)
+        return G
+
+    def get_derived(self, path, name, builder, fmt="edgelist"):
+        """
+        Return an artifact computed from the graph in `path` by `builder(G)`, such as
+        its CSR representation. The artifact is built once per loaded version of the
+        graph and dropped when the graph is reloaded or evicted. Artifacts exposing an
+        `nbytes` attribute count towards the memory budget.
+        """
+        G = self.get(path, fmt)
+        key = (os.path.abspath(path), fmt)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.graph is not G:
+                # The graph was evicted or reloaded in the meantime, do not cache
+                return builder(G)
+            if name in entry.derived:
+                return entry.derived[name]
+            load_lock = self._load_locks.setdefault(key, threading.RLock())
+
+        with load_lock:
+            with self._lock:
+                if name in entry.derived:
+                    return entry.derived[name]
+            artifact = builder(G)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    entry.derived[name] = artifact
+                    # Binary graphs are their own CSR form, already counted
+                    if artifact is not G:
+                        entry.nbytes += getattr(artifact, "nbytes", 0)
+                    self._evict()
+        return artifact
+
+    def replace(self, path, G, fmt="edgelist", derived=None):
+        """
+        Swap the loaded graph of `path` for an updated copy G, e.g. after live edge
+        updates, without touching the file. Requests already holding the previous graph
+        keep using it; artifacts derived from it are dropped unless updated versions are
+        passed in `derived`. The file signature is kept, so the updated graph is served
+        until the file itself changes and is reloaded.
+        Raises KeyError if the graph is not loaded.
+        """
+        key = (os.path.abspath(path), fmt)
+        with self._lock:
+            entry = self._entries[key]
+            updated = _Entry(G, entry.signature, estimate_graph_bytes(G), entry.load_time)
+            for name, artifact in (derived or {}).items():
+                updated.derived[name] = artifact
+                if artifact is not G:
+                    updated.nbytes += getattr(artifact, "nbytes", 0)
+            self._entries[key] = updated
+            self._entries.move_to_end(key)
+            self.updates += 1
+            self._evict()
+
+    def _evict(self):
+        # Always keep the most recently used graph, even if it alone exceeds the budget.
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            logging.info("Evicted graph %s (%s) from the registry.", *key)
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def invalidate(self, path=None):
+        """
+        Drop a single graph file, or every loaded graph if no path is given.
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            path = os.path.abspath(path)
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def stats(self):
+        """
+        Return hit/miss/load-time counters and the current memory usage.
+        """
+        with self._lock:
+            return {
+                "graphs": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+                "updates": self.updates,
+                "load_time": self.load_time,
+            }
+
+
+# Registry shared by all endpoints of the API process.
+graph_registry = GraphRegistry()
@@ -0,0 +1,331 @@
+import copy
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_DB_PATH = os.environ.get("JOB_DB_PATH", "data/jobs/jobs.sqlite3")
+
+# Adaptation jobs run at the same time; each one retrains a whole model
+DEFAULT_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+
+# Seconds between two scans for jobs of API processes that have exited
+ORPHAN_SCAN_INTERVAL = float(os.environ.get("JOB_ORPHAN_SCAN_INTERVAL", 30))
+
+# Seconds the job counts of the /metrics gauges may be old; counting jobs queries the shared database
+STATS_MAX_AGE = float(os.environ.get("JOB_STATS_MAX_AGE", 5))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER NOT NULL,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+"""
+
+
+def file_digest(path, chunk_bytes=1 << 20):
+    """
+    SHA-256 of the content of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def connect(db_path):
+    """
+    Open the job database, creating it if needed. WAL mode lets the API processes read
+    job states while a worker is updating them.
+    """
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    del job["dedup_key"], job["owner_pid"]
+    return job
+
+
+def _load_job(conn, job_id):
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row is not None else None
+
+
+def run_adapt_job(db_path, job_id, model_paths):
+    """
+    Retrain the model on the job's graph and publish it as the adapted model.
+    Runs in a worker process; progress and the outcome are written to the job database,
+    and a cancel request is honoured at the next stage boundary.
+    """
+    from src.models.adapt_models_for_new_graphs import AdaptationCancelled, adapt_model_to_new_graph
+    from src.serving.graph_registry import graph_registry
+    from src.serving.model_manager import model_manager
+
+    conn = connect(db_path)
+    try:
+        # Only a job that is still queued is started, a cancelled one is left alone
+        started = conn.execute("UPDATE jobs SET status = ?, stage = ?, started_at = ? WHERE id = ? AND status = ?",
+                               (RUNNING, "loading", time.time(), job_id, QUEUED)).rowcount
+        if not started:
+            return
+        params = _load_job(conn, job_id)["params"]
+
+        def progress(stage, fraction):
+            conn.execute("UPDATE jobs SET stage = ?, progress = ? WHERE id = ?", (stage, fraction, job_id))
+            if conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+                raise AdaptationCancelled(job_id)
+
+        def finish(status, error=None, result=None):
+            conn.execute("UPDATE jobs SET status = ?, error = ?, result = ?, finished_at = ?, "
+                         "progress = CASE WHEN ? THEN 1.0 ELSE progress END WHERE id = ?",
+                         (status, error, json.dumps(result) if result is not None else None, time.time(),
+                          status == SUCCEEDED, job_id))
+
+        try:
+            model_manager.paths.update(model_paths)
+            G = graph_registry.get(params["graph_file"], fmt=params["fmt"])
+            mode = params.get("mode", "full")
+            # Incremental updates build on the last adapted model, full ones start over from the compressed model
+            base = "adapted" if mode == "incremental" and os.path.exists(model_manager.paths["adapted"]) \
+                else "compressed"
+            # Work on a private copy, the served model must not be refit in place
+            model = copy.deepcopy(model_manager.get(base))
+            adapted_model = adapt_model_to_new_graph(model, G, sampling=params.get("sampling"),
+                                                     progress=progress, mode=mode)
+            if adapted_model is None:
+                finish(FAILED, "Adaptation failed due to no valid path in the graph.")
+                return
+            progress("publishing", 0.95)
+            model_manager.publish("adapted", adapted_model)
+        except AdaptationCancelled:
+            finish(CANCELLED)
+            logging.info(f"Adaptation job {job_id} cancelled.")
+            return
+        except Exception as e:
+            logging.exception(f"Adaptation job {job_id} failed.")
+            finish(FAILED, str(e))
+            return
+
+        finish(SUCCEEDED, result={"model": "adapted", "version": model_manager.version("adapted"),
+                                  "base": base, "report": getattr(adapted_model, "adaptation_report_", None)})
+        logging.info(f"Adaptation job {job_id} done, model adapted and saved for graph {params['graph_file']}.")
+    finally:
+        conn.close()
+
+
+class JobQueue:
+    """
+    Background queue for model retraining jobs, backed by a SQLite file.
+
+    Jobs are recorded in the database and run on a local process pool, so requests
+    return as soon as a job is queued and every API process sees the same job states.
+    Submitting a job while an identical one (same kind, graph content and parameters)
+    is still queued or running returns the existing job instead of starting another.
+    Running jobs stop at their next stage when cancelled. Jobs that were queued or
+    running in an API process that has since exited are marked failed, when the queue
+    first opens the database and every ORPHAN_SCAN_INTERVAL seconds after that.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, workers=DEFAULT_WORKERS):
+        self.db_path = db_path
+        self.workers = workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+        self._last_orphan_scan = None
+        self._counts = None
+
+    def _connect(self):
+        conn = connect(self.db_path)
+        now = time.monotonic()
+        # Checking owner processes on every connection would slow down status polls and /metrics
+        if self._last_orphan_scan is None or now - self._last_orphan_scan >= ORPHAN_SCAN_INTERVAL:
+            self._last_orphan_scan = now
+            self._fail_orphaned_jobs(conn)
+        return conn
+
+    @staticmethod
+    def _fail_orphaned_jobs(conn):
+        # The pool of the process that queued a job runs it, so the job is lost with that process
+        rows = conn.execute("SELECT id, owner_pid FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+        for row in rows:
+            try:
+                os.kill(row["owner_pid"], 0)
+            except ProcessLookupError:
+                conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                             (FAILED, "Interrupted by a server restart.", time.time(), row["id"]))
+                logging.warning(f"Job {row['id']} was interrupted by a server restart.")
+            except PermissionError:
+                pass
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def submit_adapt(self, graph_file, fmt="graphml", sampling=None, mode="full", model_paths=None):
+        """
+        Queue the adaptation of the model to a graph file (see adapt_model_to_new_graph for the modes).
+        Returns the job and whether it was coalesced with an identical unfinished job.
+        """
+        from src.serving.model_manager import model_manager
+
+        params = {"graph_file": graph_file, "fmt": fmt, "sampling": sampling, "mode": mode}
+        model_paths = dict(model_manager.paths if model_paths is None else model_paths)
+        # Apps serving other model files adapt and publish their own models
+        dedup_key = json.dumps({"kind": "adapt", "graph": file_digest(graph_file), "fmt": fmt,
+                                "sampling": sampling, "mode": mode, "models": model_paths}, sort_keys=True)
+
+        conn = self._connect()
+        try:
+            # The write lock makes the lookup and the insert atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM jobs WHERE dedup_key = ? AND status IN (?, ?) "
+                               "ORDER BY created_at LIMIT 1", (dedup_key, QUEUED, RUNNING)).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                self.coalesced += 1
+                logging.info(f"Adaptation of {graph_file} coalesced with job {row['id']}.")
+                return _load_job(conn, row["id"]), True
+
+            job_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO jobs (id, kind, dedup_key, params, status, progress, owner_pid, created_at) "
+                         "VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+                         (job_id, "adapt", dedup_key, json.dumps(params), QUEUED, os.getpid(), time.time()))
+            conn.execute("COMMIT")
+            job = _load_job(conn, job_id)
+        finally:
+            conn.close()
+
+        future = self._get_executor().submit(run_adapt_job, self.db_path, job_id, model_paths)
+        with self._lock:
+            self._futures[job_id] = future
+        # Asynchronous requests only poll the job state, so the future is dropped once it is done
+        future.add_done_callback(functools.partial(self._forget_future, job_id))
+        self.submitted += 1
+        logging.info(f"Queued adaptation job {job_id} for {graph_file}.")
+        return job, False
+
+    def _forget_future(self, job_id, future):
+        with self._lock:
+            if self._futures.get(job_id) is future:
+                del self._futures[job_id]
+
+    def get(self, job_id):
+        """
+        Return the job as a dict, or None if there is no such job.
+        """
+        conn = self._connect()
+        try:
+            return _load_job(conn, job_id)
+        finally:
+            conn.close()
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: a queued job is cancelled at once, a running one at its next stage.
+        Returns the job, or None if there is no such job. Finished jobs are left as they are.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, cancel_requested = 1 "
+                         "WHERE id = ? AND status = ?", (CANCELLED, time.time(), job_id, QUEUED))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+            job = _load_job(conn, job_id)
+        finally:
+            conn.close()
+
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+        return job
+
+    def wait(self, job_id, timeout=None, poll_interval=0.1):
+        """
+        Block until the job has finished and return it, or return it unfinished on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            future = self._futures.get(job_id)
+            if future is not None and not future.done():
+                # Wakes up as soon as a job run from this process ends
+                try:
+                    future.exception(timeout=poll_interval)
+                except Exception:
+                    pass
+            else:
+                time.sleep(poll_interval)
+
+    def stats(self, max_age=0):
+        """
+        Job counts per status and the submission counters of this process. Counts at
+        most `max_age` seconds old are reused instead of querying the database again.
+        """
+        now = time.monotonic()
+        counted = self._counts
+        if counted is None or now - counted[0] >= max_age:
+            conn = self._connect()
+            try:
+                counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            finally:
+                conn.close()
+            counted = self._counts = (now, counts)
+        return {"jobs": dict(counted[1]), "submitted": self.submitted, "coalesced": self.coalesced}
+
+    def shutdown(self, wait=True):
+        # The lock is released first, the callbacks of cancelled and finishing futures take it
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures.values())
+        if executor is not None:
+            # Executor.shutdown only cancels queued futures itself from Python 3.9 on
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=wait)
+
+
+# Queue shared by all endpoints of the API process.
+job_queue = JobQueue()
@@ -0,0 +1,281 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "graph_api_"
+
+# Upper bounds in seconds of the latency histogram buckets, from 100 microseconds to 30 seconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0)
+
+# Seconds between two exports of a worker's metrics to the shared metrics directory
+EXPORT_INTERVAL = float(os.environ.get("METRICS_EXPORT_INTERVAL", 1.0))
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: observing a value is a binary search and two additions,
+    cheap enough for every request. counts[i] is the number of values at most
+    buckets[i] and above the previous bound; the last count is for larger values.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """
+        Context manager observing the seconds spent in its with block.
+        """
+        return _Timer(self)
+
+    def merge(self, counts, total):
+        with self._lock:
+            for i, count in enumerate(counts):
+                self.counts[i] += count
+            self.sum += total
+            self.count += sum(counts)
+
+
+class _Timer:
+    # A plain class rather than a contextmanager generator, it is entered on every request stage
+    __slots__ = ("histogram", "start_time")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start_time)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+
+def process_rss_bytes():
+    """
+    Resident set size of this process in bytes, from /proc on Linux or the peak RSS
+    reported by getrusage elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters of one process, keyed by name and labels, plus gauge
+    callbacks evaluated when the metrics are read.
+
+    Rendered in the Prometheus text format (see render). Processes of a worker pool
+    export snapshots to a shared directory (see enable_export), which the process
+    serving /metrics merges with merge_exports.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._counters = {}
+        self._gauge_callbacks = []
+        self._lock = threading.Lock()
+        self._export_dir = None
+        self._last_export = 0.0
+
+    def histogram(self, name, **labels):
+        """
+        The histogram of a name and labels, created on first use. Hot paths keep the
+        returned histogram and observe into it directly, skipping the label lookup.
+        """
+        key = (name, _labels(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def timer(self, name, **labels):
+        """
+        Context manager observing the seconds spent in its with block.
+        """
+        return self.histogram(name, **labels).time()
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_gauges(self, callback):
+        """
+        Register a function returning (name, value, labels) tuples, called every time
+        the metrics are rendered or exported.
+        """
+        self._gauge_callbacks.append(callback)
+
+    def gauges(self):
+        return [gauge for callback in self._gauge_callbacks for gauge in callback()]
+
+    def snapshot(self):
+        """
+        JSON-serializable copy of the histograms, counters and current gauges.
+        """
+        with self._lock:
+            histograms = [[name, list(labels), list(h.counts), h.sum] for (name, labels), h in list(self._histograms.items())]
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+        gauges = [[name, value, sorted(labels.items())] for name, value, labels in self.gauges()]
+        return {"pid": os.getpid(), "buckets": list(self.buckets), "histograms": histograms, "counters": counters,
+                "gauges": gauges}
+
+    def merge(self, snapshot):
+        """
+        Add the histograms and counters of a snapshot to this registry.
+        """
+        with self._lock:
+            for name, labels, counts, total in snapshot["histograms"]:
+                key = (name, tuple(tuple(item) for item in labels))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(snapshot["buckets"])
+                histogram.merge(counts, total)
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(tuple(item) for item in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self, gauges=None):
+        """
+        Render the metrics in the Prometheus text exposition format. `gauges` are
+        (name, value, labels) tuples, the registered gauges by default.
+        """
+        gauges = self.gauges() if gauges is None else gauges
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        typed = set()
+        for (name, labels), histogram in histograms:
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for name, value, labels in sorted(gauges, key=lambda gauge: (gauge[0], sorted(gauge[2].items()))):
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def enable_export(self, directory):
+        """
+        Write snapshots of this process to `directory` (see maybe_export), for the
+        process that serves /metrics to merge.
+        """
+        self._export_dir = directory
+
+    def maybe_export(self, force=False):
+        """
+        Export a snapshot if exporting is enabled and the last one is older than
+        EXPORT_INTERVAL seconds. The file is replaced atomically.
+        """
+        if self._export_dir is None or (not force and time.monotonic() - self._last_export < EXPORT_INTERVAL):
+            return
+        self._last_export = time.monotonic()
+        fd, tmp_path = tempfile.mkstemp(dir=self._export_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, os.path.join(self._export_dir, f"{os.getpid()}.json"))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_exports(directory, registry=None, retired=None):
+    """
+    Merge the snapshots exported to `directory` by live processes into a new
+    registry (on top of the metrics of `registry` when given). Returns the merged
+    registry and the gauges of the snapshots, labelled with the pid of their worker.
+
+    The last snapshot of a process that exited is added to `retired`, when given, and
+    its file removed; `retired` is merged in as well, so that the counters of workers
+    that were replaced never go backwards.
+    """
+    merged = MetricsRegistry(registry.buckets if registry is not None else DEFAULT_BUCKETS)
+    if registry is not None:
+        merged.merge(registry.snapshot())
+    gauges = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not _alive(snapshot["pid"]):
+            if retired is not None:
+                retired.merge(snapshot)
+                os.remove(path)
+            continue
+        merged.merge(snapshot)
+        gauges.extend((name, value, dict(labels, worker=str(snapshot["pid"]))) for name, value, labels in snapshot["gauges"])
+    if retired is not None:
+        merged.merge(retired.snapshot())
+    return merged, gauges
+
+
+# Metrics of the API process.
+metrics = MetricsRegistry()
@@ -0,0 +1,146 @@
+import os
+import tempfile
+import threading
+import time
+import logging
+
+import joblib
+
+logging.basicConfig(level=logging.INFO)
+
+MODEL_PATHS = {
+    "compressed": "src/models/compressed_shortest_path_model.pkl",
+    "adapted": "src/models/adapted_shortest_path_model.pkl",
+    "flat": "src/models/flat_shortest_path_model.pkl",
+}
+
+# Set MODEL_MMAP_MODE=r to memory-map the NumPy arrays of uncompressed pickles, so
+# several worker processes share one copy of them through the page cache.
+# scikit-learn copies tree node arrays into its own buffers when unpickling, so for
+# RandomForest models only arrays held outside the trees stay shared.
+DEFAULT_MMAP_MODE = os.environ.get("MODEL_MMAP_MODE") or None
+
+
+class _LoadedModel:
+    def __init__(self, model, signature, version):
+        self.model = model
+        self.signature = signature
+        self.version = version
+
+
+class ModelManager:
+    """
+    Keeps the serving models in memory and swaps them atomically.
+
+    Models are loaded lazily on first use (or eagerly with `preload`) and reloaded
+    when their file on disk changes. A swap only replaces the reference held by the
+    manager, so requests that already obtained a model keep using that version
+    until they finish. Models returned by `get` are shared and must not be refit
+    in place; publish a new model with `publish` instead.
+
+    With `mmap_mode` set, only NumPy arrays stored directly on the model are
+    memory-mapped. The node arrays of scikit-learn trees are copied into each
+    tree when it is unpickled, so every process keeps its own copy of them.
+    """
+
+    def __init__(self, paths=None, mmap_mode=DEFAULT_MMAP_MODE):
+        self.paths = dict(MODEL_PATHS if paths is None else paths)
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.paths}
+        self.loads = 0
+        self.load_time = 0.0
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def get(self, name):
+        """
+        Return the current version of the model `name`.
+        Raises FileNotFoundError if the model has never been saved.
+        """
+        path = self.paths[name]
+        signature = self._signature(path)
+
+        loaded = self._models.get(name)
+        if loaded is not None and loaded.signature == signature:
+            return loaded.model
+
+        with self._load_locks[name]:
+            loaded = self._models.get(name)
+            if loaded is not None and loaded.signature == signature:
+                return loaded.model
+
+            start_time = time.perf_counter()
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            duration = time.perf_counter() - start_time
+
+            self._swap(name, model, signature)
+            with self._lock:
+                self.loads += 1
+                self.load_time += duration
+
+        logging.info("Loaded model %s from %s in %.3f seconds.", name, path, duration)
+        return model
+
+    def _swap(self, name, model, signature):
+        with self._lock:
+            previous = self._models.get(name)
+            version = previous.version + 1 if previous is not None else 1
+            # A single reference assignment, so readers see either the old or the new model.
+            self._models[name] = _LoadedModel(model, signature, version)
+
+    def publish(self, name, model):
+        """
+        Save `model` as the new version of `name` and make it current.
+        The file is written next to its final location and renamed over it, so other
+        processes never read a partially written model.
+        """
+        path = self.paths[name]
+        directory = os.path.dirname(os.path.abspath(path))
+
+        with self._load_locks[name]:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            os.close(fd)
+            try:
+                joblib.dump(model, tmp_path)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            self._swap(name, model, self._signature(path))
+
+        logging.info("Published new version of model %s to %s.", name, path)
+
+    def preload(self, names=None):
+        """
+        Load the given models (all known models by default) ahead of the first request.
+        Models that have not been saved yet are skipped.
+        """
+        for name in self.paths if names is None else names:
+            try:
+                self.get(name)
+            except FileNotFoundError:
+                logging.warning("Model %s not found at %s, skipping preload.", name, self.paths[name])
+
+    def version(self, name):
+        """
+        Return the in-memory version counter of `name`, or 0 if it is not loaded.
+        """
+        loaded = self._models.get(name)
+        return loaded.version if loaded is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": {name: loaded.version for name, loaded in self._models.items()},
+                "loads": self.loads,
+                "load_time": self.load_time,
+            }
+
+
+# Manager shared by all endpoints of the API process.
+model_manager = ModelManager()
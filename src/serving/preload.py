@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+# JSON manifest of the graphs and models to warm before the server reports ready, see
+# load_preload_manifest; without one every model found on disk is loaded
+PRELOAD_MANIFEST = os.environ.get("SERVING_PRELOAD_MANIFEST", "")
+
+# Derived data of a graph that can be warmed: the CSR form /dijkstra searches on, the
+# landmark index of the landmarks prediction mode and the node features of the serving model
+PRELOAD_DERIVED = ("csr", "landmarks", "node_features")
+
+
+def load_preload_manifest(path=PRELOAD_MANIFEST):
+    """
+    Read a preload manifest, a JSON object such as
+
+        {"models": ["flat"],
+         "graphs": ["a.gbin", {"path": "b.edgelist", "format": "edgelist", "derived": ["csr", "node_features"]}]}
+
+    Graphs given as a plain path get the CSR form derived, like SERVING_PRELOAD_GRAPHS.
+    Without "models" (or without a manifest) every model found on disk is loaded; named
+    models must be known to the model manager, or ValueError is raised.
+    Returns {"models": list or None, "graphs": [{"path", "format", "derived"}]}.
+    """
+    from src.serving.graph_registry import graph_format
+    from src.serving.model_manager import model_manager
+
+    if not path:
+        return {"models": None, "graphs": []}
+    with open(path) as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict):
+        raise ValueError(f"Preload manifest {path} must be a JSON object.")
+
+    models = manifest.get("models")
+    if models is not None:
+        if not isinstance(models, list):
+            raise ValueError(f"Models of preload manifest {path} must be a list.")
+        unknown = set(models) - set(model_manager.paths)
+        if unknown:
+            raise ValueError(f"Unknown models {sorted(unknown)} in preload manifest {path}, "
+                             f"expected some of {list(model_manager.paths)}.")
+
+    graphs = []
+    for graph in manifest.get("graphs", []):
+        if isinstance(graph, str):
+            graph = {"path": graph}
+        derived = list(graph.get("derived", ["csr"]))
+        unknown = set(derived) - set(PRELOAD_DERIVED)
+        if unknown:
+            raise ValueError(f"Unknown derived data {sorted(unknown)} for {graph['path']}, "
+                             f"expected some of {list(PRELOAD_DERIVED)}.")
+        graphs.append({"path": graph["path"], "format": graph.get("format") or graph_format(graph["path"]),
+                       "derived": derived})
+    return {"models": models, "graphs": graphs}
+
+
+class Readiness:
+    """
+    Tracks the warm start of a serving process for its readiness probe: "cold" until
+    the warm-up is started, then "warming", and "ready" (or "failed") once it returned.
+
+    The warm-up runs once, in a background thread, so the server can answer the probe
+    with 503 while graphs and models are still loading.
+    """
+
+    def __init__(self):
+        self.state = "cold"
+        self.seconds = None
+        self.timings = {}
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def start(self, warm):
+        """
+        Run `warm`, which returns the seconds spent per warmed item, in a background
+        thread unless it was already started.
+        """
+        with self._lock:
+            if self.state != "cold":
+                return
+            self.state = "warming"
+        threading.Thread(target=self._run, args=(warm,), name="warm-start", daemon=True).start()
+
+    def _run(self, warm):
+        start_time = time.perf_counter()
+        try:
+            timings = warm()
+        except Exception as e:
+            logging.exception("Warm start failed.")
+            self.error, self.state = str(e), "failed"
+            return
+        self.timings, self.seconds = timings, time.perf_counter() - start_time
+        self.state = "ready"
+        logging.info("Warm start finished in %.2f seconds.", self.seconds)
+
+    def status(self):
+        return {"ready": self.ready, "state": self.state, "seconds": self.seconds, "timings": self.timings,
+                "error": self.error}
+
+
+# Warm start of the API process.
+readiness = Readiness()
@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+
+logging.basicConfig(level=logging.INFO)
+
+# Requests slower than this many milliseconds get their profile written; 0 disables profiling
+PROFILE_SLOW_REQUEST_MS = float(os.environ.get("PROFILE_SLOW_REQUEST_MS", 0))
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "data/profiles")
+
+# Milliseconds between two stack samples
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of one thread: a background thread records the stack of
+    the profiled thread every `interval` seconds, so the profiled code runs at full
+    speed between samples (unlike cProfile, which traces every call).
+
+    Stacks are counted in the collapsed format of flame graph tools, one
+    "outer;...;inner count" line per distinct stack (see folded), which
+    flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, name, directory=PROFILE_DIR):
+        """
+        Write the collapsed stacks to `directory`/<time>-<name>.folded and return the path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}.{int(time.time() * 1000) % 1000:03d}"
+        path = os.path.join(directory, f"{stamp}-{os.getpid()}-{safe_name}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
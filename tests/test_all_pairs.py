@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from src.algorithms.all_pairs import AllPairsDistances, all_pairs_shortest_paths, blocked_floyd_warshall
+from src.algorithms.classical_algorithms import floyd_warshall_shortest_paths
+from src.algorithms.csr_graph import CSRGraph
+
+
+class AllPairsTestCase(unittest.TestCase):
+    def setUp(self):
+        # Directed with an unreachable node, so every kind of entry is covered
+        self.G = nx.gnm_random_graph(40, 160, seed=4, directed=True)
+        for u, v in self.G.edges():
+            self.G[u][v]['weight'] = 1 + (u * v) % 6
+        self.G.add_node(40)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _assert_matches(self, all_pairs, weight):
+        expected = dict(nx.all_pairs_dijkstra_path_length(self.G, weight=weight or (lambda u, v, d: 1)))
+        for source in self.G:
+            for target in self.G:
+                self.assertEqual(all_pairs.distance(source, target), expected[source].get(target, float('inf')))
+
+    def test_methods_match_networkx(self):
+        for method in ("floyd-warshall", "sweep"):
+            for weight in (None, 'weight'):
+                with self.subTest(method=method, weight=weight):
+                    # Small tiles so the blocked phases are all exercised
+                    self._assert_matches(all_pairs_shortest_paths(self.G, weight, method, block_size=7), weight)
+
+    def test_compact_dtypes(self):
+        self.assertEqual(all_pairs_shortest_paths(self.G).distances.dtype, np.uint16)
+        self.assertEqual(all_pairs_shortest_paths(self.G, weight='weight').distances.dtype, np.float32)
+
+    def test_memory_mapped_rows(self):
+        path = os.path.join(self.tmp_dir, 'apsp.npy')
+        all_pairs_shortest_paths(self.G, weight='weight', path=path, n_jobs=2)
+
+        opened = AllPairsDistances.open(path)
+        self.assertIsInstance(opened.distances, np.memmap)
+        self._assert_matches(opened, 'weight')
+
+        # Floyd-Warshall runs on memory-mapped files as well, its scratch file is removed
+        for weight in (None, 'weight'):
+            all_pairs_shortest_paths(self.G, weight=weight, method='floyd-warshall', path=path, block_size=7)
+            self._assert_matches(AllPairsDistances.open(path), weight)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ['apsp.npy', 'apsp.npy.json'])
+
+    def test_path_reconstruction(self):
+        csr = CSRGraph.from_networkx(self.G)
+        all_pairs = all_pairs_shortest_paths(csr, weight='weight')
+        for target in range(1, 40):
+            path = all_pairs.path(csr, 0, target)
+            if path:
+                self.assertEqual(nx.path_weight(self.G, path, 'weight'), all_pairs.distance(0, target))
+        self.assertEqual(all_pairs.path(csr, 0, 40), [])
+
+    def test_negative_cycle(self):
+        D = np.array([[0, 1], [-2, 0]], dtype=np.float32)
+        with self.assertRaises(nx.NetworkXUnbounded):
+            blocked_floyd_warshall(D)
+
+    def test_path_backtracks_from_dead_ends(self):
+        # The zero-weight cycle t <-> b makes b look like a predecessor of t on a shortest path
+        G = nx.DiGraph()
+        G.add_nodes_from(['s', 'b', 'a', 't'])
+        G.add_weighted_edges_from([('s', 'a', 1), ('a', 't', 1), ('t', 'b', 0), ('b', 't', 0)])
+        csr = CSRGraph.from_networkx(G, 'weight')
+        self.assertEqual(all_pairs_shortest_paths(csr, weight='weight').path(csr, 's', 't'), ['s', 'a', 't'])
+
+    def test_floyd_warshall_dict(self):
+        G = nx.path_graph(4)
+        G.add_node(9)
+        paths = floyd_warshall_shortest_paths(G)
+        self.assertEqual(paths[0][3], 3)
+        self.assertEqual(paths[0][9], float('inf'))
+
+        G.add_edge(0, 1, weight=-1)
+        with self.assertRaises(nx.NetworkXUnbounded):
+            floyd_warshall_shortest_paths(G)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,56 @@
+import os
+import shutil
+import struct
+import tempfile
 import unittest
 import json
-from src.api import app
+from unittest import mock
+
+import joblib
+import networkx as nx
+from sklearn.ensemble import RandomForestRegressor
+
+from src.api import app, create_app
+from src.models.graph_features import load_or_compute_node_features
+from src.models.training_data import generate_training_data
+from src.serving.distance_cache import DistanceCache
+from src.serving.graph_registry import graph_registry
+from src.serving.model_manager import ModelManager, model_manager
 
 class ApiTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Small stand-ins for the graphs of data/processed and a structural-feature model, in a temporary directory
+        cls.data_dir = tempfile.mkdtemp()
+        graphs = {
+            'facebook_graph.edgelist': nx.connected_watts_strogatz_graph(60, 4, 0.1, seed=1),
+            'sparse_graph.edgelist': nx.Graph([(1, 2), (2, 10), (20, 21)]),
+            'self_loop_graph.edgelist': nx.Graph([(1, 1), (1, 2)]),
+            'large_graph.edgelist': nx.gnm_random_graph(10001, 15000, seed=2),
+            'empty_graph.edgelist': nx.Graph(),
+        }
+        for name, G in graphs.items():
+            nx.write_edgelist(G, os.path.join(cls.data_dir, name), data=False)
+        street = nx.path_graph(range(42421728, 42421788))
+        street.add_edges_from([(42421730, 42421760), (42421740, 42421775)])
+        nx.write_graphml(nx.relabel_nodes(street, str), os.path.join(cls.data_dir, 'manhattan_graph.graphml'))
+
+        G = nx.read_edgelist(os.path.join(cls.data_dir, 'facebook_graph.edgelist'))
+        node_features = load_or_compute_node_features(G, cache_dir=None)
+        data, labels = generate_training_data(G, node_features=node_features)
+        model = RandomForestRegressor(n_estimators=5, max_depth=8, random_state=42).fit(data, labels)
+        model.feature_spec_ = node_features.spec
+        cls.model_paths = {name: os.path.join(cls.data_dir, f'{name}.pkl') for name in ('compressed', 'adapted')}
+        joblib.dump(model, cls.model_paths['compressed'])
+
+    @classmethod
+    def tearDownClass(cls):
+        graph_registry.invalidate()
+        shutil.rmtree(cls.data_dir)
+
     def setUp(self):
-        # Set up the Flask test client for use in test cases
-        self.app = app.test_client()
+        # Set up the Flask test client for use in test cases, serving the models of the temporary directory
+        self.app = create_app(models=ModelManager(paths=self.model_paths), feature_dir=self.data_dir).test_client()
         self.app.testing = True
 
     def test_predict(self):
@@ -14,7 +59,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '1',
                                      'target': '10',
-                                     'graph_file': 'data/processed/social_networks/facebook_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -29,7 +74,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '1',
                                      'target': '10',
-                                     'graph_file': 'data/processed/social_networks/facebook_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -40,21 +85,88 @@ class ApiTestCase(unittest.TestCase):
         self.assertIn('path', data)
         self.assertIsInstance(data['path'], list)
 
+    def test_stats(self):
+        # Repeated /dijkstra requests are answered from the distance cache
+        for _ in range(2):
+            self.app.post('/dijkstra',
+                          data=json.dumps({
+                              'source': '1',
+                              'target': '10',
+                              'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
+                          }),
+                          content_type='application/json')
+
+        response = self.app.get('/stats')
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(data['distance_cache']['hit_ratio'], 0)
+        self.assertIn('graph_registry', data)
+
+    def test_metrics(self):
+        self.app.post('/dijkstra',
+                      data=json.dumps({
+                          'source': '1',
+                          'target': '10',
+                          'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
+                      }),
+                      content_type='application/json')
+
+        response = self.app.get('/metrics')
+        text = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertIn('graph_api_stage_seconds_count{route="dijkstra",stage="compute"}', text)
+        self.assertIn('graph_api_requests_total{route="dijkstra",status="200"}', text)
+        self.assertIn('graph_api_distance_cache_entries', text)
+        self.assertRegex(text, r'graph_api_process_rss_bytes [1-9]')
+
+    def test_metrics_report_the_caches_of_the_app(self):
+        # An app with its own model manager and distance cache reports their sizes, not those of another app
+        self.app.post('/predict',
+                      data=json.dumps({
+                          'source': '1',
+                          'target': '10',
+                          'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
+                      }),
+                      content_type='application/json')
+        other = create_app(models=ModelManager(paths=self.model_paths), distances=DistanceCache(max_bytes=0),
+                           feature_dir=self.data_dir).test_client()
+
+        self.assertIn('graph_api_models_loaded 1', self.app.get('/metrics').get_data(as_text=True))
+        text = other.get('/metrics').get_data(as_text=True)
+        self.assertIn('graph_api_models_loaded 0', text)
+        self.assertIn('graph_api_distance_cache_bytes 0', text)
+
+    def test_slow_request_profile(self):
+        # With a threshold of a microsecond every request is slow and gets its profile written
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        with mock.patch('src.api.PROFILE_SLOW_REQUEST_MS', 0.001), mock.patch('src.api.PROFILE_DIR', profile_dir):
+            self.app.post('/dijkstra',
+                          data=json.dumps({
+                              'source': '1',
+                              'target': '10',
+                              'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
+                          }),
+                          content_type='application/json')
+        profiles = os.listdir(profile_dir)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('-dijkstra.folded'))
+
     def test_adapt(self):
-        # Test the /adapt endpoint for a case where the graph adaptation is attempted
+        # The adaptation starts from the model of the app and publishes next to it, never to src/models
         response = self.app.post('/adapt', 
                                  data=json.dumps({
-                                     'graph_file': 'data/processed/transportation_networks/manhattan_graph.graphml'
+                                     'graph_file': os.path.join(self.data_dir, 'manhattan_graph.graphml'),
+                                     'wait': True
                                  }),
                                  content_type='application/json')
+        self.addCleanup(os.remove, self.model_paths['adapted'])
         
-        # Parse the response data and check for successful adaptation or a failure due to no valid path
         data = json.loads(response.get_data(as_text=True))
-        
-        if 'Adaptation failed' in data['status']:
-            self.assertEqual(data['status'], 'Adaptation failed due to no valid path in the graph.')
-        else:
-            self.assertEqual(data['status'], 'Model adapted and saved.')
+        self.assertEqual(data['status'], 'Model adapted and saved.')
+        self.assertTrue(os.path.exists(self.model_paths['adapted']))
+        self.assertNotEqual(model_manager.paths['adapted'], self.model_paths['adapted'])
 
     def test_evaluate(self):
         # Test the /evaluate endpoint for evaluating the adapted model on a new task
@@ -62,7 +174,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '42421728',
                                      'target': '42421775',
-                                     'graph_file': 'data/processed/transportation_networks/manhattan_graph.graphml'
+                                     'graph_file': os.path.join(self.data_dir, 'manhattan_graph.graphml')
                                  }),
                                  content_type='application/json')
         
@@ -82,7 +194,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': 1,  # Should be a string
                                      'target': '10',
-                                     'graph_file': 'data/processed/social_networks/facebook_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'facebook_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -96,7 +208,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '1',
                                      'target': '10',
-                                     'graph_file': 'data/processed/social_networks/empty_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'empty_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -110,7 +222,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '1',
                                      'target': '10',
-                                     'graph_file': 'data/processed/social_networks/sparse_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'sparse_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -126,7 +238,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '1',
                                      'target': '1',  # Self-loop case
-                                     'graph_file': 'data/processed/social_networks/self_loop_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'self_loop_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -142,7 +254,7 @@ class ApiTestCase(unittest.TestCase):
                                  data=json.dumps({
                                      'source': '1',
                                      'target': '10000',  # Assuming the graph is large
-                                     'graph_file': 'data/processed/social_networks/large_graph.edgelist'
+                                     'graph_file': os.path.join(self.data_dir, 'large_graph.edgelist')
                                  }),
                                  content_type='application/json')
         
@@ -151,5 +263,122 @@ class ApiTestCase(unittest.TestCase):
         self.assertIn('predicted_length', data)
         self.assertIsInstance(data['predicted_length'], int)
 
+class BatchPredictTestCase(unittest.TestCase):
+    def setUp(self):
+        # Serve a small graph and model from a temporary directory
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.tmp_dir, 'graph.edgelist')
+        nx.write_edgelist(nx.path_graph(10), self.graph_file)
+
+        model = RandomForestRegressor(n_estimators=5, random_state=42)
+        model.fit([[s, t] for s in range(10) for t in range(10)], [abs(s - t) for s in range(10) for t in range(10)])
+        model_path = os.path.join(self.tmp_dir, 'model.pkl')
+        joblib.dump(model, model_path)
+
+        self.saved_paths = dict(model_manager.paths)
+        model_manager.paths['compressed'] = model_path
+
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def tearDown(self):
+        model_manager.paths.update(self.saved_paths)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_predict_batch_json(self):
+        # Results come back in input order, with per-pair errors for unknown nodes
+        response = self.app.post('/predict/batch',
+                                 data=json.dumps({
+                                     'pairs': [['1', '5'], {'source': '2', 'target': '3'}, ['1', '99'], ['4']],
+                                     'graph_file': self.graph_file
+                                 }),
+                                 content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.get_data(as_text=True))['results']
+        self.assertEqual(len(results), 4)
+        self.assertIsInstance(results[0]['predicted_length'], int)
+        self.assertEqual(results[1]['source'], '2')
+        self.assertIn('predicted_length', results[1])
+        self.assertEqual(results[2]['error'], 'Node 99 not found in graph.')
+        self.assertIn('error', results[3])
+
+    def test_predict_batch_ndjson(self):
+        # NDJSON requests are answered with one JSON line per pair
+        body = '\n'.join(json.dumps(pair) for pair in [['1', '5'], ['6', '7']])
+        response = self.app.post('/predict/batch?graph_file=' + self.graph_file,
+                                 data=body,
+                                 content_type='application/x-ndjson')
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['target'] for line in lines], ['5', '7'])
+
+    def test_predict_batch_binary(self):
+        # Binary bodies carry int64 node id pairs
+        body = struct.pack('<4q', 1, 5, 6, 7)
+        response = self.app.post('/predict/batch?graph_file=' + self.graph_file,
+                                 data=body,
+                                 content_type='application/octet-stream')
+
+        results = json.loads(response.get_data(as_text=True))['results']
+        self.assertEqual([result['source'] for result in results], ['1', '6'])
+        self.assertTrue(all('predicted_length' in result for result in results))
+
+    def test_predict_with_landmarks(self):
+        # The landmark mode answers from the index; on a path graph the bound is exact
+        response = self.app.post('/predict',
+                                 data=json.dumps({
+                                     'source': '1',
+                                     'target': '5',
+                                     'graph_file': self.graph_file,
+                                     'mode': 'landmarks'
+                                 }),
+                                 content_type='application/json')
+
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(data['predicted_length'], 4)
+        self.assertLessEqual(data['lower_bound'], 4)
+
+    def test_dijkstra_algorithms(self):
+        # Every strategy agrees on the path graph and reports the nodes it settled
+        for algorithm in ('dijkstra', 'bidirectional-dijkstra', 'bidirectional-bfs', 'astar'):
+            response = self.app.post('/dijkstra',
+                                     data=json.dumps({'source': '1', 'target': '5', 'graph_file': self.graph_file,
+                                                      'algorithm': algorithm}),
+                                     content_type='application/json')
+            data = json.loads(response.get_data(as_text=True))
+            self.assertEqual(data['length'], 4)
+            self.assertEqual(data['path'], ['1', '2', '3', '4', '5'])
+            self.assertIsInstance(data['settled'], int)
+
+        response = self.app.post('/dijkstra',
+                                 data=json.dumps({'source': '1', 'target': '5', 'graph_file': self.graph_file,
+                                                  'algorithm': 'astar', 'heuristic': 'coordinates'}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_structural_model(self):
+        # A model trained on structural features is fed the pair features of the served graph
+        node_features = load_or_compute_node_features(nx.path_graph(10), cache_dir=None)
+        pairs = [(s, t) for s in range(10) for t in range(10)]
+        model = RandomForestRegressor(n_estimators=5, random_state=42)
+        model.fit(node_features.pair_features(*zip(*pairs)), [abs(s - t) for s, t in pairs])
+        model.feature_spec_ = node_features.spec
+        joblib.dump(model, model_manager.paths['compressed'])
+
+        client = create_app(feature_dir=self.tmp_dir).test_client()
+        response = client.post('/predict',
+                               data=json.dumps({'source': '1', 'target': '5', 'graph_file': self.graph_file}),
+                               content_type='application/json')
+        self.assertEqual(json.loads(response.get_data(as_text=True))['predicted_length'], 4)
+
+        response = client.post('/predict/batch',
+                               data=json.dumps({'pairs': [['0', '9'], ['1', '99']], 'graph_file': self.graph_file}),
+                               content_type='application/json')
+        results = json.loads(response.get_data(as_text=True))['results']
+        self.assertEqual(results[0]['predicted_length'], 9)
+        self.assertEqual(results[1]['error'], 'Node 99 not found in graph.')
+
 if __name__ == '__main__':
     unittest.main()
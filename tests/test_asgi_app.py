@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from src.api import app
+from src.serving.asgi_app import ServingApp, _shutdown_executor, parse_preload_graphs
+
+
+async def call(serving_app, method, path, body=b"", headers=()):
+    """
+    Send one HTTP request through the ASGI app and return (status, headers, body).
+    """
+    received = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        received.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    await serving_app(scope, receive, send)
+    start, response = received
+    return start["status"], dict(start["headers"]), response["body"]
+
+
+class ServingAppTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.test_dir, "graph.edgelist")
+        with open(self.graph_file, "w") as f:
+            f.write("1 2\n2 3\n3 4\n1 5\n")
+        self.request = json.dumps({"source": "1", "target": "4", "graph_file": self.graph_file}).encode()
+        self.headers = [("Content-Type", "application/json")]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def run_with_app(self, serving_app, scenario):
+        async def run():
+            await serving_app.startup()
+            try:
+                return await scenario()
+            finally:
+                await serving_app.shutdown()
+        return asyncio.run(run())
+
+    def test_dijkstra_matches_flask(self):
+        serving_app = ServingApp(workers=1, max_queued=1, preload_graphs=[(self.graph_file, "edgelist")])
+        status, headers, body = self.run_with_app(
+            serving_app, lambda: call(serving_app, "POST", "/dijkstra", self.request, self.headers))
+
+        expected = app.test_client().post("/dijkstra", data=self.request, content_type="application/json")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"content-type"], b"application/json")
+        self.assertEqual(json.loads(body), expected.get_json())
+        self.assertEqual(serving_app.in_flight, 0)
+
+    def test_ready(self):
+        manifest_path = os.path.join(self.test_dir, "preload.json")
+        with open(manifest_path, "w") as f:
+            json.dump({"models": [], "graphs": [self.graph_file]}, f)
+        serving_app = ServingApp(workers=1, max_queued=1, manifest_path=manifest_path)
+        self.assertEqual(serving_app.manifest["graphs"][0]["derived"], ["csr"])
+
+        status, _, body = self.run_with_app(serving_app, lambda: call(serving_app, "GET", "/ready"))
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body)["ready"])
+        # Draining servers are taken out of rotation
+        status, _, _ = asyncio.run(call(serving_app, "GET", "/ready"))
+        self.assertEqual(status, 503)
+
+    def test_metrics(self):
+        serving_app = ServingApp(workers=1, max_queued=1)
+
+        async def scenario():
+            await call(serving_app, "POST", "/dijkstra", self.request, self.headers)
+            return await call(serving_app, "GET", "/metrics")
+
+        status, headers, body = self.run_with_app(serving_app, scenario)
+        text = body.decode()
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b"content-type"].startswith(b"text/plain"))
+        self.assertIn('graph_api_frontend_request_seconds_count{status="200"} 1', text)
+        self.assertIn("graph_api_frontend_queue_depth 0", text)
+        # Gauges exported by the worker when it started, labelled with its pid
+        self.assertRegex(text, r'graph_api_process_rss_bytes\{worker="\d+"\} \d+')
+        self.assertIn('graph_api_process_rss_bytes{worker="frontend"}', text)
+
+    def test_rejects_when_saturated(self):
+        serving_app = ServingApp(workers=1, max_queued=0)
+
+        async def scenario():
+            serving_app.in_flight = serving_app.capacity
+            try:
+                return await call(serving_app, "POST", "/dijkstra", self.request, self.headers)
+            finally:
+                serving_app.in_flight = 0
+
+        status, headers, body = self.run_with_app(serving_app, scenario)
+        self.assertEqual(status, 429)
+        self.assertEqual(headers[b"retry-after"], b"1")
+        self.assertEqual(serving_app.rejected, 1)
+
+    def test_timeout(self):
+        serving_app = ServingApp(workers=1, max_queued=1, request_timeout=1e-6)
+        status, _, body = self.run_with_app(
+            serving_app, lambda: call(serving_app, "POST", "/dijkstra", self.request, self.headers))
+        self.assertEqual(status, 504)
+        self.assertIn("error", json.loads(body))
+        # Shutdown waited for the worker to let go of the request
+        self.assertEqual(serving_app.in_flight, 0)
+
+    def test_unavailable_after_shutdown(self):
+        serving_app = ServingApp(workers=1, max_queued=1)
+        self.run_with_app(serving_app, lambda: asyncio.sleep(0))
+        status, _, _ = asyncio.run(call(serving_app, "POST", "/dijkstra", self.request, self.headers))
+        self.assertEqual(status, 503)
+
+    def test_shutdown_cancels_queued_requests(self):
+        executor = ProcessPoolExecutor(max_workers=1)
+        running = executor.submit(time.sleep, 0.5)
+        queued = [executor.submit(time.sleep, 0.5) for _ in range(3)]
+        _shutdown_executor(executor, queued, wait=True)
+        self.assertIsNone(running.result())
+        self.assertTrue(all(future.cancelled() for future in queued[1:]))
+
+    def test_parse_preload_graphs(self):
+        self.assertEqual(parse_preload_graphs("a.edgelist, b.graphml:graphml,c:d.txt"),
+                         [("a.edgelist", "edgelist"), ("b.graphml", "graphml"), ("c:d.txt", "edgelist")])
+
+
+if __name__ == "__main__":
+    unittest.main()
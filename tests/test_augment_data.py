@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+import networkx as nx
+
+from src.algorithms.csr_graph import CSRGraph
+from src.data_preprocessing.augment_data import (add_noise_to_edges, add_random_edges, augment_graph,
+                                                 iter_augmented_variants, sample_non_edges)
+
+
+class SampleNonEdgesTestCase(unittest.TestCase):
+    def test_pairs_are_new_and_distinct(self):
+        for directed in (False, True):
+            G = nx.gnm_random_graph(200, 1500, seed=1, directed=directed)
+            csr = CSRGraph.from_networkx(G)
+            sources, targets = sample_non_edges(csr, 500, seed=1)
+
+            pairs = set(zip(sources.tolist(), targets.tolist()))
+            if not directed:
+                pairs = {tuple(sorted(pair)) for pair in pairs}
+            with self.subTest(directed=directed):
+                self.assertEqual(len(pairs), 500)
+                self.assertFalse(any(u == v or G.has_edge(u, v) for u, v in pairs))
+
+    def test_dense_graph(self):
+        # Asking for more pairs than are free returns every free pair
+        G = nx.complete_graph(30)
+        G.remove_edges_from([(0, 1), (2, 3), (4, 5)])
+        sources, targets = sample_non_edges(CSRGraph.from_networkx(G), 10, seed=1)
+        self.assertEqual(sorted(zip(sources.tolist(), targets.tolist())), [(0, 1), (2, 3), (4, 5)])
+
+    def test_seeded(self):
+        csr = CSRGraph.from_networkx(nx.gnm_random_graph(100, 300, seed=2))
+        first = sample_non_edges(csr, 50, seed=7)
+        second = sample_non_edges(csr, 50, seed=7)
+        np.testing.assert_array_equal(first[0], second[0])
+        np.testing.assert_array_equal(first[1], second[1])
+
+
+class AugmentGraphTestCase(unittest.TestCase):
+    def test_augment_graph(self):
+        G = nx.relabel_nodes(nx.gnm_random_graph(50, 100, seed=3), str)
+        for u, v in list(G.edges())[:60]:
+            G[u][v]['weight'] = 10
+        augmented = augment_graph(G.copy(), num_edges=15, noise_level=0.1, seed=3)
+
+        self.assertEqual(augmented.number_of_edges(), 115)
+        weights = [d['weight'] for _, _, d in augmented.edges(data=True) if 'weight' in d]
+        self.assertEqual(len(weights), 60)
+        self.assertTrue(all(9 <= w <= 11 for w in weights))
+        self.assertTrue(nx.utils.graphs_equal(augmented, augment_graph(G.copy(), 15, 0.1, seed=3)))
+
+    def test_in_place(self):
+        G = nx.path_graph(10)
+        self.assertIs(add_random_edges(G, 5, seed=1), G)
+        self.assertEqual(G.number_of_edges(), 14)
+        self.assertIs(add_noise_to_edges(G, 0.1, seed=1), G)
+
+
+class AugmentedVariantsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.G = nx.gnm_random_graph(300, 900, seed=4)
+        for u, v in self.G.edges():
+            self.G[u][v]['weight'] = 1 + (u + v) % 5
+
+    def test_variants(self):
+        variants = list(iter_augmented_variants(self.G, 3, num_edges=20, noise_level=0.2, seed=5, n_jobs=1))
+        self.assertEqual(len({variant.fingerprint() for variant in variants}), 3)
+        for variant in variants:
+            self.assertEqual(variant.number_of_edges(), 920)
+            # Both directions of an undirected edge get the same noise
+            matrix = variant.matrix
+            self.assertEqual((matrix != matrix.T).nnz, 0)
+            self.assertEqual(variant.node_ids, list(self.G.nodes()))
+
+    def test_reproducible_across_jobs(self):
+        serial = [variant.fingerprint() for variant in iter_augmented_variants(self.G, 4, seed=6, n_jobs=1)]
+        parallel = [variant.fingerprint() for variant in iter_augmented_variants(self.G, 4, seed=6, n_jobs=2)]
+        self.assertEqual(serial, parallel)
+
+
+if __name__ == "__main__":
+    unittest.main()
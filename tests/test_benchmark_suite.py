@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.comparison.benchmark_suite import find_regressions, generate_graph, main
+from src.comparison.stats import summarize
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_generated_families(self):
+        for family in ("gnm", "ba", "grid"):
+            self.assertEqual(generate_graph(family, 100).number_of_nodes(), 100)
+
+    def test_summary_percentiles(self):
+        summary = summarize([1000000 * i for i in range(1, 101)])
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["p50_ms"], 50.5)
+        self.assertEqual(summary["max_ms"], 100)
+
+    def test_cli_report_and_regressions(self):
+        output = os.path.join(self.tmp_dir, "report.json")
+        csv_path = os.path.join(self.tmp_dir, "report.csv")
+        argv = ["--families", "gnm", "--sizes", "200", "--pairs", "5", "--warmup", "1", "--repeats", "1",
+                "--benchmarks", "dijkstra,model-batch,endpoint-dijkstra", "--output", output, "--csv", csv_path]
+        self.assertEqual(main(argv), 0)
+
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual([row["benchmark"] for row in report["results"]],
+                         ["dijkstra", "model-batch", "endpoint-dijkstra"])
+        self.assertEqual(report["results"][0]["count"], 5)
+        self.assertGreater(report["results"][0]["peak_rss_mb"], 0)
+        with open(csv_path) as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+        # A baseline twice as fast is reported as a regression
+        baseline = {"results": [dict(row, p50_ms=row["p50_ms"] / 2) for row in report["results"]]}
+        regressions = find_regressions(report["results"], baseline)
+        self.assertEqual(len(regressions), 3)
+        self.assertAlmostEqual(regressions[0]["ratio"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import networkx as nx
+
+from src.algorithms.binary_graph import (HEADER_BYTES, convert_graph_file, main, read_binary_graph,
+                                         verify_binary_graph, write_binary_graph)
+from src.algorithms.csr_graph import CSRGraph, csr_dijkstra
+from src.api import app
+from src.serving.distance_cache import distance_cache
+from src.serving.graph_registry import GraphRegistry, graph_registry
+
+
+class BinaryGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.G = nx.relabel_nodes(nx.gnm_random_graph(300, 900, seed=1), lambda node: f"n{node}")
+        for u, v in self.G.edges():
+            self.G[u][v]['weight'] = 1 + len(u + v) % 4
+        self.path = os.path.join(self.tmp_dir, 'graph.gbin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        csr = CSRGraph.from_networkx(self.G)
+        write_binary_graph(csr, self.path)
+        loaded = read_binary_graph(self.path, verify=True)
+
+        self.assertIsInstance(loaded.indices, np.memmap)
+        self.assertEqual(list(loaded.node_ids), csr.node_ids)
+        self.assertEqual(loaded.index['n42'], csr.index['n42'])
+        self.assertNotIn('n300', loaded.index)
+        self.assertNotIn(42, loaded.index)
+        self.assertEqual(loaded.fingerprint(), csr.fingerprint())
+        self.assertEqual(loaded.number_of_edges(), self.G.number_of_edges())
+        for target in ('n7', 'n150', 'n299'):
+            self.assertEqual(csr_dijkstra(loaded, 'n0', target), csr_dijkstra(csr, 'n0', target))
+
+    def test_integer_ids_and_directed(self):
+        G = nx.gnm_random_graph(100, 400, seed=2, directed=True)
+        write_binary_graph(CSRGraph.from_networkx(G), self.path)
+        loaded = read_binary_graph(self.path)
+
+        self.assertTrue(loaded.directed)
+        self.assertEqual(loaded.node_ids[-1], 99)
+        self.assertEqual(loaded.index[np.int64(17)], 17)
+        self.assertNotIn('17', loaded.index)
+        self.assertEqual(loaded.has_edge(*next(iter(G.edges()))), True)
+
+    def test_corrupt_files(self):
+        write_binary_graph(CSRGraph.from_networkx(self.G), self.path)
+        with open(self.path, 'r+b') as f:
+            f.seek(HEADER_BYTES + 10)
+            byte = f.read(1)
+            f.seek(HEADER_BYTES + 10)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        with self.assertRaises(ValueError):
+            verify_binary_graph(self.path)
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_BYTES + 100)
+        with self.assertRaises(ValueError):
+            read_binary_graph(self.path)
+
+        other = os.path.join(self.tmp_dir, 'graph.edgelist')
+        nx.write_edgelist(self.G, other)
+        with self.assertRaises(ValueError):
+            read_binary_graph(other)
+
+    def test_unsupported_node_ids(self):
+        with self.assertRaises(ValueError):
+            write_binary_graph(CSRGraph.from_networkx(nx.grid_2d_graph(3, 3)), self.path)
+
+    def test_convert(self):
+        edgelist = os.path.join(self.tmp_dir, 'graph.edgelist')
+        nx.write_edgelist(self.G, edgelist)
+        main([edgelist])
+        loaded = read_binary_graph(self.path)
+        self.assertEqual(loaded.fingerprint(), CSRGraph.from_networkx(nx.read_edgelist(edgelist)).fingerprint())
+        self.assertEqual(convert_graph_file(edgelist, os.path.join(self.tmp_dir, 'copy.gbin')),
+                         os.path.join(self.tmp_dir, 'copy.gbin'))
+
+
+class BinaryGraphServingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        edgelist = os.path.join(self.tmp_dir, 'graph.edgelist')
+        nx.write_edgelist(nx.path_graph(30), edgelist, data=False)
+        self.graph_file = convert_graph_file(edgelist)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        graph_registry.invalidate(self.graph_file)
+        distance_cache.invalidate(os.path.abspath(self.graph_file))
+        shutil.rmtree(self.tmp_dir)
+
+    def post(self, endpoint, payload):
+        return self.client.post(endpoint, data=json.dumps(dict(payload, graph_file=self.graph_file)),
+                                content_type='application/json')
+
+    def test_registry_counts_mapped_graph_as_free(self):
+        registry = GraphRegistry()
+        G = registry.get(self.graph_file, fmt='gbin')
+        self.assertIsInstance(G, CSRGraph)
+        self.assertEqual(registry.stats()['bytes'], 0)
+
+    def test_endpoints(self):
+        for algorithm in ('dijkstra', 'bidirectional-dijkstra'):
+            response = self.post('/dijkstra', {'source': '0', 'target': '29', 'algorithm': algorithm})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['length'], 29)
+
+        response = self.post('/predict', {'source': '0', 'target': '29', 'mode': 'landmarks'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['predicted_length'], 29)
+
+        response = self.post('/dijkstra', {'source': '0', 'target': '29', 'algorithm': 'astar',
+                                           'heuristic': 'coordinates'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_edge_updates(self):
+        response = self.post('/graph/edges', {'add': [['0', '29', 3], ['29', 'new']], 'remove': [['5', '6']],
+                                              'new_nodes': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['edges'], 30)
+        self.assertEqual(response.get_json()['nodes'], 31)
+
+        self.assertEqual(self.post('/dijkstra', {'source': '0', 'target': 'new'}).get_json()['length'], 4)
+        self.assertEqual(self.post('/dijkstra', {'source': '5', 'target': '6'}).get_json()['length'], 29 - 6 + 3 + 5)
+        self.assertEqual(self.post('/graph/edges', {'update': [['5', '6', 1]]}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
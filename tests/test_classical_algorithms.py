@@ -0,0 +1,129 @@
+import random
+import unittest
+
+import networkx as nx
+
+from src.algorithms.classical_algorithms import (bellman_ford_shortest_path, bfs_shortest_path, coordinate_heuristic,
+                                                 dijkstra_shortest_path, point_to_point_search)
+from src.algorithms.csr_graph import CSRGraph
+from src.algorithms.landmarks import LandmarkIndex
+
+
+def _weighted_graph(directed=False, seed=7):
+    G = nx.gnm_random_graph(60, 180, seed=seed, directed=directed)
+    rng = random.Random(seed)
+    for u, v in G.edges():
+        G[u][v]['weight'] = rng.uniform(0.5, 5.0)
+    return G
+
+
+class CSRBackendTestCase(unittest.TestCase):
+    def test_dijkstra_matches_networkx(self):
+        # Both backends agree on lengths, and the CSR path has the reported length
+        for directed in (False, True):
+            G = _weighted_graph(directed)
+            csr = CSRGraph.from_networkx(G)
+            for target in range(1, 60, 7):
+                expected_path, expected_length = dijkstra_shortest_path(G, 0, target)
+                path, length = dijkstra_shortest_path(csr, 0, target)
+                if not expected_path:
+                    self.assertEqual((path, length), ([], float('inf')))
+                    continue
+                self.assertAlmostEqual(length, expected_length)
+                self.assertAlmostEqual(nx.path_weight(G, path, 'weight'), expected_length)
+
+    def test_bellman_ford_matches_networkx(self):
+        G = _weighted_graph(directed=True)
+        for target in range(1, 60, 11):
+            _, expected_length = bellman_ford_shortest_path(G, 0, target)
+            _, length = bellman_ford_shortest_path(G, 0, target, backend="csr")
+            self.assertAlmostEqual(length, expected_length)
+
+    def test_bfs_counts_hops(self):
+        G = nx.path_graph(6)
+        G.add_edge(0, 5, weight=100)
+        path, length = bfs_shortest_path(CSRGraph.from_networkx(G), 0, 5)
+        self.assertEqual((path, length), ([0, 5], 1))
+
+    def test_unweighted_lengths_stay_integers(self):
+        # Unweighted graphs return int lengths, as networkx does
+        csr = CSRGraph.from_networkx(nx.path_graph(['a', 'b', 'c']))
+        path, length = dijkstra_shortest_path(csr, 'a', 'c')
+        self.assertEqual(path, ['a', 'b', 'c'])
+        self.assertIsInstance(length, int)
+
+    def test_no_path_and_missing_node(self):
+        G = nx.Graph([(0, 1), (2, 3)])
+        csr = CSRGraph.from_networkx(G)
+        self.assertEqual(dijkstra_shortest_path(csr, 0, 3), ([], float('inf')))
+        self.assertEqual(bfs_shortest_path(csr, 0, 3), ([], float('inf')))
+        with self.assertRaises(nx.NodeNotFound):
+            dijkstra_shortest_path(csr, 0, 42)
+
+    def test_negative_cycle(self):
+        G = nx.DiGraph()
+        G.add_weighted_edges_from([(0, 1, 1), (1, 2, -3), (2, 0, 1)])
+        with self.assertRaises(nx.NetworkXUnbounded):
+            bellman_ford_shortest_path(G, 0, 2, backend="csr")
+
+    def test_graph_accessors(self):
+        G = nx.Graph([(0, 1), (1, 1), (1, 2)])
+        csr = CSRGraph.from_networkx(G)
+        self.assertEqual(csr.number_of_edges(), 3)
+        self.assertTrue(csr.has_edge(1, 1))
+        self.assertFalse(csr.has_edge(0, 2))
+        self.assertIn(2, csr)
+
+
+
+class PointToPointTestCase(unittest.TestCase):
+    def test_strategies_agree(self):
+        # Every strategy finds a shortest path; the goal-directed ones settle fewer nodes
+        for directed in (False, True):
+            G = _weighted_graph(directed)
+            G.add_node(60)
+            csr = CSRGraph.from_networkx(G)
+            index = LandmarkIndex.build(csr, num_landmarks=4, weight='weight')
+            for target in range(0, 61, 6):
+                _, expected_length, full_settled = point_to_point_search(csr, 0, target)
+                for algorithm in ("bidirectional-dijkstra", "astar"):
+                    path, length, settled = point_to_point_search(csr, 0, target, algorithm, index)
+                    self.assertAlmostEqual(length, expected_length)
+                    self.assertLessEqual(settled, full_settled + 1)
+                    if path:
+                        self.assertAlmostEqual(nx.path_weight(G, path, 'weight'), expected_length)
+
+                path, hops, _ = point_to_point_search(csr, 0, target, "bidirectional-bfs")
+                try:
+                    self.assertEqual(hops, nx.shortest_path_length(G, 0, target))
+                    self.assertEqual(len(path) - 1, hops)
+                except nx.NetworkXNoPath:
+                    self.assertEqual((path, hops), ([], float('inf')))
+
+    def test_bidirectional_settles_less(self):
+        csr = CSRGraph.from_networkx(nx.grid_2d_graph(30, 30))
+        _, length, full_settled = point_to_point_search(csr, (0, 0), (3, 3))
+        _, bidirectional_length, settled = point_to_point_search(csr, (0, 0), (3, 3), "bidirectional-dijkstra")
+        self.assertEqual(bidirectional_length, length)
+        self.assertLess(settled, full_settled / 10)
+
+    def test_coordinate_heuristic(self):
+        G = nx.grid_2d_graph(10, 10)
+        for node in G:
+            G.nodes[node]['x'], G.nodes[node]['y'] = node
+        heuristic = coordinate_heuristic(G)
+        path, length, _ = point_to_point_search(G, (0, 0), (9, 9), "astar", heuristic)
+        self.assertEqual(length, 18)
+        self.assertEqual(len(path), 19)
+
+        with self.assertRaises(ValueError):
+            coordinate_heuristic(nx.path_graph(3))
+
+    def test_same_node(self):
+        csr = CSRGraph.from_networkx(nx.path_graph(3))
+        for algorithm in ("bidirectional-dijkstra", "bidirectional-bfs"):
+            self.assertEqual(point_to_point_search(csr, 1, 1, algorithm)[:2], ([1], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import networkx as nx
+from sklearn.ensemble import RandomForestRegressor
+
+from src.comparison import compare_algorithms as compare_module
+from src.comparison.compare_algorithms import compare_algorithms, compare_algorithms_batch
+from src.models.graph_features import load_or_compute_node_features
+from src.models.training_data import generate_training_data
+
+
+class CompareAlgorithmsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.G = nx.disjoint_union(nx.gnm_random_graph(40, 120, seed=2), nx.path_graph(4))
+        for u, v in self.G.edges():
+            self.G[u][v]['weight'] = 1 + (u + v) % 3
+
+    def test_single_pair(self):
+        results = compare_algorithms(self.G, 0, 10)
+        expected = nx.dijkstra_path_length(self.G, 0, 10)
+        self.assertEqual({result["length"] for result in results.values()}, {expected})
+
+    def test_batch_pairs_on_process_pool(self):
+        # Includes an unreachable pair, which every algorithm must report as such
+        pairs = [(0, 10), (3, 3), (0, 41), (5, 20)]
+        report = compare_algorithms_batch(self.G, pairs=pairs, n_jobs=2)
+
+        self.assertEqual(report["pairs"], 4)
+        self.assertIn("Floyd-Warshall", report["setup_seconds"])
+        for name, result in report["algorithms"].items():
+            self.assertEqual(result["accuracy"], 1.0, name)
+            self.assertEqual(result["count"], 4)
+
+    def test_batch_sampling_and_model(self):
+        node_features = load_or_compute_node_features(self.G, cache_dir=None)
+        data, labels = generate_training_data(self.G, weight='weight', node_features=node_features)
+        model = RandomForestRegressor(n_estimators=5, random_state=42).fit(data, labels)
+        model.feature_spec_ = node_features.spec
+
+        report = compare_algorithms_batch(self.G, sampling={'num_sources': 5, 'pair_budget': 50},
+                                          algorithms=["Dijkstra"], n_jobs=1, model=model)
+        self.assertEqual(set(report["algorithms"]), {"Dijkstra", "Floyd-Warshall", "Model"})
+        self.assertLessEqual(report["pairs"], 50)
+        self.assertLess(report["algorithms"]["Model"]["accuracy"], 1.01)
+        self.assertGreaterEqual(report["algorithms"]["Model"]["mean_abs_error"], 0)
+        # The serial run searches the CSR itself and leaves no shared memory mapped
+        self.assertIsNone(compare_module._worker_csr)
+        self.assertIsNone(compare_module._worker_segments)
+
+
+if __name__ == '__main__':
+    unittest.main()
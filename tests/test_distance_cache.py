@@ -0,0 +1,80 @@
+import unittest
+
+import networkx as nx
+
+from src.algorithms.classical_algorithms import dijkstra_shortest_path
+from src.algorithms.csr_graph import CSRGraph
+from src.serving.distance_cache import DistanceCache
+
+
+class DistanceCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.G = nx.gnm_random_graph(50, 120, seed=3)
+        for u, v in self.G.edges():
+            self.G[u][v]['weight'] = 1 + (u + v) % 5
+        self.csr = CSRGraph.from_networkx(self.G)
+
+    def test_answers_match_dijkstra(self):
+        cache = DistanceCache(hot_source_requests=3)
+        for _ in range(2):
+            for target in range(10):
+                _, expected_length = dijkstra_shortest_path(self.G, 0, target)
+                path, length = cache.shortest_path("graph", self.csr, 0, target)
+                self.assertEqual(length, expected_length)
+                self.assertEqual(path[0], 0)
+                self.assertEqual(path[-1], target)
+
+    def test_hot_source_tree(self):
+        # The third request from a source caches its tree, later targets are lookups
+        cache = DistanceCache(hot_source_requests=3)
+        for target in (1, 2, 3, 4, 5):
+            cache.shortest_path("graph", self.csr, 0, target)
+
+        stats = cache.stats()
+        self.assertEqual(stats["trees"], 1)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["tree_hits"], 2)
+        self.assertEqual(stats["hit_ratio"], 0.4)
+
+    def test_pair_hit(self):
+        cache = DistanceCache(hot_source_requests=10)
+        first = cache.shortest_path("graph", self.csr, 0, 7)
+        self.assertEqual(cache.shortest_path("graph", self.csr, 0, 7), first)
+        self.assertEqual(cache.stats()["pair_hits"], 1)
+
+    def test_byte_budget(self):
+        # Room for about one tree: older entries are evicted least recently used first
+        cache = DistanceCache(max_bytes=50 * 12 + 500, hot_source_requests=1)
+        for source in range(5):
+            cache.shortest_path("graph", self.csr, source, 10)
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], stats["max_bytes"])
+        self.assertEqual(stats["trees"], 1)
+        self.assertEqual(stats["evictions"], 4)
+
+    def test_changed_graph_invalidates(self):
+        cache = DistanceCache(hot_source_requests=1)
+        _, length = cache.shortest_path("graph", self.csr, 0, 1)
+
+        # A direct edge changes the answer, and the old version's entries are dropped
+        self.G.add_edge(0, 1, weight=0)
+        changed = CSRGraph.from_networkx(self.G)
+        path, new_length = cache.shortest_path("graph", changed, 0, 1)
+
+        self.assertEqual(new_length, 0)
+        self.assertEqual(path, [0, 1])
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        self.assertEqual(cache.stats()["trees"], 1)
+
+    def test_unreachable_and_unknown_nodes(self):
+        G = nx.Graph([(0, 1)])
+        G.add_node(2)
+        cache = DistanceCache()
+        self.assertEqual(cache.shortest_path("g", CSRGraph.from_networkx(G), 0, 2), ([], float('inf')))
+        with self.assertRaises(nx.NodeNotFound):
+            cache.shortest_path("g", CSRGraph.from_networkx(G), 0, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import networkx as nx
+from scipy.sparse.csgraph import dijkstra
+
+from src.algorithms.csr_graph import CSRGraph
+from src.algorithms.dynamic_shortest_paths import (DynamicShortestPaths, apply_edge_delta, index_changes,
+                                                   updated_csr)
+from src.api import app, create_app
+from src.serving.distance_cache import DistanceCache, distance_cache
+from src.serving.graph_registry import GraphRegistry, graph_registry
+
+
+def random_delta(G, rng, size=4):
+    edges = list(G.edges())
+    nodes = list(G.nodes())
+    remove = [list(edge) for edge in rng.sample(edges, size)]
+    kept = [edge for edge in edges if list(edge) not in remove]
+    update = [[u, v, rng.randint(1, 9)] for u, v in rng.sample(kept, size)]
+    add = [[rng.choice(nodes), rng.choice(nodes), rng.randint(1, 9)] for _ in range(size)]
+    add.append([rng.choice(nodes), f"new-{rng.random()}", 2])
+    return {"add": add, "remove": remove, "update": update, "new_nodes": True}
+
+
+class DynamicShortestPathsTestCase(unittest.TestCase):
+    def test_repair_matches_recompute(self):
+        # Repaired trees equal the trees of the updated graph computed from scratch
+        rng = random.Random(7)
+        for seed in range(8):
+            G = nx.gnm_random_graph(60, 150, seed=seed, directed=seed % 2 == 1)
+            G = nx.relabel_nodes(G, str)
+            for u, v in G.edges():
+                G[u][v]['weight'] = rng.randint(1, 9)
+            paths = DynamicShortestPaths(G, sources=['0', '1', '2'])
+
+            for _ in range(3):
+                paths.apply(**random_delta(paths.G, rng))
+
+            expected = dijkstra(CSRGraph.from_networkx(paths.G).matrix, indices=[0, 1, 2])
+            with self.subTest(seed=seed):
+                for i, source in enumerate(['0', '1', '2']):
+                    distances, _ = paths.trees[source]
+                    np.testing.assert_array_equal(distances, expected[i])
+                    for target in ('5', '30'):
+                        path = paths.path(source, target)
+                        if path:
+                            length = nx.path_weight(paths.G, path, 'weight')
+                            self.assertEqual(length, paths.distance(source, target))
+
+    def test_large_change_recomputes(self):
+        G = nx.relabel_nodes(nx.grid_2d_graph(30, 30), lambda node: f"{node[0]}-{node[1]}")
+        paths = DynamicShortestPaths(G, sources=['0-0'])
+        result = paths.apply(remove=[['0-0', '0-1'], ['0-0', '1-0']], add=[['0-0', '29-29', 1]])
+
+        self.assertEqual(result['touched_nodes'], G.number_of_nodes())
+        # Every path now leaves through the far corner
+        self.assertEqual(paths.distance('0-0', '0-1'), 1 + 29 + 28)
+
+    def test_arc_changes_match_conversion(self):
+        rng = random.Random(3)
+        G = nx.relabel_nodes(nx.gnm_random_graph(40, 90, seed=3), str)
+        H, changes = apply_edge_delta(G, **random_delta(G, rng))
+        csr = updated_csr(CSRGraph.from_networkx(G), H, changes)
+        expected = CSRGraph.from_networkx(H)
+
+        self.assertEqual(csr.node_ids, expected.node_ids)
+        self.assertEqual((csr.matrix != expected.matrix).nnz, 0)
+        self.assertEqual(csr.number_of_edges(), H.number_of_edges())
+
+    def test_original_graph_is_unchanged(self):
+        G = nx.path_graph(['a', 'b', 'c'])
+        G['a']['b']['weight'] = 5
+        H, changes = apply_edge_delta(G, add=[['a', 'c', 1]], remove=[['b', 'c']], update=[['a', 'b', 2]])
+
+        self.assertEqual(G['a']['b']['weight'], 5)
+        self.assertTrue(G.has_edge('b', 'c'))
+        self.assertFalse(G.has_edge('a', 'c'))
+        self.assertEqual(H['b']['a']['weight'], 2)
+        self.assertEqual(sorted(changes), [('a', 'b', 5, 2), ('a', 'c', float('inf'), 1), ('b', 'a', 5, 2),
+                                           ('b', 'c', 1, float('inf')), ('c', 'a', float('inf'), 1),
+                                           ('c', 'b', 1, float('inf'))])
+
+    def test_invalid_deltas(self):
+        G = nx.path_graph(['a', 'b', 'c'])
+        for delta in ({'remove': [['a', 'c']]}, {'update': [['a', 'c', 1]]}, {'add': [['a', 'c', -1]]},
+                      {'add': [['a']]}, {'update': [['a', 'b', 'heavy']]}, {'add': [['a', 'd']]}):
+            with self.subTest(delta=delta), self.assertRaises(ValueError):
+                apply_edge_delta(G, **delta)
+
+    def test_weights_are_converted_and_new_nodes_requested(self):
+        G = nx.relabel_nodes(nx.path_graph(3), str)
+        H, _ = apply_edge_delta(G, add=[['0', '2', '2']], update=[['0', '1', '0.5']])
+        self.assertEqual(H['0']['2']['weight'], 2.0)
+        self.assertEqual(H['0']['1']['weight'], 0.5)
+
+        # An integer id on a graph of string ids is not taken for a new node
+        with self.assertRaisesRegex(ValueError, "Node 0 not found"):
+            apply_edge_delta(G, add=[[0, '2']])
+        H, _ = apply_edge_delta(G, add=[['0', 'new']], new_nodes=True)
+        self.assertEqual(H.number_of_nodes(), 4)
+
+
+class LiveGraphUpdateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.tmp_dir, 'graph.edgelist')
+        nx.write_edgelist(nx.path_graph(20), self.graph_file, data=False)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        graph_registry.invalidate(self.graph_file)
+        distance_cache.invalidate(os.path.abspath(self.graph_file))
+        shutil.rmtree(self.tmp_dir)
+
+    def post(self, endpoint, payload):
+        return self.client.post(endpoint, data=json.dumps(dict(payload, graph_file=self.graph_file)),
+                                content_type='application/json')
+
+    def test_edge_update_endpoint(self):
+        # Make the tree of node 0 hot, then shortcut the path
+        for target in ('5', '10', '19'):
+            self.post('/dijkstra', {'source': '0', 'target': target})
+        self.assertEqual(self.post('/dijkstra', {'source': '0', 'target': '19'}).get_json()['length'], 19)
+
+        response = self.post('/graph/edges', {'add': [['0', '15', 2]], 'remove': [['18', '19']]})
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result['changed_arcs'], 4)
+        self.assertEqual(result['repaired_trees'], 1)
+        self.assertEqual(result['edges'], 19)
+
+        tree_hits = distance_cache.stats()['tree_hits']
+        answer = self.post('/dijkstra', {'source': '0', 'target': '17'}).get_json()
+        self.assertEqual(answer['length'], 4)
+        self.assertEqual(answer['path'], ['0', '15', '16', '17'])
+        self.assertEqual(distance_cache.stats()['tree_hits'], tree_hits + 1)
+        self.assertEqual(self.post('/dijkstra', {'source': '0', 'target': '19'}).get_json()['length'], float('inf'))
+
+        # The edge list on disk is untouched and a changed file is reloaded
+        self.assertEqual(len(nx.read_edgelist(self.graph_file).edges()), 19)
+        nx.write_edgelist(nx.path_graph(21), self.graph_file, data=False)
+        self.assertEqual(self.post('/dijkstra', {'source': '0', 'target': '20'}).get_json()['length'], 20)
+
+    def test_invalid_update(self):
+        response = self.post('/graph/edges', {'remove': [['0', '5']]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not found', response.get_json()['error'])
+
+        response = self.post('/graph/edges', {'add': [[0, 6]]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(graph_registry.get(self.graph_file).number_of_nodes(), 20)
+
+    def test_update_refused_with_several_workers(self):
+        # A worker of a multi-process front end cannot share its update with the others
+        worker_app = create_app()
+        worker_app.config['GRAPH_UPDATES'] = False
+        response = worker_app.test_client().post('/graph/edges',
+                                                 json={'add': [['0', '6']], 'graph_file': self.graph_file})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.post('/dijkstra', {'source': '0', 'target': '6'}).get_json()['length'], 6)
+
+
+class RegistryReplaceTestCase(unittest.TestCase):
+    def test_replace_keeps_signature(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            graph_file = os.path.join(tmp_dir, 'graph.edgelist')
+            nx.write_edgelist(nx.path_graph(5), graph_file, data=False)
+            registry = GraphRegistry()
+            G = registry.get(graph_file)
+            registry.get_derived(graph_file, 'degrees', lambda G: dict(G.degree()))
+
+            H, _ = apply_edge_delta(G, add=[['0', '4']])
+            registry.replace(graph_file, H)
+            self.assertIs(registry.get(graph_file), H)
+            self.assertEqual(registry.get_derived(graph_file, 'degrees', lambda G: dict(G.degree()))['0'], 2)
+            self.assertEqual(registry.stats()['updates'], 1)
+            self.assertEqual(registry.stats()['misses'], 1)
+            with self.assertRaises(KeyError):
+                registry.replace(os.path.join(tmp_dir, 'other.edgelist'), H)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_cache_repair_requires_current_version(self):
+        G = nx.path_graph(10)
+        csr = CSRGraph.from_networkx(G)
+        H, changes = apply_edge_delta(G, add=[[0, 9]])
+        new_csr = updated_csr(csr, H, changes)
+        cache = DistanceCache(hot_source_requests=1)
+        # Nothing cached for the graph yet
+        self.assertEqual(cache.repair("graph", csr, new_csr, index_changes(new_csr.index, changes)), (0, 0))
+
+        cache.shortest_path("graph", csr, 0, 5)
+        trees, _ = cache.repair("graph", csr, new_csr, index_changes(new_csr.index, changes))
+        self.assertEqual(trees, 1)
+        self.assertEqual(cache.shortest_path("graph", new_csr, 0, 8), ([0, 9, 8], 2))
+        self.assertEqual(cache.stats()['repaired_trees'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from src.algorithms.csr_graph import CSRGraph
+from src.models.graph_features import PAIR_FEATURE_NAMES, NodeFeatures, core_numbers, load_or_compute_node_features
+from src.models.training_data import generate_training_data
+
+
+class GraphFeaturesTestCase(unittest.TestCase):
+    def setUp(self):
+        # Two components, so some pairs are in different components
+        self.G = nx.disjoint_union(nx.barabasi_albert_graph(40, 3, seed=1), nx.path_graph(5))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_core_numbers_match_networkx(self):
+        csr = CSRGraph.from_networkx(self.G)
+        expected = nx.core_number(self.G)
+        cores = core_numbers(csr)
+        self.assertEqual({node: int(cores[csr.index[node]]) for node in self.G}, expected)
+
+    def test_pair_features(self):
+        features = NodeFeatures.compute(self.G)
+        X = features.pair_features([0, 0, 40], [1, 41, 44])
+
+        self.assertEqual(X.shape, (3, len(PAIR_FEATURE_NAMES)))
+        self.assertEqual(X.dtype, np.float32)
+        self.assertEqual(list(X[:, 4]), [1, 0, 1])
+        # The landmark bounds enclose the true hop count
+        self.assertLessEqual(X[2, 5], 4)
+        self.assertGreaterEqual(X[2, 6], 4)
+
+    def test_spectral_column(self):
+        features = NodeFeatures.compute(self.G, {"spectral_dims": 2})
+        self.assertEqual(features.pair_features([0], [1]).shape, (1, len(PAIR_FEATURE_NAMES) + 1))
+
+    def test_cache_roundtrip(self):
+        computed = load_or_compute_node_features(self.G, cache_dir=self.tmp_dir)
+        loaded = load_or_compute_node_features(self.G, cache_dir=self.tmp_dir)
+        pairs = ([0, 3, 41], [5, 40, 42])
+        np.testing.assert_array_equal(computed.pair_features(*pairs), loaded.pair_features(*pairs))
+
+    def test_training_data_with_features(self):
+        features = NodeFeatures.compute(self.G)
+        data, labels = generate_training_data(self.G, node_features=features)
+        ids, id_labels = generate_training_data(self.G)
+
+        self.assertEqual(data.shape, (len(labels), features.num_features))
+        np.testing.assert_array_equal(labels, id_labels)
+
+
+if __name__ == '__main__':
+    unittest.main()
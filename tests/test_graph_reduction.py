@@ -0,0 +1,94 @@
+import unittest
+
+import numpy as np
+import networkx as nx
+
+from src.algorithms.csr_graph import CSRGraph
+from src.algorithms.graph_reduction import compare_reductions, evaluate_reduction, reduce_graph
+from src.models.graph_reduction_and_model_compression import reduce_graph_size
+
+
+def _graph(seed):
+    # A sparse random graph with hanging trees and chains, a cycle, an isolated edge and node
+    G = nx.gnm_random_graph(60, 70, seed=seed)
+    G.add_edges_from([(100, 101), (101, 102), (102, 100), (200, 201)])
+    G.add_node(300)
+    rng = np.random.default_rng(seed)
+    for u, v in G.edges():
+        G[u][v]['weight'] = int(rng.integers(1, 5))
+    return G
+
+
+class GraphReductionTestCase(unittest.TestCase):
+    def assertLifted(self, G, reduction, stretch):
+        lengths = dict(nx.all_pairs_dijkstra_path_length(G))
+        for u in G:
+            for v in G:
+                expected = lengths[u].get(v, float('inf'))
+                lifted = reduction.distance(u, v)
+                if stretch == 1 or expected in (0, float('inf')):
+                    self.assertEqual(lifted, expected, (u, v))
+                else:
+                    self.assertGreaterEqual(lifted, expected, (u, v))
+                    if stretch is not None:
+                        self.assertLessEqual(lifted, stretch * expected, (u, v))
+
+    def test_chains_are_exact(self):
+        for seed in range(4):
+            G = _graph(seed)
+            reduction = reduce_graph(G, "chains")
+            with self.subTest(seed=seed):
+                self.assertTrue(reduction.exact)
+                self.assertLess(reduction.reduced.number_of_nodes(), G.number_of_nodes())
+                self.assertLifted(G, reduction, 1)
+
+    def test_chain_shapes(self):
+        # A path collapses to one node, a cycle to one node, a grid keeps its inner nodes
+        for G in (nx.path_graph(6), nx.cycle_graph(6), nx.star_graph(5)):
+            reduction = reduce_graph(G, "chains")
+            self.assertEqual(reduction.reduced.number_of_nodes(), 1)
+            self.assertLifted(G, reduction, 1)
+        G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(4, 4))
+        self.assertLifted(G, reduce_graph(G, "chains"), 1)
+
+    def test_kcore_upper_bounds(self):
+        G = _graph(1)
+        reduction = reduce_graph(G, "kcore", k=2)
+        self.assertIsNone(reduction.stretch)
+        self.assertTrue(all(G.degree(node) >= 2 for node in reduction.reduced.node_ids))
+        self.assertLifted(G, reduction, None)
+
+    def test_spanner_stretch(self):
+        G = nx.gnm_random_graph(60, 600, seed=2)
+        reduction = reduce_graph(G, "spanner", stretch=3, seed=2)
+        self.assertLess(reduction.reduced.number_of_edges(), G.number_of_edges())
+        self.assertLifted(G, reduction, 3)
+
+    def test_node_ids_and_csr_input(self):
+        G = nx.relabel_nodes(nx.path_graph(5), lambda node: f"n{node}")
+        G.add_edge("n2", "leaf")
+        reduction = reduce_graph(CSRGraph.from_networkx(G), "chains")
+        self.assertEqual(reduction.distance("n0", "leaf"), 3)
+        with self.assertRaises(nx.NodeNotFound):
+            reduction.distance("n0", "missing")
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            reduce_graph(nx.path_graph(4, create_using=nx.DiGraph), "chains")
+        with self.assertRaises(ValueError):
+            reduce_graph(nx.path_graph(4), "first-nodes")
+
+    def test_reports(self):
+        G = _graph(3)
+        report = evaluate_reduction(reduce_graph_size(G, "chains"), num_pairs=30, seed=1)
+        self.assertEqual(report["exact_pairs"], 30)
+        self.assertEqual(report["max_relative_error"], 0.0)
+        for key in ("nodes", "edges", "original_ms", "reduced_ms", "speedup", "build_seconds"):
+            self.assertIn(key, report)
+
+        reports = compare_reductions(G, num_pairs=10, k=2)
+        self.assertEqual(sorted(reports), ["chains", "kcore", "spanner"])
+
+
+if __name__ == "__main__":
+    unittest.main()
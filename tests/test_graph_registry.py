@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from src.serving.graph_registry import GraphRegistry
+
+
+class GraphRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        # Write a small edgelist into a temporary directory for each test
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.tmp_dir, "graph.edgelist")
+        nx.write_edgelist(nx.path_graph(5), self.graph_file)
+        self.registry = GraphRegistry()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_graph_is_loaded_once(self):
+        # Repeated lookups of an unchanged file return the same graph object
+        G1 = self.registry.get(self.graph_file)
+        G2 = self.registry.get(self.graph_file)
+
+        self.assertIs(G1, G2)
+        stats = self.registry.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_changed_file_is_reloaded(self):
+        # Rewriting the file (different size and mtime) triggers a reload
+        G1 = self.registry.get(self.graph_file)
+        nx.write_edgelist(nx.path_graph(8), self.graph_file)
+        stat = os.stat(self.graph_file)
+        os.utime(self.graph_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        G2 = self.registry.get(self.graph_file)
+
+        self.assertIsNot(G1, G2)
+        self.assertEqual(G2.number_of_nodes(), 8)
+        self.assertEqual(self.registry.stats()['reloads'], 1)
+
+    def test_lru_eviction_by_memory_budget(self):
+        # With a budget that fits a single graph, loading a second one evicts the first
+        other_file = os.path.join(self.tmp_dir, "other.edgelist")
+        nx.write_edgelist(nx.path_graph(5), other_file)
+        self.registry.max_bytes = 1
+
+        self.registry.get(self.graph_file)
+        self.registry.get(other_file)
+        self.registry.get(self.graph_file)
+
+        stats = self.registry.stats()
+        self.assertEqual(stats['graphs'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['evictions'], 2)
+
+    def test_missing_file(self):
+        # A missing graph file raises instead of caching anything
+        with self.assertRaises(FileNotFoundError):
+            self.registry.get(os.path.join(self.tmp_dir, "missing.edgelist"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import copy
+import random
+import unittest
+
+import numpy as np
+import networkx as nx
+from sklearn.ensemble import RandomForestRegressor
+
+from src.algorithms.csr_graph import as_csr
+from src.models.adapt_models_for_new_graphs import adapt_model_to_new_graph
+from src.models.incremental_adaptation import (affected_sources, changed_pairs, diff_graphs, graph_snapshot,
+                                               incremental_adapt, record_snapshot, snapshot_csr)
+from src.models.training_data import generate_training_data
+
+
+def changed_graph(G, seed, removals=3, additions=2):
+    rng = random.Random(seed)
+    H = G.copy()
+    H.remove_edges_from(rng.sample(list(H.edges()), removals))
+    nodes = list(H.nodes())
+    for _ in range(additions):
+        H.add_edge(rng.choice(nodes), rng.choice(nodes))
+    return H
+
+
+class AffectedSourcesTestCase(unittest.TestCase):
+    def test_matches_all_sources(self):
+        # Sweeping only the affected sources finds every pair whose distance changed
+        for seed in range(12):
+            G = nx.relabel_nodes(nx.gnm_random_graph(40, 70, seed=seed, directed=seed % 2 == 1), str)
+            H = changed_graph(G, seed)
+            H.add_edge("new", "0")
+            if seed % 3 == 0:
+                H.remove_node("5")
+
+            old, new = snapshot_csr(graph_snapshot(G)), as_csr(H)
+            diff = diff_graphs(old, new)
+            everyone = np.arange(new.number_of_nodes(), dtype=np.int32)
+            expected = changed_pairs(old, new, diff, everyone)
+            actual = changed_pairs(old, new, diff, affected_sources(old, new, diff))
+
+            with self.subTest(seed=seed):
+                self.assertEqual(set(zip(expected[0].tolist(), expected[1].tolist())),
+                                 set(zip(actual[0].tolist(), actual[1].tolist())))
+
+
+class IncrementalAdaptTestCase(unittest.TestCase):
+    def setUp(self):
+        self.G = nx.relabel_nodes(nx.barabasi_albert_graph(120, 2, seed=42), str)
+        model = RandomForestRegressor(n_estimators=8, random_state=42)
+        self.model = record_snapshot(model.fit(*generate_training_data(self.G)), self.G)
+
+    def test_incremental_update(self):
+        H = changed_graph(self.G, seed=1)
+        model, report = incremental_adapt(copy.deepcopy(self.model), H)
+
+        self.assertEqual(report['trees_added'], 2)
+        self.assertEqual(len(model.estimators_), 10)
+        self.assertGreater(report['changed_pairs'], 0)
+        self.assertLessEqual(report['affected_sources'], H.number_of_nodes())
+        self.assertIn('changed', report['mse_after'])
+        self.assertEqual(model.graph_snapshot_['fingerprint'], graph_snapshot(H)['fingerprint'])
+
+    def test_forest_size_is_bounded(self):
+        model = copy.deepcopy(self.model)
+        for seed in range(6):
+            model, _ = incremental_adapt(model, changed_graph(self.G, seed))
+        self.assertEqual(len(model.estimators_), 16)
+
+    def test_unchanged_graph(self):
+        model, report = incremental_adapt(copy.deepcopy(self.model), self.G.copy())
+        self.assertEqual(report['changed_pairs'], 0)
+        self.assertEqual(len(model.estimators_), 8)
+
+    def test_large_change_falls_back_to_full_refit(self):
+        H = nx.relabel_nodes(nx.path_graph(30), str)
+        with self.assertRaises(ValueError):
+            incremental_adapt(copy.deepcopy(self.model), H)
+
+        model = adapt_model_to_new_graph(copy.deepcopy(self.model), H, mode="incremental")
+        self.assertFalse(hasattr(model, 'adaptation_report_'))
+        self.assertEqual(model.graph_snapshot_['node_ids'], list(H.nodes()))
+
+
+if __name__ == "__main__":
+    unittest.main()
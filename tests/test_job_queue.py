@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import joblib
+import networkx as nx
+from sklearn.ensemble import RandomForestRegressor
+
+from src.api import app
+from src.models.incremental_adaptation import record_snapshot
+from src.models.training_data import generate_training_data
+from src.serving.job_queue import JobQueue, connect
+from src.serving.model_manager import model_manager
+
+
+class JobQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        # Adapt a small id-based model to small graphs, all from a temporary directory
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph_files = []
+        for size in (8, 9):
+            graph_file = os.path.join(self.tmp_dir, f'graph_{size}.graphml')
+            nx.write_graphml(nx.path_graph(size), graph_file)
+            self.graph_files.append(graph_file)
+
+        model = RandomForestRegressor(n_estimators=5, random_state=42)
+        model.fit([[s, t] for s in range(8) for t in range(8)], [abs(s - t) for s in range(8) for t in range(8)])
+        self.model_paths = {
+            'compressed': os.path.join(self.tmp_dir, 'compressed.pkl'),
+            'adapted': os.path.join(self.tmp_dir, 'adapted.pkl'),
+        }
+        joblib.dump(model, self.model_paths['compressed'])
+
+        self.saved_paths = dict(model_manager.paths)
+        model_manager.paths.update(self.model_paths)
+        self.queue = JobQueue(db_path=os.path.join(self.tmp_dir, 'jobs.sqlite3'), workers=1)
+
+    def tearDown(self):
+        self.queue.shutdown()
+        model_manager.paths.update(self.saved_paths)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_adapt_job(self):
+        job, coalesced = self.queue.submit_adapt(self.graph_files[0])
+        self.assertFalse(coalesced)
+        self.assertEqual(job['status'], 'queued')
+
+        job = self.queue.wait(job['id'], timeout=60)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['progress'], 1.0)
+        self.assertTrue(os.path.exists(self.model_paths['adapted']))
+        # The model published by the worker is picked up without a restart
+        self.assertEqual(model_manager.get('adapted').n_estimators, 5)
+
+    def test_finished_futures_are_dropped(self):
+        # Asynchronous requests poll the job without waiting on it
+        job, _ = self.queue.submit_adapt(self.graph_files[0])
+        deadline = time.monotonic() + 60
+        while job['id'] in self.queue._futures and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertNotIn(job['id'], self.queue._futures)
+        self.assertEqual(self.queue.get(job['id'])['status'], 'succeeded')
+
+    def test_duplicates_are_coalesced(self):
+        first, _ = self.queue.submit_adapt(self.graph_files[0])
+        second, coalesced = self.queue.submit_adapt(self.graph_files[0])
+        other, other_coalesced = self.queue.submit_adapt(self.graph_files[1])
+
+        self.assertTrue(coalesced)
+        self.assertEqual(second['id'], first['id'])
+        self.assertFalse(other_coalesced)
+        self.assertNotEqual(other['id'], first['id'])
+        for job in (first, other):
+            self.assertEqual(self.queue.wait(job['id'], timeout=60)['status'], 'succeeded')
+
+    def test_cancel_queued_job(self):
+        first, _ = self.queue.submit_adapt(self.graph_files[0])
+        # The only worker is busy with the first job, so the second one is still queued
+        second, _ = self.queue.submit_adapt(self.graph_files[1])
+        job = self.queue.cancel(second['id'])
+
+        self.assertEqual(job['status'], 'cancelled')
+        self.assertEqual(self.queue.wait(first['id'], timeout=60)['status'], 'succeeded')
+        self.assertEqual(self.queue.get(second['id'])['status'], 'cancelled')
+        self.assertIsNone(self.queue.get('unknown'))
+
+    def test_stats_reuse_recent_counts(self):
+        job, _ = self.queue.submit_adapt(self.graph_files[0])
+        self.queue.wait(job['id'], timeout=60)
+        self.assertEqual(self.queue.stats()['jobs'], {'succeeded': 1})
+
+        conn = connect(self.queue.db_path)
+        conn.execute("UPDATE jobs SET status = 'failed' WHERE id = ?", (job['id'],))
+        conn.close()
+        # The /metrics gauges reuse the last counts, other callers always count again
+        self.assertEqual(self.queue.stats(max_age=60)['jobs'], {'succeeded': 1})
+        self.assertEqual(self.queue.stats()['jobs'], {'failed': 1})
+
+    def test_orphaned_job_fails(self):
+        job, _ = self.queue.submit_adapt(self.graph_files[0])
+        self.queue.cancel(job['id'])
+        # Pretend the job was queued by a server process that has exited since
+        process = subprocess.Popen(['true'])
+        process.wait()
+        conn = connect(self.queue.db_path)
+        conn.execute("UPDATE jobs SET status = 'queued', owner_pid = ? WHERE id = ?", (process.pid, job['id']))
+        conn.close()
+
+        # The queue of the restarted server marks it failed when it first opens the database
+        job = JobQueue(db_path=self.queue.db_path).get(job['id'])
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'Interrupted by a server restart.')
+
+    def test_incremental_adapt_job(self):
+        # A model that remembers its training graph is only updated with the changed pairs
+        G = nx.relabel_nodes(nx.path_graph(60), str)
+        model = RandomForestRegressor(n_estimators=4, random_state=42)
+        joblib.dump(record_snapshot(model.fit(*generate_training_data(G)), G), self.model_paths['compressed'])
+        G.add_edge('0', '59')
+        graph_file = os.path.join(self.tmp_dir, 'graph_cycle.graphml')
+        nx.write_graphml(G, graph_file)
+
+        job, _ = self.queue.submit_adapt(graph_file, mode='incremental')
+        job = self.queue.wait(job['id'], timeout=60)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['params']['mode'], 'incremental')
+        self.assertGreater(job['result']['report']['changed_pairs'], 0)
+        self.assertEqual(len(model_manager.get('adapted').estimators_), 5)
+
+    def test_adapt_endpoints(self):
+        client = app.test_client()
+        with mock.patch('src.api.job_queue', self.queue):
+            response = client.post('/adapt', data=json.dumps({'graph_file': self.graph_files[0]}),
+                                   content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            job_id = response.get_json()['job_id']
+            self.assertEqual(response.headers['Location'], f'/jobs/{job_id}')
+
+            self.queue.wait(job_id, timeout=60)
+            response = client.get(f'/jobs/{job_id}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['status'], 'succeeded')
+
+            # A finished job cannot be cancelled
+            response = client.post(f'/jobs/{job_id}/cancel')
+            self.assertEqual(response.status_code, 409)
+
+            response = client.post('/adapt', data=json.dumps({'graph_file': self.graph_files[0], 'mode': 'partial'}),
+                                   content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+            self.assertEqual(client.get('/jobs/unknown').status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from src.algorithms.classical_algorithms import dijkstra_shortest_path
+from src.algorithms.csr_graph import CSRGraph
+from src.algorithms.landmarks import LandmarkIndex, landmark_file, load_or_build_landmarks, main
+
+
+def _weighted(G, seed=3):
+    rng = random.Random(seed)
+    for u, v in G.edges():
+        G[u][v]['weight'] = rng.uniform(1.0, 4.0)
+    return G
+
+
+class LandmarkIndexTestCase(unittest.TestCase):
+    def assertValidBounds(self, G, index, weight=None):
+        lengths = dict(nx.all_pairs_dijkstra_path_length(G, weight=weight or (lambda u, v, d: 1)))
+        for source in list(G)[:15]:
+            for target in G:
+                lower, upper = index.bounds(source, target)
+                exact = lengths[source].get(target, float('inf'))
+                self.assertLessEqual(lower, exact + 1e-9)
+                self.assertGreaterEqual(upper, exact - 1e-6)
+
+    def test_bounds_on_unweighted_graph(self):
+        # Two components, so some pairs are unreachable and must get an infinite lower bound
+        G = nx.disjoint_union(nx.gnm_random_graph(40, 80, seed=1), nx.cycle_graph(6))
+        index = LandmarkIndex.build(G, num_landmarks=4)
+
+        self.assertEqual(index.dist_from.dtype, np.uint16)
+        self.assertValidBounds(G, index)
+        self.assertEqual(index.bounds(0, 45)[0], float('inf'))
+
+    def test_bounds_on_weighted_directed_graph(self):
+        G = _weighted(nx.gnm_random_graph(40, 160, seed=2, directed=True))
+        index = LandmarkIndex.build(G, num_landmarks=5, strategy="random", weight='weight')
+
+        self.assertEqual(index.dist_from.dtype, np.float32)
+        self.assertIsNotNone(index.dist_to)
+        self.assertValidBounds(G, index, weight='weight')
+
+    def test_astar_with_landmarks_matches_dijkstra(self):
+        G = _weighted(nx.gnm_random_graph(60, 200, seed=4))
+        csr = CSRGraph.from_networkx(G)
+        index = LandmarkIndex.build(csr, num_landmarks=4, weight='weight')
+
+        for target in range(1, 60, 6):
+            expected_path, expected_length = dijkstra_shortest_path(csr, 0, target)
+            path, length = dijkstra_shortest_path(csr, 0, target, heuristic=index)
+            self.assertAlmostEqual(length, expected_length)
+            # The networkx backend accepts the same index as its heuristic
+            _, nx_length = dijkstra_shortest_path(G, 0, target, heuristic=index)
+            self.assertAlmostEqual(nx_length, expected_length)
+
+
+class LandmarkPersistenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.tmp_dir, 'graph.edgelist')
+        nx.write_edgelist(nx.gnm_random_graph(30, 60, seed=5), self.graph_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_build_command_and_load(self):
+        main([self.graph_file, '--landmarks', '3'])
+
+        csr = CSRGraph.from_networkx(nx.read_edgelist(self.graph_file))
+        index = LandmarkIndex.load(landmark_file(self.graph_file), csr)
+        self.assertEqual(index.dist_from.shape, (3, 30))
+
+        # An index built for another graph is rejected
+        other = CSRGraph.from_networkx(nx.path_graph(['0', '1']))
+        with self.assertRaises(ValueError):
+            LandmarkIndex.load(landmark_file(self.graph_file), other)
+
+    def test_weighted_index_is_not_loaded_as_hops(self):
+        G = nx.path_graph([str(node) for node in range(6)])
+        nx.set_edge_attributes(G, 10, 'weight')
+        nx.write_edgelist(G, self.graph_file)
+        main([self.graph_file, '--landmarks', '2', '--weight', 'weight'])
+
+        csr = CSRGraph.from_networkx(G)
+        index = LandmarkIndex.load(landmark_file(self.graph_file), csr, weight='weight')
+        self.assertEqual(index.bounds('0', '5')[1], 50)
+        with self.assertRaises(ValueError):
+            LandmarkIndex.load(landmark_file(self.graph_file), csr)
+        # The hop count index is rebuilt instead
+        self.assertEqual(load_or_build_landmarks(self.graph_file, csr).bounds('0', '5')[1], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
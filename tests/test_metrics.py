@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from src.serving.metrics import Histogram, MetricsRegistry, merge_exports, process_rss_bytes
+from src.serving.profiler import SamplingProfiler
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_histogram_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        # Bounds are inclusive, the last count is for values above every bound
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+
+    def test_render(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.observe("request_seconds", 0.05, route="predict")
+        registry.observe("request_seconds", 0.5, route="predict")
+        with registry.timer("request_seconds", route="dijkstra"):
+            pass
+        registry.increment("requests_total", route="predict", status=200)
+        registry.register_gauges(lambda: [("queue_depth", 3, {"status": 'a"b'})])
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines.count("# TYPE graph_api_request_seconds histogram"), 1)
+        self.assertIn('graph_api_request_seconds_bucket{route="predict",le="0.1"} 1', lines)
+        self.assertIn('graph_api_request_seconds_bucket{route="predict",le="1.0"} 2', lines)
+        self.assertIn('graph_api_request_seconds_bucket{route="predict",le="+Inf"} 2', lines)
+        self.assertIn('graph_api_request_seconds_count{route="predict"} 2', lines)
+        self.assertIn('graph_api_request_seconds_count{route="dijkstra"} 1', lines)
+        self.assertIn('graph_api_requests_total{route="predict",status="200"} 1', lines)
+        self.assertIn('graph_api_queue_depth{status="a\\"b"} 3', lines)
+
+    def test_export_and_merge(self):
+        worker = MetricsRegistry()
+        worker.observe("request_seconds", 0.002, route="predict")
+        worker.increment("requests_total", 2, route="predict", status=200)
+        worker.register_gauges(lambda: [("process_rss_bytes", process_rss_bytes(), {})])
+        worker.enable_export(self.tmp_dir)
+        worker.maybe_export()
+        # Snapshots of processes that are gone are ignored
+        with open(os.path.join(self.tmp_dir, "dead.json"), "w") as f:
+            json.dump(dict(worker.snapshot(), pid=2 ** 22 + 1), f)
+
+        front = MetricsRegistry()
+        front.increment("requests_total", route="predict", status=200)
+        merged, gauges = merge_exports(self.tmp_dir, front)
+        text = merged.render(gauges)
+        self.assertIn('graph_api_requests_total{route="predict",status="200"} 3', text)
+        self.assertIn('graph_api_request_seconds_count{route="predict"} 1', text)
+        self.assertEqual([labels for _, _, labels in gauges], [{"worker": str(os.getpid())}])
+        self.assertGreater(gauges[0][1], 0)
+
+    def test_retired_workers_keep_counting(self):
+        worker = MetricsRegistry()
+        worker.increment("requests_total", 2, route="predict", status=200)
+        with open(os.path.join(self.tmp_dir, "dead.json"), "w") as f:
+            json.dump(dict(worker.snapshot(), pid=2 ** 22 + 1), f)
+
+        retired = MetricsRegistry()
+        for _ in range(2):
+            # The snapshot of the dead worker is retired once and counted in every later merge
+            merged, gauges = merge_exports(self.tmp_dir, MetricsRegistry(), retired)
+            self.assertIn('graph_api_requests_total{route="predict",status="200"} 2', merged.render(gauges))
+            self.assertEqual(gauges, [])
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+
+class SamplingProfilerTestCase(unittest.TestCase):
+    def test_folded_stacks(self):
+        profiler = SamplingProfiler(interval=0.001).start()
+        busy_loop(0.1)
+        stacks = profiler.stop()
+
+        self.assertGreater(profiler.samples, 0)
+        self.assertEqual(sum(stacks.values()), profiler.samples)
+        self.assertTrue(any("busy_loop" in stack.split(";")[-1] for stack in stacks))
+        for line in profiler.folded().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack and int(count) > 0)
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = profiler.write("POST /predict", tmp_dir)
+        self.assertTrue(path.endswith("POST__predict.folded"))
+        with open(path) as f:
+            self.assertEqual(f.read(), profiler.folded())
+
+    def test_other_thread(self):
+        thread = threading.Thread(target=busy_loop, args=(0.1,))
+        thread.start()
+        profiler = SamplingProfiler(thread.ident, interval=0.001).start()
+        thread.join()
+        stacks = profiler.stop()
+        self.assertTrue(all("busy_loop" in stack for stack in stacks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import networkx as nx
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+
+from src.models.flat_forest import flatten_forest, tree_predictions
+from src.models.graph_reduction_and_model_compression import compress_model, select_trees
+from src.models.train_shortest_path_model import held_out_split, train_model
+from src.models.training_data import generate_training_data
+
+
+def _fit_forest(test_case):
+    # A small forest on the node id pairs of a random graph, with the odd pairs held out
+    X, y = generate_training_data(nx.gnm_random_graph(80, 200, seed=1))
+    test_case.X_val, test_case.y_val = X[1::2], y[1::2]
+    test_case.model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X[::2], y[::2])
+
+
+class FlatForestTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        _fit_forest(cls)
+
+    def test_matches_sklearn(self):
+        flat = flatten_forest(self.model)
+        np.testing.assert_allclose(flat.predict(self.X_val), self.model.predict(self.X_val), rtol=1e-6)
+        # Integer thresholds route integer node ids exactly like the float splits
+        np.testing.assert_allclose(flat.quantized("int").predict(self.X_val), self.model.predict(self.X_val),
+                                   rtol=1e-6)
+        self.assertEqual(flat.n_trees, 10)
+
+    def test_tree_subset_and_depth_cap(self):
+        flat = flatten_forest(self.model, trees=[2, 5], max_depth=3)
+        self.assertEqual(flat.max_depth, 3)
+        expected = tree_predictions(self.model, self.X_val)[[2, 5]].mean(axis=0)
+        self.assertFalse(np.allclose(flat.predict(self.X_val), expected))
+        np.testing.assert_allclose(flatten_forest(self.model, trees=[2, 5]).predict(self.X_val), expected, rtol=1e-6)
+
+    def test_pickle_holds_no_sklearn_objects(self):
+        self.model.feature_spec_ = None
+        try:
+            flat = flatten_forest(self.model).quantized("float16", "float16")
+        finally:
+            del self.model.feature_spec_
+        self.assertTrue(hasattr(flat, "feature_spec_"))
+        self.assertNotIn(b"sklearn", pickle.dumps(flat))
+        restored = pickle.loads(pickle.dumps(flat))
+        np.testing.assert_array_equal(restored.predict(self.X_val[:50]), flat.predict(self.X_val[:50]))
+
+    def test_wrong_number_of_features(self):
+        with self.assertRaises(ValueError):
+            flatten_forest(self.model).predict(np.zeros((3, 5)))
+
+
+class CompressModelTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        _fit_forest(cls)
+
+    def test_select_trees(self):
+        predictions = np.array([[1.0, 1.0], [3.0, 3.0], [2.0, 2.0]])
+        self.assertEqual(select_trees(predictions, np.array([2.0, 2.0]), 0.0), [2])
+        self.assertEqual(select_trees(predictions, np.array([1.5, 1.5]), 0.0), [0, 2])
+        # An unreachable bound keeps every tree
+        self.assertEqual(sorted(select_trees(predictions, np.array([9.0, 9.0]), 0.0)), [0, 1, 2])
+
+    def test_compress_within_bound(self):
+        flat = compress_model(self.model, self.X_val, self.y_val, max_mse_increase=0.05)
+        report = flat.compression_report_
+
+        self.assertEqual(report["threshold_dtype"], "int32")
+        self.assertLessEqual(report["trees"][1], 10)
+        self.assertLessEqual(report["selection_mse"][1], report["selection_mse"][0] * 1.05 + 1e-9)
+        # The MSE is reported on the validation rows the choices were not made on
+        self.assertEqual(report["before"]["rows"], report["after"]["rows"])
+        self.assertEqual(report["selection_rows"] + report["after"]["rows"], len(self.y_val))
+        self.assertLess(report["after"]["bytes"], report["before"]["bytes"])
+        for key in ("bytes", "load_seconds", "single_row_ms", "batch_ms", "mse"):
+            self.assertIn(key, report["before"])
+
+    def test_held_out_split(self):
+        # Compression is validated on the pairs train_model held out, never on training pairs
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        G = nx.relabel_nodes(nx.connected_watts_strogatz_graph(40, 4, 0.1, seed=3), str)
+        model = train_model(G, shard_dir=None, features="ids", report_path=None,
+                            model_path=os.path.join(tmp_dir, "model.pkl"))
+
+        X_test, y_test = held_out_split(model, G)
+        _, X_expected, _, y_expected = train_test_split(*generate_training_data(G), test_size=0.2, random_state=42)
+        np.testing.assert_array_equal(X_test, X_expected)
+        np.testing.assert_array_equal(y_test, y_expected)
+        with self.assertRaises(ValueError):
+            held_out_split(model, nx.relabel_nodes(nx.path_graph(40), str))
+        with self.assertRaises(ValueError):
+            held_out_split(self.model, G)
+
+    def test_other_models_are_returned(self):
+        model = object()
+        self.assertIs(compress_model(model, self.X_val, self.y_val), model)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from src.serving.model_manager import ModelManager
+
+
+def _fit_model(offset):
+    X = np.arange(20, dtype=float).reshape(-1, 2)
+    return RandomForestRegressor(n_estimators=3, random_state=42).fit(X, X[:, 0] + offset)
+
+
+class ModelManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        # Save a small model into a temporary directory for each test
+        self.tmp_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.tmp_dir, "model.pkl")
+        joblib.dump(_fit_model(0), self.model_path)
+        self.manager = ModelManager(paths={"compressed": self.model_path})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_model_is_loaded_once(self):
+        # Repeated lookups of an unchanged file return the same model object
+        self.assertIs(self.manager.get("compressed"), self.manager.get("compressed"))
+        self.assertEqual(self.manager.stats()['loads'], 1)
+
+    def test_publish_swaps_atomically(self):
+        # A model obtained before publishing keeps working, later lookups see the new one
+        old_model = self.manager.get("compressed")
+        new_model = _fit_model(100)
+
+        self.manager.publish("compressed", new_model)
+
+        self.assertIs(self.manager.get("compressed"), new_model)
+        self.assertEqual(self.manager.version("compressed"), 2)
+        self.assertLess(old_model.predict([[0, 1]])[0], 50)
+        self.assertEqual(self.manager.stats()['loads'], 1)
+
+    def test_changed_file_is_reloaded(self):
+        # A model written by another process is picked up on the next lookup
+        self.manager.get("compressed")
+        joblib.dump(_fit_model(100), self.model_path + ".new")
+        os.replace(self.model_path + ".new", self.model_path)
+
+        self.assertGreater(self.manager.get("compressed").predict([[0, 1]])[0], 50)
+        self.assertEqual(self.manager.stats()['loads'], 2)
+
+    def test_memory_mapped_loading(self):
+        # NumPy arrays held by the model come back as read-only memory maps
+        model = _fit_model(0)
+        model.lookup_ = np.arange(10, dtype=float)
+        joblib.dump(model, self.model_path)
+        manager = ModelManager(paths={"compressed": self.model_path}, mmap_mode="r")
+        loaded = manager.get("compressed")
+
+        self.assertIsInstance(loaded.lookup_, np.memmap)
+        self.assertFalse(loaded.lookup_.flags.writeable)
+        self.assertEqual(len(loaded.predict([[0, 1], [2, 3]])), 2)
+
+    def test_missing_model(self):
+        # Models that were never saved raise FileNotFoundError
+        manager = ModelManager(paths={"adapted": os.path.join(self.tmp_dir, "missing.pkl")})
+        with self.assertRaises(FileNotFoundError):
+            manager.get("adapted")
+
+
+if __name__ == '__main__':
+    unittest.main()
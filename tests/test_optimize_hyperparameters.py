@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import networkx as nx
+
+from src.models.optimize_hyperparameters import (TrialCache, fold_splits, hyperband_search, optimize_hyperparameters,
+                                                 sample_configurations, time_to_mse, trial_cache_path)
+
+# A small search space keeps every trial fast
+SMALL_SPACE = {
+    'n_estimators': (10, 20),
+    'max_depth': (2, 8),
+    'min_samples_split': (2, 4),
+    'min_samples_leaf': (1, 2),
+}
+
+
+class HyperbandSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = rng.uniform(size=(600, 3))
+        self.y = 3 * self.X[:, 0] + np.sin(6 * self.X[:, 1]) + rng.normal(scale=0.1, size=600)
+        self.folds = fold_splits(len(self.X))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_search_and_resume(self):
+        path = os.path.join(self.tmp_dir, "trials.jsonl")
+        report = hyperband_search(self.X, self.y, self.folds, SMALL_SPACE, 600, TrialCache(path))
+        self.assertEqual(report["best_resource"], 1)
+        self.assertLess(report["cv_mse"], np.var(self.y))
+        # History keeps only improvements of the best full-resource MSE
+        improvements = [mse for _, mse in report["history"]]
+        self.assertTrue(improvements)
+        self.assertEqual(improvements, sorted(improvements, reverse=True))
+        for name, (low, high) in SMALL_SPACE.items():
+            self.assertTrue(low <= report["best_params"][name] <= high)
+
+        # A rerun scores nothing again, even after a crash left a torn line behind
+        with open(path, "a") as f:
+            f.write('{"key": "torn')
+        cache = TrialCache(path)
+        resumed = hyperband_search(self.X, self.y, self.folds, SMALL_SPACE, 600, cache)
+        self.assertEqual(resumed["trials"], 0)
+        self.assertEqual(resumed["cached"], report["trials"] + report["cached"])
+        self.assertEqual((resumed["best_params"], resumed["cv_mse"]), (report["best_params"], report["cv_mse"]))
+
+        cache.put({"n_estimators": 10}, 1, 0, 1.5, 0.1)
+        self.assertEqual(TrialCache(path).get({"n_estimators": 10}, 1, 0), 1.5)
+
+    def test_budget(self):
+        with self.assertRaises(RuntimeError):
+            hyperband_search(self.X, self.y, self.folds, SMALL_SPACE, budget_seconds=0)
+
+    def test_helpers(self):
+        first = sample_configurations(SMALL_SPACE, 5, np.random.default_rng(1))
+        self.assertEqual(first, sample_configurations(SMALL_SPACE, 5, np.random.default_rng(1)))
+        self.assertEqual(time_to_mse([(1.0, 5.0), (2.5, 3.0), (4.0, 2.0)], 3.0), 2.5)
+        self.assertIsNone(time_to_mse([(1.0, 5.0)], 3.0))
+
+
+class OptimizeHyperparametersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_optimize_and_save(self):
+        G = nx.gnm_random_graph(40, 80, seed=3)
+        model_path = os.path.join(self.tmp_dir, "model.pkl")
+        model = optimize_hyperparameters(G, budget_seconds=600, trial_dir=self.tmp_dir, param_space=SMALL_SPACE,
+                                         model_path=model_path)
+
+        self.assertTrue(os.path.exists(model_path))
+        self.assertIsNotNone(model.feature_spec_)
+        self.assertIn("test_mse", model.search_report_)
+        self.assertTrue(os.path.exists(trial_cache_path(G, None, "structural", SMALL_SPACE, 42, self.tmp_dir)))
+        self.assertEqual(model.n_estimators, model.search_report_["best_params"]["n_estimators"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.api import app, warm_start
+from src.serving.graph_registry import graph_registry
+from src.serving.preload import Readiness, load_preload_manifest
+
+
+class PreloadManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.test_dir, "graph.edgelist")
+        with open(self.graph_file, "w") as f:
+            f.write("1 2\n2 3\n3 4\n1 5\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_manifest(self, manifest):
+        path = os.path.join(self.test_dir, "preload.json")
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+        return path
+
+    def test_load_manifest(self):
+        self.assertEqual(load_preload_manifest(""), {"models": None, "graphs": []})
+        manifest = load_preload_manifest(self.write_manifest({
+            "models": ["flat"],
+            "graphs": ["a.gbin", {"path": "b.txt", "format": "graphml", "derived": ["landmarks"]}],
+        }))
+        self.assertEqual(manifest, {"models": ["flat"], "graphs": [
+            {"path": "a.gbin", "format": "gbin", "derived": ["csr"]},
+            {"path": "b.txt", "format": "graphml", "derived": ["landmarks"]},
+        ]})
+        with self.assertRaises(ValueError):
+            load_preload_manifest(self.write_manifest({"graphs": [{"path": "a.edgelist", "derived": ["pagerank"]}]}))
+        # An unknown model would only fail once the workers warm up
+        with self.assertRaisesRegex(ValueError, "forest"):
+            load_preload_manifest(self.write_manifest({"models": ["flat", "forest"]}))
+
+    def test_warm_start(self):
+        manifest = load_preload_manifest(self.write_manifest({
+            "models": [],
+            "graphs": [{"path": self.graph_file, "derived": ["csr", "landmarks"]},
+                       os.path.join(self.test_dir, "missing.edgelist")],
+        }))
+        timings = warm_start(manifest)
+        self.assertEqual(list(timings), [f"graph:{self.graph_file}"])
+        entry = graph_registry._entries[(os.path.abspath(self.graph_file), "edgelist")]
+        self.assertTrue({"csr", "landmarks"} <= set(entry.derived))
+
+    def test_ready_endpoint(self):
+        manifest = {"models": [], "graphs": [{"path": self.graph_file, "format": "edgelist", "derived": ["csr"]}]}
+        client = app.test_client()
+        with mock.patch("src.api.readiness", Readiness()), \
+                mock.patch("src.api.load_preload_manifest", return_value=manifest):
+            # The first probe starts the warm start, later ones report it
+            response = client.get("/ready")
+            deadline = time.monotonic() + 10
+            while response.status_code == 503 and time.monotonic() < deadline:
+                self.assertIn(response.get_json()["state"], ("warming", "ready"))
+                time.sleep(0.01)
+                response = client.get("/ready")
+
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["state"], "ready")
+        self.assertIn(f"graph:{self.graph_file}", data["timings"])
+
+    def test_failed_warm_start(self):
+        readiness = Readiness()
+        readiness.start(lambda: 1 / 0)
+        deadline = time.monotonic() + 10
+        while readiness.state == "warming" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(readiness.state, "failed")
+        self.assertFalse(readiness.ready)
+        self.assertIn("division by zero", readiness.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import networkx as nx
+import numpy as np
+
+from src.models import training_data
+from src.models.training_data import generate_training_data
+from src.models.training_shards import iter_training_chunks, load_training_shards, split_training_shards, write_training_shards
+
+
+def _expected_pairs(G, weight=None):
+    expected = {}
+    for source, lengths in nx.all_pairs_dijkstra_path_length(G, weight=weight or (lambda u, v, d: 1)):
+        for target, length in lengths.items():
+            if source != target:
+                expected[(source, target)] = length
+    return expected
+
+
+class TrainingDataTestCase(unittest.TestCase):
+    def setUp(self):
+        # Two components, so some ordered pairs have no path
+        self.G = nx.disjoint_union(nx.gnm_random_graph(30, 60, seed=1), nx.path_graph(5))
+        for u, v in self.G.edges():
+            self.G[u][v]['weight'] = 1 + (u * v) % 4
+
+    def test_matches_all_pairs(self):
+        data, labels = generate_training_data(self.G)
+
+        self.assertIsInstance(data, np.ndarray)
+        self.assertEqual(data.shape, (len(labels), 2))
+        generated = {(int(s), int(t)): label for (s, t), label in zip(data, labels)}
+        self.assertEqual(generated, _expected_pairs(self.G))
+
+    def test_weighted_lengths(self):
+        data, labels = generate_training_data(self.G, weight='weight')
+
+        generated = {(int(s), int(t)): label for (s, t), label in zip(data, labels)}
+        self.assertEqual(generated.keys(), _expected_pairs(self.G, 'weight').keys())
+        for pair, length in _expected_pairs(self.G, 'weight').items():
+            self.assertAlmostEqual(generated[pair], length)
+
+    def test_parallel_sweeps_keep_order(self):
+        # Small chunks force several tasks across the process pool
+        serial = generate_training_data(self.G, n_jobs=1)
+        with mock.patch.object(training_data, 'SWEEP_MAX_ENTRIES', 100):
+            parallel = generate_training_data(self.G, n_jobs=2)
+
+        np.testing.assert_array_equal(serial[0], parallel[0])
+        np.testing.assert_array_equal(serial[1], parallel[1])
+
+    def test_non_numeric_node_ids(self):
+        G = nx.path_graph(['a', 'b', 'c'])
+        data, labels = generate_training_data(G)
+        self.assertEqual(len(labels), 6)
+        self.assertEqual(sorted(set(data[:, 0])), [0.0, 1.0, 2.0])
+
+    def test_sampling_is_bounded_and_reproducible(self):
+        sampling = {'num_sources': 6, 'pair_budget': 40, 'seed': 3}
+        data, labels = generate_training_data(self.G, sampling=sampling)
+        again, _ = generate_training_data(self.G, sampling=sampling)
+
+        self.assertLessEqual(len(labels), 40)
+        self.assertLessEqual(len(set(data[:, 0])), 6)
+        np.testing.assert_array_equal(data, again)
+
+        expected = _expected_pairs(self.G)
+        for (source, target), label in zip(data, labels):
+            self.assertEqual(expected[(int(source), int(target))], label)
+
+    def test_sampling_by_component_covers_components(self):
+        # The 5-node path is a seventh of the graph, so it gets one of seven sources
+        data, _ = generate_training_data(self.G, sampling={'num_sources': 7, 'stratify': 'component'})
+        self.assertTrue(any(source >= 30 for source in data[:, 0]))
+
+    def test_invalid_sampling(self):
+        with self.assertRaises(ValueError):
+            generate_training_data(self.G, sampling={'stratify': 'betweenness'})
+
+
+class TrainingShardsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.G = nx.gnm_random_graph(40, 100, seed=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_chunks_match_training_data(self):
+        data, labels = generate_training_data(self.G)
+        chunks = list(iter_training_chunks(self.G, chunk_size=100))
+
+        self.assertTrue(all(len(chunk_labels) == 100 for _, chunk_labels in chunks[:-1]))
+        np.testing.assert_array_equal(np.concatenate([features for features, _ in chunks]), data)
+        np.testing.assert_array_equal(np.concatenate([chunk_labels for _, chunk_labels in chunks]), labels)
+
+    def test_shards_are_reused_for_unchanged_graph(self):
+        manifest_path = write_training_shards(self.G, self.tmp_dir, chunk_size=250)
+        with mock.patch('src.models.training_shards.iter_training_chunks') as chunks:
+            self.assertEqual(write_training_shards(self.G, self.tmp_dir, chunk_size=250), manifest_path)
+            chunks.assert_not_called()
+
+        # A changed graph gets its own shards
+        self.G.add_edge(0, 39)
+        self.assertNotEqual(write_training_shards(self.G, self.tmp_dir, chunk_size=250), manifest_path)
+
+    def test_split_memory_mapped_shards(self):
+        shards = load_training_shards(write_training_shards(self.G, self.tmp_dir, chunk_size=250))
+        self.assertIsInstance(shards[0][0], np.memmap)
+
+        X_train, X_test, y_train, y_test = split_training_shards(shards, test_size=0.25)
+        total = sum(len(labels) for _, labels in shards)
+        self.assertEqual(len(X_train) + len(X_test), total)
+        self.assertEqual(len(y_test), int(np.ceil(total * 0.25)))
+        self.assertEqual(sorted(np.concatenate([y_train, y_test])),
+                         sorted(np.concatenate([labels for _, labels in shards])))
+
+
+if __name__ == '__main__':
+    unittest.main()